@@ -85,7 +85,8 @@ translatescripts = [apply(join, ('translate', ) + script) for script in
                   ('tools', 'poterminology'),
                   ('tools', 'pretranslate'),
                   ('services', 'tmserver'),
-                  ('tools', 'build_tmdb')]
+                  ('tools', 'build_tmdb'),
+                  ('tools', 'tmdb2tmx')]
 
 translatebashscripts = [apply(join, ('tools', ) + (script, )) for script in [
                   'pomigrate2', 'pocompendium',
@@ -397,6 +397,15 @@ class ArchiveConvertOptionParser(ConvertOptionParser):
         self.initoutputarchive(options)
         return super(ArchiveConvertOptionParser, self).recursiveprocess(options)
 
+    def isparallel(self, options):
+        """Archives are read and written by a single process, so their
+        files aren't processed in parallel."""
+        if (self.isarchive(options.input, 'input') or
+            self.isarchive(options.output, 'output') or
+            (self.usetemplates and self.isarchive(options.template, 'template'))):
+            return False
+        return super(ArchiveConvertOptionParser, self).isparallel(options)
+
     def processfile(self, fileprocessor, options, fullinputpath,
                     fulloutputpath, fulltemplatepath):
         """Run an invidividual conversion."""
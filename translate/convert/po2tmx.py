@@ -69,8 +69,11 @@ def convertpo(inputfile, outputfile, templatefile, sourcelanguage='en', targetla
 
 class tmxmultifile:
 
-    def __init__(self, filename, mode=None):
-        """initialises tmxmultifile from a seekable inputfile or writable outputfile"""
+    def __init__(self, filename, mode=None, sourcelanguage='en'):
+        """initialises tmxmultifile from a seekable inputfile or writable outputfile
+
+        The units of a writable outputfile are written as they are added, and
+        the file is finished by :meth:`close`."""
         self.filename = filename
         if mode is None:
             if os.path.exists(filename):
@@ -81,7 +84,16 @@ class tmxmultifile:
 #        self.multifilestyle = multifilestyle
         self.multifilename = os.path.splitext(filename)[0]
 #        self.multifile = open(filename, mode)
-        self.tmxfile = tmx.tmxfile()
+        if mode == 'w':
+            self.outputfile = open(filename, 'w')
+            self.tmxfile = tmx.tmxwriter(self.outputfile, sourcelanguage)
+        else:
+            self.tmxfile = tmx.tmxfile()
+
+    def close(self):
+        """finishes writing the outputfile"""
+        self.tmxfile.close()
+        self.outputfile.close()
 
     def openoutputfile(self, subfile):
         """returns a pseudo-file object for the given subfile"""
@@ -96,14 +108,21 @@ class tmxmultifile:
 
 class TmxOptionParser(convert.ArchiveConvertOptionParser):
 
+    def initoutputarchive(self, options):
+        """Opens the TMX file that the units are written to as they are
+        converted."""
+        if options.output and self.isarchive(options.output, 'output'):
+            options.outputarchive = self.openarchive(options.output, 'output', mode="w",
+                                                     sourcelanguage=options.sourcelanguage)
+
     def recursiveprocess(self, options):
         if not options.targetlanguage:
             raise ValueError("You must specify the target language")
-        super(TmxOptionParser, self).recursiveprocess(options)
-        self.output = open(options.output, 'w')
-        options.outputarchive.tmxfile.setsourcelanguage(options.sourcelanguage)
-        self.output.write(str(options.outputarchive.tmxfile))
-        self.output.close()
+        try:
+            super(TmxOptionParser, self).recursiveprocess(options)
+        finally:
+            if hasattr(options, "outputarchive"):
+                options.outputarchive.close()
 
 
 def main(argv=None):
@@ -21,6 +21,9 @@
 """Convert template files (like .pot or template .xlf files) translation files,
 preserving existing translations.
 
+If the old translation file has several units with the same id, the first one
+is used. Older versions used the last one.
+
 See: http://translate.sourceforge.net/wiki/toolkit/pot2po for examples and
 usage instructions.
 """
@@ -47,11 +50,11 @@ def convertpot(input_file, output_file, template_file, tm=None, min_similarity=7
     if template_file is not None:
         template_store = factory.getobject(template_file, classes_str=classes_str)
     output_store = convert_stores(input_store, template_store, temp_store, tm, min_similarity, fuzzymatching, **kwargs)
-    output_file.write(str(output_store))
+    output_store.serialize(output_file)
     return 1
 
 
-def convert_stores(input_store, template_store, temp_store=None, tm=None, min_similarity=75, fuzzymatching=True, **kwargs):
+def convert_stores(input_store, template_store, temp_store=None, tm=None, min_similarity=75, fuzzymatching=True, jobs=1, **kwargs):
     """Actual conversion function, works on stores not files, returns
     a properly initialized pretranslated output store, with structure
     based on input_store, metadata based on template_store, migrates
@@ -78,6 +81,8 @@ def convert_stores(input_store, template_store, temp_store=None, tm=None, min_si
 
     # Do matching
     match_locations = isinstance(input_store, po.pofile) and input_store.parseheader().get('X-Accelerator-Marker') in ('&', '~')
+    if matchers and jobs > 1:
+        matchers = pretranslate.prematch_fuzzy(temp_store.units, template_store, matchers, match_locations, jobs)
     for input_unit in temp_store.units:
         if input_unit.istranslatable():
             input_unit = pretranslate.pretranslate_unit(input_unit, template_store, matchers, mark_reused=True, match_locations=match_locations)
@@ -97,10 +102,8 @@ def _prepare_merge(input_store, output_store, template_store, **kwargs):
     if prepare_merge_hook in globals():
         globals()[prepare_merge_hook](input_store, output_store, template_store, **kwargs)
 
-    #generate an index so we can search by source string and location later on
-    input_store.makeindex()
-    if template_store:
-        template_store.makeindex()
+    #the stores are searched by id, source string and location later on
+    #through their unit index, which only indexes the keys that are used
 
 
 def _store_pre_merge(input_store, output_store, template_store, **kwargs):
@@ -153,10 +156,11 @@ def _store_post_merge_pofile(input_store, output_store, template_store):
     #Let's take care of obsoleted messages
     if template_store:
         newlyobsoleted = []
+        input_index = input_store.getunitindex()
         for unit in template_store.units:
             if unit.isheader() or unit.isblank():
                 continue
-            if unit.target and not (input_store.findid(unit.getid()) or hasattr(unit, "reused")):
+            if unit.target and not (input_index.findid(unit.getid()) or hasattr(unit, "reused")):
                 #not in .pot, make it obsolete
                 unit.makeobsolete()
                 newlyobsoleted.append(unit)
@@ -246,6 +250,7 @@ def main(argv=None):
     parser.add_option("--nofuzzymatching", dest="fuzzymatching", action="store_false",
         default=True, help="Disable fuzzy matching")
     parser.passthrough.append("fuzzymatching")
+    parser.passthrough.append("jobs")
     parser.run(argv)
 
 
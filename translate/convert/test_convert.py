@@ -130,6 +130,7 @@ class TestConvertCommand:
         options = self.help_check(options, "-h, --help")
         options = self.help_check(options, "--manpage")
         options = self.help_check(options, "--errorlevel=ERRORLEVEL")
+        options = self.help_check(options, "--jobs=JOBS")
         if psyco:
             options = self.help_check(options, "--psyco=MODE")
         options = self.help_check(options, "-i INPUT, --input=INPUT")
@@ -1,5 +1,6 @@
 #!/usr/bin/env python
 
+import os
 import warnings
 
 from py.test import mark
@@ -18,7 +19,7 @@ class TestPOT2PO:
     def teardown_method(self, method):
         warnings.resetwarnings()
 
-    def convertpot(self, potsource, posource=None):
+    def convertpot(self, potsource, posource=None, **kwargs):
         """helper that converts pot source to po source without requiring files"""
         potfile = wStringIO.StringIO(potsource)
         if posource:
@@ -26,7 +27,7 @@ class TestPOT2PO:
         else:
             pofile = None
         pooutfile = wStringIO.StringIO()
-        pot2po.convertpot(potfile, pooutfile, pofile)
+        pot2po.convertpot(potfile, pooutfile, pofile, **kwargs)
         pooutfile.seek(0)
         return po.pofile(pooutfile.read())
 
@@ -135,6 +136,18 @@ msgstr[1] "%d handleidings."
         print newpo
         assert str(self.singleunit(newpo)) == poexpected
 
+    def test_merging_fuzzy_matches_in_parallel(self):
+        """test that fuzzy matching with several processes gives the same
+        results, and that the fuzzy matched old units aren't obsoleted"""
+        potsource = '''#: singlespace.label\nmsgid "&We have spaces"\nmsgstr ""\n\n#: other.label\nmsgid "Other &text"\nmsgstr ""\n'''
+        posource = '''#: doublespace.label\nmsgid "&We  have  spaces"\nmsgstr "&One  het  spasies"\n\n#: other.label\nmsgid "Other &text"\nmsgstr "Ander &teks"\n'''
+        expected = self.convertpot(potsource, posource)
+        newpo = self.convertpot(potsource, posource, jobs=2)
+        assert str(newpo) == str(expected)
+        assert len(newpo.units) == 3
+        assert newpo.units[1].isfuzzy()
+        assert newpo.units[1].target == "&One  het  spasies"
+
     def test_merging_location_ambiguous_with_disambiguous(self):
         """test that when we have a PO in ambiguous (Gettext form) and merge with disamabiguous (KDE comment form)
         that we don't duplicate the location #: comments"""
@@ -623,6 +636,19 @@ class TestPOT2POCommand(test_convert.TestConvertCommand, TestPOT2PO):
     """Tests running actual pot2po commands on files"""
     convertmodule = pot2po
 
+    def test_recursive_jobs(self):
+        """tests converting a directory of files in parallel"""
+        names = [os.path.join("sub", "file%d" % i) for i in range(4)] + ["top"]
+        for name in names:
+            self.create_testfile(os.path.join("pot", name + ".pot"),
+                                 'msgid "%s"\nmsgstr ""\n' % name)
+            self.create_testfile(os.path.join("templates", name + ".po"),
+                                 'msgid "%s"\nmsgstr "%s translated"\n' % (name, name))
+        self.run_command("pot", "po", template="templates", jobs=2)
+        for name in names:
+            newpo = po.pofile(self.read_testfile(os.path.join("po", name + ".po")))
+            assert newpo.units[1].target == "%s translated" % name
+
     def test_help(self):
         """tests getting help"""
         options = test_convert.TestConvertCommand.test_help(self)
@@ -264,9 +264,10 @@ class CheckerConfig(object):
 
 
 def cache_results(f):
+    name = f.__name__
 
     def cached_f(self, param1):
-        key = (f.__name__, param1)
+        key = (name, param1)
         res_cache = self.results_cache
 
         if key in res_cache:
@@ -279,6 +280,86 @@ def cache_results(f):
     return cached_f
 
 
+class CheckPlan(object):
+    """The checks of a checker compiled into the order in which they run.
+
+    Building the plan resolves the filter functions, their messages and the
+    tests they block as preconditions once, so that running the checks on a
+    unit only has to call them. A plan is only valid for the language it was
+    built for, see :meth:`UnitChecker.getcheckplan`.
+    """
+
+    def __init__(self, checker):
+        self.checker = checker
+        self.lang = checker.config.lang
+        self.filters = checker.defaultfilters
+        ignores = set(self.lang.ignoretests)
+        preconditions = checker.preconditions
+        functionnames = preconditions.keys() + \
+                [functionname for functionname in self.filters
+                 if functionname not in preconditions]
+        #: (functionname, filterfunction, message, isreported, blocked tests)
+        self.steps = []
+
+        for functionname in functionnames:
+            if functionname in ignores:
+                continue
+
+            # This filterfunction may only be defined on another checker if
+            # using TeeChecker
+            filterfunction = getattr(checker, functionname, None)
+            if filterfunction is None:
+                continue
+
+            self.steps.append((functionname, filterfunction,
+                               filterfunction.__doc__,
+                               functionname in self.filters,
+                               preconditions.get(functionname, ())))
+
+    def isvalid(self):
+        """Whether the plan still matches the configuration of the checker."""
+        return (self.lang is self.checker.config.lang and
+                self.filters is self.checker.defaultfilters)
+
+    def run(self, unit):
+        """Run the planned checks on ``unit``, returning the failures as a
+        dictionary like :meth:`UnitChecker.run_filters` does.
+        """
+        checker = self.checker
+        failures = {}
+        blocked = set()
+
+        for functionname, filterfunction, filtermessage, isreported, blocks in self.steps:
+            if functionname in blocked:
+                continue
+
+            try:
+                filterresult = checker.run_test(filterfunction, unit)
+            except FilterFailure, e:
+                filterresult = False
+                filtermessage = unicode(e)
+            except Exception, e:
+                if checker.errorhandler is None:
+                    raise ValueError("error in filter %s: %r, %r, %s" % \
+                            (functionname, unit.source, unit.target, e))
+                else:
+                    filterresult = checker.errorhandler(functionname, unit.source,
+                                                        unit.target, e)
+
+            if not filterresult:
+                # We test some preconditions that aren't actually a cause for
+                # failure
+                if isreported:
+                    failures[functionname] = {
+                            'message': filtermessage,
+                            'category': checker.categories[functionname],
+                            }
+
+                blocked.update(blocks)
+
+        return failures
+
+
 class UnitChecker(object):
     """Parent Checker class which does the checking based on functions available
     in derived classes.
@@ -310,6 +391,7 @@ class UnitChecker(object):
 
         self.defaultfilters = self.getfilters(excludefilters, limitfilters)
         self.results_cache = {}
+        self.checkplan = None
 
 
     def getfilters(self, excludefilters=None, limitfilters=None):
@@ -354,6 +436,10 @@ class UnitChecker(object):
         self.removevarfilter = [prefilters.filtervariables(startmatch, endmatch,
                                                            prefilters.varnone)
                 for startmatch, endmatch in self.config.varmatches]
+        #: Checkers with the same key can share the results of the prefilters
+        self.prefilterkey = (tuple(self.config.accelmarkers),
+                             tuple(self.config.varmatches))
+        self.checkplan = None
 
 
     def setsuggestionstore(self, store):
@@ -408,58 +494,28 @@ class UnitChecker(object):
         """
         return test(unit)
 
-    def run_filters(self, unit, categorised=False):
+    def getcheckplan(self):
+        """Returns the :class:`CheckPlan` for the current configuration,
+        compiling it if needed.
+        """
+        if self.checkplan is None or not self.checkplan.isvalid():
+            self.checkplan = CheckPlan(self)
+        return self.checkplan
+
+    def run_filters(self, unit, categorised=False, results_cache=None):
         """Run all the tests in this suite, return failures as a dictionary::
 
             {'testname': {'message': message_or_exception,
                           'category': failure_category} }
-        """
-        self.results_cache = {}
-        failures = {}
-        ignores = self.config.lang.ignoretests[:]
-        functionnames = self.defaultfilters.keys()
-        priorityfunctionnames = self.preconditions.keys()
-        otherfunctionnames = filter(lambda functionname: functionname not in self.preconditions, functionnames)
-
-        for functionname in priorityfunctionnames + otherfunctionnames:
-            if functionname in ignores:
-                continue
-
-            filterfunction = getattr(self, functionname, None)
-
-            # This filterfunction may only be defined on another checker if
-            # using TeeChecker
-            if filterfunction is None:
-                continue
-
-            filtermessage = filterfunction.__doc__
-
-            try:
-                filterresult = self.run_test(filterfunction, unit)
-            except FilterFailure, e:
-                filterresult = False
-                filtermessage = unicode(e)
-            except Exception, e:
-                if self.errorhandler is None:
-                    raise ValueError("error in filter %s: %r, %r, %s" % \
-                            (functionname, unit.source, unit.target, e))
-                else:
-                    filterresult = self.errorhandler(functionname, unit.source,
-                                                     unit.target, e)
-
-            if not filterresult:
-                # We test some preconditions that aren't actually a cause for
-                # failure
-                if functionname in self.defaultfilters:
-                    failures[functionname] = {
-                            'message': filtermessage,
-                            'category': self.categories[functionname],
-                            }
-
-                if functionname in self.preconditions:
-                    for ignoredfunctionname in self.preconditions[functionname]:
-                        ignores.append(ignoredfunctionname)
 
+        :param results_cache: A dictionary for the results of the prefilters
+                              (see :attr:`prefilterkey`) that is shared with
+                              other checkers running on the same unit.
+        """
+        if results_cache is None:
+            results_cache = {}
+        self.results_cache = results_cache
+        failures = self.getcheckplan().run(unit)
         self.results_cache = {}
 
         if not categorised:
@@ -507,7 +563,7 @@ class TranslationChecker(UnitChecker):
             return test(self.str1, self.str2)
 
 
-    def run_filters(self, unit, categorised=False):
+    def run_filters(self, unit, categorised=False, results_cache=None):
         """Do some optimisation by caching some data of the unit for the
         benefit of :meth:`~TranslationChecker.run_test`.
         """
@@ -516,7 +572,8 @@ class TranslationChecker(UnitChecker):
         self.hasplural = unit.hasplural()
         self.locations = unit.getlocations()
 
-        return super(TranslationChecker, self).run_filters(unit, categorised)
+        return super(TranslationChecker, self).run_filters(unit, categorised,
+                                                           results_cache)
 
 
 class TeeChecker:
@@ -580,12 +637,21 @@ class TeeChecker:
         return self.combinedfilters
 
 
+    def getcheckplans(self):
+        """Returns the compiled :class:`CheckPlan` of each checker."""
+        return [checker.getcheckplan() for checker in self.checkers]
+
+
     def run_filters(self, unit, categorised=False):
         """Run all the tests in the checker's suites."""
         failures = {}
+        # The prefilters only run once per string for checkers that are
+        # configured the same way
+        results_caches = {}
 
         for checker in self.checkers:
-            failures.update(checker.run_filters(unit, categorised))
+            results_cache = results_caches.setdefault(checker.prefilterkey, {})
+            failures.update(checker.run_filters(unit, categorised, results_cache))
 
         return failures
 
@@ -27,7 +27,13 @@ usage instructions and http://translate.sourceforge.net/wiki/toolkit/pofilter_te
 for full descriptions of all tests.
 """
 
+import itertools
+import multiprocessing
 import os
+try:
+    import json  # available since Python 2.6
+except ImportError:
+    import simplejson as json  # API compatible with the json module
 
 from translate.storage import factory
 from translate.storage.poheader import poheader
@@ -36,6 +42,22 @@ from translate.filters import autocorrect
 from translate.misc import optrecurse
 
 
+# The checkfilter and units of the current pocheckfilter.checkunits(). The
+# worker processes are forked, so they share these with the parent process.
+_filterjob = None
+
+
+def _filterunit(index):
+    """Filters the unit at index of the current parallel job, returning the
+    corrected target instead of :mod:`autocorrect` for corrected units."""
+    checkfilter, units = _filterjob
+    unit = units[index]
+    filter_result = checkfilter.filterunit(unit)
+    if filter_result == autocorrect:
+        return unit.target
+    return filter_result
+
+
 def build_checkerconfig(options):
     """Prepare the checker config from the given options.  This is mainly
     factored out for the sake of unit tests."""
@@ -89,7 +111,15 @@ class pocheckfilter:
                                          limitfilters=options.limitfilters,
                                          checkerclasses=checkerclasses,
                                          languagecode=checkerconfig.targetlanguage)
+        # Compile the checks up front instead of for the first unit; the
+        # checkers keep their plans
+        self.checker.getcheckplans()
         self.options = options
+        #: The summary of the units filtered by the last call of
+        #: :meth:`filterunits`
+        self.filesummary = None
+        #: The file summaries of all the filtered files, by input path
+        self.summary = {}
 
 
     def getfilterdocs(self):
@@ -136,17 +166,46 @@ class pocheckfilter:
         :return: A new translation store object with the results of
                  the filter included.
         """
-        newtransfile = type(transfile)()
-        newtransfile.setsourcelanguage(transfile.getsourcelanguage())
-        newtransfile.settargetlanguage(transfile.gettargetlanguage())
+        return self.filterunits(transfile.units, transfile)
+
+    def filterunits(self, units, transfile=None):
+        """Runs filters on the units of a translation store, which can be
+        streamed (see :func:`factory.iterunits`).
+
+        If the options ask for more than one job the units are checked in
+        that many worker processes, see :meth:`checkunits`.
+
+        :param units: An iterable of units.
+        :param transfile: The store of the units, defaults to the store the
+                          first unit belongs to.
+        :return: A new translation store object with the results of
+                 the filter included, or None if there are no units.
+        """
+        jobs = getattr(self.options, "jobs", 1)
+        if jobs > 1 and hasattr(os, "fork"):
+            units = list(units)
+            results = itertools.izip(units, self.checkunits(units, jobs))
+        else:
+            results = ((unit, self.filterunit(unit)) for unit in units)
+
+        newtransfile = None
+        filesummary = {"units": 0, "failed": 0, "failures": {}}
+        for unit, filter_result in results:
+            if newtransfile is None:
+                if transfile is None:
+                    transfile = unit._store
+                newtransfile = self._newstore(transfile)
 
-        for unit in transfile.units:
-            filter_result = self.filterunit(unit)
+            if not unit.isheader():
+                filesummary["units"] += 1
 
             if filter_result:
+                filesummary["failed"] += 1
                 if filter_result != autocorrect:
                     for filter_name in filter_result.iterkeys():
                         filter_message = filter_result[filter_name]['message']
+                        failures = filesummary["failures"]
+                        failures[filter_name] = failures.get(filter_name, 0) + 1
 
                         if self.options.addnotes:
                             unit.adderror(filter_name, filter_message)
@@ -155,11 +214,67 @@ class pocheckfilter:
 
                 newtransfile.addunit(unit)
 
+        self.filesummary = filesummary
+
+        if newtransfile is None:
+            if transfile is None:
+                return None
+            newtransfile = self._newstore(transfile)
+
         if isinstance(newtransfile, poheader):
             newtransfile.updateheader(add=True, **transfile.parseheader())
 
         return newtransfile
 
+    def checkunits(self, units, jobs):
+        """Returns the result of :meth:`filterunit` for each of the units, in
+        the same order, checking them in ``jobs`` worker processes.
+
+        The worker processes are forked, so they share the units and the
+        compiled checks with this process instead of copying them.
+        Corrections made in ``--autocorrect`` mode are applied to the units
+        of this process.
+        """
+        if len(units) < 2:
+            return [self.filterunit(unit) for unit in units]
+        global _filterjob
+        _filterjob = (self, units)
+        try:
+            pool = multiprocessing.Pool(min(jobs, len(units)))
+            try:
+                chunksize = max(len(units) // (jobs * 4), 1)
+                results = pool.map(_filterunit, range(len(units)), chunksize)
+            finally:
+                pool.close()
+                pool.join()
+        finally:
+            _filterjob = None
+
+        for index, filter_result in enumerate(results):
+            if isinstance(filter_result, basestring):
+                units[index].target = filter_result
+                results[index] = autocorrect
+        return results
+
+    def getsummary(self):
+        """Returns the summary of all the filtered files combined, suitable
+        for writing out as JSON."""
+        summary = {"files": {}, "units": 0, "failed": 0, "failures": {}}
+        for inputpath, filesummary in self.summary.iteritems():
+            summary["files"][inputpath or "-"] = filesummary
+            summary["units"] += filesummary["units"]
+            summary["failed"] += filesummary["failed"]
+            for filter_name, count in filesummary["failures"].iteritems():
+                summary["failures"][filter_name] = \
+                        summary["failures"].get(filter_name, 0) + count
+        return summary
+
+    def _newstore(self, transfile):
+        newtransfile = type(transfile)()
+        newtransfile.setsourcelanguage(transfile.getsourcelanguage())
+        newtransfile.settargetlanguage(transfile.gettargetlanguage())
+        return newtransfile
+
 
 class FilterOptionParser(optrecurse.RecursiveOptionParser):
     """A specialized Option Parser for filter tools..."""
@@ -181,6 +296,27 @@ class FilterOptionParser(optrecurse.RecursiveOptionParser):
         parser.values.input = "-"
 
 
+    def processfile(self, fileprocessor, options, fullinputpath,
+                    fulloutputpath, fulltemplatepath):
+        """Process an individual file, adding it to the summary."""
+        checkfilter = options.checkfilter
+        checkfilter.filesummary = None
+        success = optrecurse.RecursiveOptionParser.processfile(self,
+                fileprocessor, options, fullinputpath, fulloutputpath,
+                fulltemplatepath)
+        if checkfilter.filesummary is not None:
+            checkfilter.summary[fullinputpath] = checkfilter.filesummary
+        return success
+
+    def getjobreport(self, options, filejob):
+        """Reports the summary of the file back to the parent process."""
+        return options.checkfilter.summary.get(filejob[2])
+
+    def addjobreport(self, options, filejob, report):
+        """Adds the summary of a file filtered by a worker process."""
+        if report is not None:
+            options.checkfilter.summary[filejob[2]] = report
+
     def run(self):
         """Parses the arguments, and runs recursiveprocess with the
         resulting options."""
@@ -206,17 +342,21 @@ class FilterOptionParser(optrecurse.RecursiveOptionParser):
             print options.checkfilter.getfilterdocs()
         else:
             self.recursiveprocess(options)
+            if options.summaryfile:
+                summaryfile = open(options.summaryfile, "w")
+                json.dump(options.checkfilter.getsummary(), summaryfile,
+                          indent=2, sort_keys=True)
+                summaryfile.close()
 
 
 def runfilter(inputfile, outputfile, templatefile, checkfilter=None):
     """Reads in inputfile, filters using checkfilter, writes to outputfile."""
-    fromfile = factory.getobject(inputfile)
-    tofile = checkfilter.filterfile(fromfile)
+    tofile = checkfilter.filterunits(factory.iterunits(inputfile))
 
-    if tofile.isempty():
+    if tofile is None or tofile.isempty():
         return 0
 
-    outputfile.write(str(tofile))
+    tofile.serialize(outputfile)
 
     return 1
 
@@ -244,6 +384,9 @@ def cmdlineparser():
     parser.add_option("", "--nonotes", dest="addnotes",
         action="store_false", default=True,
         help="don't add notes about the errors")
+    parser.add_option("", "--summary", dest="summaryfile",
+        default=None, type="string", metavar="FILE",
+        help="write a summary of the failures of all the files to FILE in JSON format")
     parser.add_option("", "--autocorrect", dest="autocorrect",
         action="store_true", default=False,
         help="output automatic corrections where possible rather than describing issues")
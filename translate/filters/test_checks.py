@@ -1118,3 +1118,48 @@ def test_dialogsizes():
     assert fails(mozillachecker.dialogsizes, 'height: 12em;', 'height: 24xx;')
     assert fails(mozillachecker.dialogsizes, 'height: 12.5em;', 'height: 12,5em;')
     assert fails(mozillachecker.dialogsizes, 'width: 36em; height: 18em;', 'width: 30em; min-height: 20em;')
+
+
+def test_checkplan():
+    """test that the check plan is compiled once and kept up to date"""
+    stdchecker = checks.StandardChecker(checks.CheckerConfig(varmatches=[("$", None)]))
+    plan = stdchecker.getcheckplan()
+    assert stdchecker.getcheckplan() is plan
+    names = [step[0] for step in plan.steps]
+    # preconditions run before the tests they block
+    assert names.index("untranslated") < names.index("variables")
+    # an untranslated unit only fails the preconditions
+    unit = po.pounit(u"Save $file")
+    assert stdchecker.run_filters(unit).keys() == ["untranslated"]
+    unit.target = u"Stoor $leer"
+    assert "variables" in stdchecker.run_filters(unit)
+    # a new target language can ignore other tests
+    stdchecker.config.updatetargetlanguage("ja")
+    newplan = stdchecker.getcheckplan()
+    assert newplan is not plan
+    assert "startcaps" in names
+    assert "startcaps" not in [step[0] for step in newplan.steps]
+
+
+def test_teechecker_shared_prefilters():
+    """test that a TeeChecker shares prefilter results between checkers with
+    the same configuration"""
+    config = checks.CheckerConfig(varmatches=[("$", None)])
+    teechecker = checks.TeeChecker(checkerconfig=config,
+                                   checkerclasses=[checks.StandardChecker,
+                                                   checks.StandardChecker])
+    first, second = teechecker.checkers
+    assert first.prefilterkey == second.prefilterkey
+    calls = []
+    varfilter = first.varfilters[0]
+
+    def counting_varfilter(str1):
+        calls.append(str1)
+        return varfilter(str1)
+    first.varfilters = second.varfilters = [counting_varfilter]
+    unit = po.pounit(u"Save $file")
+    unit.target = u"Stoor $leer"
+    failures = teechecker.run_filters(unit)
+    assert "variables" in failures
+    assert sorted(calls) == sorted(set(calls))
+    assert first.results_cache == second.results_cache == {}
@@ -221,6 +221,38 @@ msgstr "koei"
         assert headerless_len(filter_result.units) == 0
 
 
+    def test_jobs(self):
+        """Tests that checking the units in several processes gives the same
+        result as checking them in this one."""
+        posource = ''.join(['#: test.c\nmsgid "test %d"\nmsgstr "REST %d"\n\n' % (i, i)
+                            for i in range(10)])
+        posource += 'msgid "file %s"\nmsgstr "leer %d"\n\nmsgid "fine"\nmsgstr "goed"\n'
+        serial = self.filter(self.parse_text(posource))
+        parallel = self.filter(self.parse_text(posource),
+                               cmdlineoptions=["--jobs=3"])
+        assert str(parallel) == str(serial)
+        assert headerless_len(parallel.units) == 11
+        assert 'startcaps' in first_translatable(parallel).geterrors()
+        assert [unit.source for unit in parallel.units[-2:]] == ["test 9", "file %s"]
+
+    def test_summary(self):
+        """Tests the summary of the failures."""
+        options, args = pofilter.cmdlineparser().parse_args([self.filename])
+        checkfilter = pofilter.pocheckfilter(options, None,
+                                             pofilter.build_checkerconfig(options))
+        posource = 'msgid "test"\nmsgstr "REST"\n\nmsgid "fine"\nmsgstr "goed"\n'
+        checkfilter.filterfile(self.parse_text(posource))
+        assert checkfilter.filesummary["units"] == 2
+        assert checkfilter.filesummary["failed"] == 1
+        assert checkfilter.filesummary["failures"]["startcaps"] == 1
+        checkfilter.summary["one.po"] = checkfilter.filesummary
+        checkfilter.summary["two.po"] = checkfilter.filesummary
+        summary = checkfilter.getsummary()
+        assert sorted(summary["files"]) == ["one.po", "two.po"]
+        assert summary["units"] == 4
+        assert summary["failures"]["startcaps"] == 2
+
+
 class TestXliffFilter(BaseTestFilter):
     """Test class for xliff-specific tests."""
     filetext = '''<?xml version="1.0" encoding="utf-8"?>
@@ -59,6 +59,9 @@ import re
 
 from translate.lang import data
 
+# The regular expressions of count_words() by punctuation
+_wordres = {}
+
 
 class Common(object):
     """This class is the common parent class for all language classes."""
@@ -318,6 +321,34 @@ class Common(object):
         return [w for w in cls.word_iter(text)]
     words = classmethod(words)
 
+    def count_words(cls, texts):
+        """Returns the number of words in each of the texts, as counted by
+        :meth:`words`, without building the lists of words.
+
+        A word is a run of non-space characters that isn't all punctuation, so
+        all the words of a text are found in a single regular expression pass.
+        """
+        if cls.word_iter.im_func is not Common.word_iter.im_func:
+            # This language splits words differently
+            return [len(cls.words(text)) for text in texts]
+        wordre = _wordres.get(cls.punctuation)
+        if wordre is None:
+            wordre = re.compile(u"\\S*[^\\s%s]\\S*" % re.escape(cls.punctuation),
+                                re.UNICODE)
+            _wordres[cls.punctuation] = wordre
+        findall = wordre.findall
+        counts = []
+        for text in texts:
+            if isinstance(text, str):
+                try:
+                    text = text.decode("ascii")
+                except UnicodeDecodeError:
+                    counts.append(len(cls.words(text)))
+                    continue
+            counts.append(len(findall(text)))
+        return counts
+    count_words = classmethod(count_words)
+
     def sentence_iter(cls, text, strip=True):
         """Returns an iterator over the sentences in text."""
         lastmatch = 0
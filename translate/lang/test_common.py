@@ -35,6 +35,15 @@ def test_words():
     assert words == [u"Don’t", u"send", u"e-mail"]
 
 
+def test_count_words():
+    """Tests that count_words() counts the words that words() finds."""
+    language = common.Common
+    texts = [u"", u"test sentence.", u"This is a weird test .",
+             u"Don’t send e-mail!", u"« ... »", "plain str, too"]
+    assert language.count_words(texts) == [len(language.words(text)) for text in texts]
+    assert language.count_words(texts) == [0, 2, 5, 3, 0, 3]
+
+
 @mark.xfail(reason="Could be comparison of different decompositions")
 def test_word_khmer():
     language = common.Common
@@ -21,6 +21,8 @@
 from collections import deque
 from weakref import WeakValueDictionary
 import gc
+import threading
+import time
 
 
 class LRUCachingDict(WeakValueDictionary):
@@ -130,3 +132,119 @@ class LRUCachingDict(WeakValueDictionary):
             self[key] = default
 
         return self[key]
+
+
+_missing = object()
+
+# fields of the linked list links used by LRUCache
+_PREV, _NEXT, _KEY, _VALUE, _EXPIRES = range(5)
+
+
+class LRUCache(object):
+    """Caching dictionary like object that holds on to at most maxsize
+    items, discarding the least recently used ones, and forgets items
+    older than ttl seconds (if ttl is given).
+
+    Unlike :class:`LRUCachingDict` it keeps strong references to its values,
+    so it can cache values like lists and dictionaries. It counts the
+    lookups that found an item in hits and the others in misses.
+    """
+
+    def __init__(self, maxsize, ttl=None):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        # key -> link, where the links form a circular doubly linked list
+        # from the least to the most recently used item around _root
+        self._links = {}
+        self._root = [None, None, None, None, None]
+        self._root[_PREV] = self._root[_NEXT] = self._root
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._links)
+
+    def __contains__(self, key):
+        return self.get(key, _missing, count=False) is not _missing
+
+    def _unlink(self, link):
+        link[_PREV][_NEXT] = link[_NEXT]
+        link[_NEXT][_PREV] = link[_PREV]
+
+    def _append(self, link):
+        """Puts link at the most recently used end."""
+        last = self._root[_PREV]
+        link[_PREV] = last
+        link[_NEXT] = self._root
+        last[_NEXT] = self._root[_PREV] = link
+
+    def get(self, key, default=None, count=True):
+        """Returns the value for key, or default if it is not cached (or
+        expired)."""
+        self._lock.acquire()
+        try:
+            link = self._links.get(key)
+            if link is None:
+                if count:
+                    self.misses += 1
+                return default
+            expires = link[_EXPIRES]
+            if expires is not None and expires < time.time():
+                self._unlink(link)
+                del self._links[key]
+                if count:
+                    self.misses += 1
+                return default
+            self._unlink(link)
+            self._append(link)
+            if count:
+                self.hits += 1
+            return link[_VALUE]
+        finally:
+            self._lock.release()
+
+    def __getitem__(self, key):
+        value = self.get(key, _missing)
+        if value is _missing:
+            raise KeyError(key)
+        return value
+
+    def __setitem__(self, key, value):
+        self._lock.acquire()
+        try:
+            if self.ttl is None:
+                expires = None
+            else:
+                expires = time.time() + self.ttl
+            link = self._links.get(key)
+            if link is None:
+                link = [None, None, key, value, expires]
+                self._links[key] = link
+            else:
+                self._unlink(link)
+                link[_VALUE] = value
+                link[_EXPIRES] = expires
+            self._append(link)
+            while len(self._links) > self.maxsize:
+                oldest = self._root[_NEXT]
+                self._unlink(oldest)
+                del self._links[oldest[_KEY]]
+        finally:
+            self._lock.release()
+
+    def __delitem__(self, key):
+        self._lock.acquire()
+        try:
+            link = self._links.pop(key)
+            self._unlink(link)
+        finally:
+            self._lock.release()
+
+    def clear(self):
+        self._lock.acquire()
+        try:
+            self._links.clear()
+            self._root[_PREV] = self._root[_NEXT] = self._root
+        finally:
+            self._lock.release()
@@ -21,6 +21,7 @@
 import sys
 import os.path
 import fnmatch
+import multiprocessing
 import traceback
 import optparse
 try:
@@ -32,6 +33,25 @@ from translate.misc import progressbar
 from translate import __version__
 
 
+# The parser, options and files of the current recursiveprocess() when the
+# files are processed in parallel. The worker processes are forked, so they
+# share these with the parent process.
+_paralleljob = None
+
+
+def _processjob(index):
+    """Processes the file at index of the current parallel job."""
+    parser, options, filejobs = _paralleljob
+    # Don't let the workers start processes of their own
+    options.jobs = 1
+    try:
+        success = parser.processfilejob(options, filejobs[index])
+        return index, success, parser.getjobreport(options, filejobs[index])
+    except KeyboardInterrupt:
+        # Let the parent process handle it
+        return index, False, None
+
+
 class ManPageOption(optparse.Option, object):
     ACTIONS = optparse.Option.ACTIONS + ("manpage",)
 
@@ -90,6 +110,7 @@ class RecursiveOptionParser(optparse.OptionParser, object):
         self.setmanpageoption()
         self.setprogressoptions()
         self.seterrorleveloptions()
+        self.setjobsoption()
         self.setformats(formats, usetemplates)
         self.setpsycooption()
         self.passthrough = []
@@ -333,6 +354,13 @@ class RecursiveOptionParser(optparse.OptionParser, object):
                      (", ".join(self.errorleveltypes)))
         self.define_option(errorleveloption)
 
+    def setjobsoption(self):
+        """Sets the option for the number of processes to use."""
+        jobsoption = optparse.Option(None, "--jobs", dest="jobs", default=1,
+                type="int", metavar="JOBS",
+                help="use JOBS processes to process files in parallel (default: 1)")
+        self.define_option(jobsoption)
+
     def getformathelp(self, formats):
         """Make a nice help string for describing formats..."""
         if None in formats:
@@ -516,6 +544,7 @@ class RecursiveOptionParser(optparse.OptionParser, object):
                                      self.isrecursive(options.template, 'template') and
                                      getattr(options, "allowrecursivetemplate", True))
         self.initprogressbar(inputfiles, options)
+        filejobs = []
         for inputpath in inputfiles:
             try:
                 templatepath = self.gettemplatename(options, inputpath)
@@ -540,20 +569,71 @@ class RecursiveOptionParser(optparse.OptionParser, object):
                 self.warning("Couldn't handle input file %s" %
                              inputpath, options, sys.exc_info())
                 continue
-            try:
-                success = self.processfile(fileprocessor, options,
-                                           fullinputpath, fulloutputpath,
-                                           fulltemplatepath)
-            except Exception, error:
-                if isinstance(error, KeyboardInterrupt):
-                    raise
-                self.warning("Error processing: input %s, output %s, template %s" %
-                             (fullinputpath, fulloutputpath,
-                              fulltemplatepath), options, sys.exc_info())
-                success = False
-            self.reportprogress(inputpath, success)
+            filejob = (inputpath, fileprocessor, fullinputpath,
+                       fulloutputpath, fulltemplatepath)
+            if getattr(options, "jobs", 1) > 1 and self.isparallel(options):
+                # the output directories are created above, before any
+                # file is processed
+                filejobs.append(filejob)
+            else:
+                success = self.processfilejob(options, filejob)
+                self.reportprogress(inputpath, success)
+        if filejobs:
+            self.processfilejobs(options, filejobs)
         del self.progressbar
 
+    def isparallel(self, options):
+        """Checks if the files can be processed in parallel, with each
+        file written to its own output file."""
+        return (options.recursiveoutput and options.input is not None and
+                hasattr(os, "fork"))
+
+    def processfilejob(self, options, filejob):
+        """Processes an individual file, reporting errors as warnings."""
+        (inputpath, fileprocessor, fullinputpath, fulloutputpath,
+         fulltemplatepath) = filejob
+        try:
+            return self.processfile(fileprocessor, options,
+                                    fullinputpath, fulloutputpath,
+                                    fulltemplatepath)
+        except Exception, error:
+            if isinstance(error, KeyboardInterrupt):
+                raise
+            self.warning("Error processing: input %s, output %s, template %s" %
+                         (fullinputpath, fulloutputpath,
+                          fulltemplatepath), options, sys.exc_info())
+            return False
+
+    def processfilejobs(self, options, filejobs):
+        """Processes the files in options.jobs worker processes, reporting
+        progress as they finish."""
+        global _paralleljob
+        _paralleljob = (self, options, filejobs)
+        try:
+            pool = multiprocessing.Pool(min(options.jobs, len(filejobs)))
+            try:
+                for index, success, report in pool.imap_unordered(_processjob,
+                                                                  range(len(filejobs))):
+                    self.addjobreport(options, filejobs[index], report)
+                    self.reportprogress(filejobs[index][0], success)
+                pool.close()
+            except KeyboardInterrupt:
+                pool.terminate()
+                raise
+            pool.join()
+        finally:
+            _paralleljob = None
+
+    def getjobreport(self, options, filejob):
+        """Returns what a worker process reports back to the parent process
+        after processing a file (see :meth:`addjobreport`)."""
+        return None
+
+    def addjobreport(self, options, filejob, report):
+        """Adds the report of a worker process on a file it processed to the
+        results of this process."""
+        pass
+
     def openinputfile(self, options, fullinputpath):
         """Opens the input file."""
         if fullinputpath is None:
@@ -0,0 +1,34 @@
+#!/usr/bin/env python
+
+from py import test
+
+from translate.misc import lru
+
+
+def test_lrucache_discards_least_recently_used():
+    cache = lru.LRUCache(2)
+    cache["a"] = [1]
+    cache["b"] = [2]
+    assert cache["a"] == [1]
+    cache["c"] = [3]
+    assert "a" in cache
+    assert "b" not in cache
+    assert "c" in cache
+    assert len(cache) == 2
+
+
+def test_lrucache_counts():
+    cache = lru.LRUCache(10)
+    assert cache.get("a") is None
+    cache["a"] = None
+    assert cache.get("a", "missing") is None
+    assert (cache.hits, cache.misses) == (1, 1)
+    test.raises(KeyError, cache.__getitem__, "b")
+    assert (cache.hits, cache.misses) == (1, 2)
+
+
+def test_lrucache_ttl():
+    cache = lru.LRUCache(10, ttl=-1)
+    cache["a"] = [1]
+    assert "a" not in cache
+    assert len(cache) == 0
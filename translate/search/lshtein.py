@@ -24,6 +24,9 @@ distance. See http://en.wikipedia.org/wiki/Levenshtein_distance.
 If available, the python-Levenshtein package will be used which will provide
 better performance as it is implemented natively. See
 http://trific.ath.cx/python/levenshtein/
+
+Otherwise the bit-parallel :func:`bitparallel_distance` is used, which also
+stops as soon as the strings can't be similar enough.
 """
 
 import math
@@ -57,6 +60,84 @@ def python_distance(a, b, stopvalue=-1):
     return current[l1]
 
 
+def bitparallel_distance(a, b, stopvalue=-1):
+    """Calculates the distance for use in similarity calculation with the
+    bit-parallel algorithm of Myers (as explained by Hyyrö), which handles
+    all the characters of a at once for every character of b.
+
+    Once the distance can't be stopvalue or less any more, a lower bound of
+    the distance is returned without looking at the rest of b. The rest of
+    the way from any row of the current column costs at least the difference
+    in length between the parts of a and b that are left. Going down the
+    column, the distance changes by at most one for every row, so the
+    smallest of those bounds is at the row that leaves as many characters
+    of a as there are of b."""
+    l1 = len(a)
+    l2 = len(b)
+    if stopvalue == -1:
+        # the distance is never more than this, so the exact distance is
+        # returned
+        stopvalue = max(l1, l2)
+    if l1 == 0:
+        return l2
+    if abs(l1 - l2) > stopvalue:
+        return abs(l1 - l2)
+    # The bits of peq[x] are set where x is in a
+    peq = {}
+    bit = 1
+    for x in a:
+        peq[x] = peq.get(x, 0) | bit
+        bit <<= 1
+    mask = bit - 1
+    last = bit >> 1
+    # The vertical deltas of the current column are all +1 or -1 where the
+    # bits of positive and negative are set
+    positive = mask
+    negative = 0
+    dist = l1
+    left = l2
+    # The distance at the row that leaves as many characters of a as of b,
+    # which moves down the diagonal from one column to the next. rowbit is
+    # the bit of the row above it, once it is in the column. The distance is
+    # never more than max(l1, l2), so it isn't needed for a stopvalue that
+    # large.
+    stopping = stopvalue < max(l1, l2)
+    diagonal = l1 - l2
+    rowbit = stopping and l1 >= l2 and 1 << (l1 - l2) or 0
+    for y in b:
+        left -= 1
+        eq = peq.get(y, 0)
+        xv = eq | negative
+        xh = (((eq & positive) + positive) ^ positive) | eq
+        hpositive = negative | (~(xh | positive) & mask)
+        hnegative = positive & xh
+        if hpositive & last:
+            dist += 1
+        elif hnegative & last:
+            dist -= 1
+        hpositive = ((hpositive << 1) | 1) & mask
+        hnegative = (hnegative << 1) & mask
+        positive = hnegative | (~(xv | hpositive) & mask)
+        negative = hpositive & xv
+        if rowbit:
+            # one step along the row above, and one down
+            if hpositive & rowbit:
+                diagonal += 1
+            elif hnegative & rowbit:
+                diagonal -= 1
+            if positive & rowbit:
+                diagonal += 1
+            elif negative & rowbit:
+                diagonal -= 1
+            if diagonal > stopvalue:
+                return diagonal
+            rowbit <<= 1
+        elif left == l1 and stopping:
+            diagonal = l2 - left
+            rowbit = 1
+    return dist
+
+
 def native_distance(a, b, stopvalue=0):
     """Same as python_distance in functionality. This uses the fast C
     version if we detected it earlier.
@@ -71,7 +152,7 @@ try:
 except ImportError:
     import logging
     logging.warning("Python-Levenshtein not found. Continuing with built-in (slower) fuzzy matching.")
-    distance = python_distance
+    distance = bitparallel_distance
 
 
 class LevenshteinComparer:
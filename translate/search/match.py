@@ -21,8 +21,12 @@
 """Class to perform translation memory matching from a store of
 translation units."""
 
+from array import array
+import bisect
 import itertools
 import heapq
+import multiprocessing
+import os
 import re
 
 from translate.search import lshtein
@@ -37,6 +41,34 @@ def sourcelen(unit):
     return len(unit.source)
 
 
+QGRAM_LENGTH = 3
+"""The length of the character q-grams used to prefilter TM candidates"""
+
+
+def qgrams(text, q=QGRAM_LENGTH):
+    """Returns the q-grams of text. Repeated q-grams are numbered, so that the
+    number of q-grams two strings have in common is the size of the
+    intersection of their q-grams."""
+    counts = {}
+    tokens = []
+    for i in range(len(text) - q + 1):
+        gram = text[i:i+q]
+        count = counts.get(gram, 0)
+        counts[gram] = count + 1
+        tokens.append((gram, count))
+    return tokens
+
+
+# The matcher used by the worker processes of matcher.matches_batch(). The
+# workers are forked, so they share it with the parent process.
+_batchmatcher = None
+
+
+def _batchmatches(text):
+    """Returns the matches of text in the matcher of the current batch."""
+    return _batchmatcher.matches(text)
+
+
 def _sort_matches(matches, match_info):
 
     def _matches_cmp(x, y):
@@ -53,13 +85,16 @@ class matcher(object):
 
     sort_reverse = False
 
-    def __init__(self, store, max_candidates=10, min_similarity=75, max_length=70, comparer=None, usefuzzy=False):
+    def __init__(self, store, max_candidates=10, min_similarity=75, max_length=70, comparer=None, usefuzzy=False, useindex=True):
         """max_candidates is the maximum number of candidates that should be assembled,
         min_similarity is the minimum similarity that must be attained to be included in
-        the result, comparer is an optional Comparer with similarity() function"""
+        the result, comparer is an optional Comparer with similarity() function.
+        useindex enables a q-gram index that skips candidates which can't
+        be similar enough, at the cost of the memory for the index."""
         if comparer is None:
             comparer = lshtein.LevenshteinComparer(max_length)
         self.comparer = comparer
+        self.useindex = useindex
         self.setparameters(max_candidates, min_similarity, max_length)
         self.usefuzzy = usefuzzy
         self.inittm(store)
@@ -86,6 +121,7 @@ class matcher(object):
         # reverse is deprectated - just use self.sort_reverse
         self.existingunits = {}
         self.candidates = base.TranslationStore()
+        self.index = None
 
         if isinstance(stores, base.TranslationStore):
             stores = [stores]
@@ -127,6 +163,9 @@ class matcher(object):
             simpleunit.addnote(candidate.getnotes(origin="translator"))
             simpleunit.fuzzy = candidate.isfuzzy()
             self.candidates.units.append(simpleunit)
+        # positions in the candidate list change, so the index is rebuilt
+        # when needed
+        self.index = None
         if sort:
             self.candidates.units.sort(key=sourcelen, reverse=self.sort_reverse)
 
@@ -136,6 +175,7 @@ class matcher(object):
         self.MAX_CANDIDATES = max_candidates
         self.MIN_SIMILARITY = min_similarity
         self.MAX_LENGTH = max_length
+        self.index = None
 
     def getstoplength(self, min_similarity, text):
         """Calculates a length beyond which we are not interested.
@@ -147,6 +187,78 @@ class matcher(object):
         The extra fat is because we don't use plain character distance only."""
         return max(len(text) * (min_similarity / 100.0), 1)
 
+    def buildindex(self):
+        """Builds the index of the positions of the candidates containing
+        each q-gram."""
+        index = {}
+        for position, candidate in enumerate(self.candidates.units):
+            if len(candidate.source) > self.MAX_LENGTH:
+                # matches() never looks further
+                break
+            for token in qgrams(candidate.source):
+                postings = index.get(token)
+                if postings is None:
+                    postings = index[token] = array('l')
+                postings.append(position)
+        self.index = index
+
+    def prefilter(self, text, min_similarity, startindex, stoplength):
+        """Returns the positions of the candidates between startindex and
+        stoplength that can possibly reach min_similarity, or None if the
+        index can't narrow down the search.
+
+        This uses the q-gram count filter: two strings within a Levenshtein
+        distance k have at least max(len(a), len(b)) - q + 1 - k*q q-grams in
+        common. A candidate with that many of the q-grams of text must also
+        have one of any (number of q-grams of text - that many + 1) of them,
+        so we only look at the candidates containing the rarest ones.
+        """
+        if not self.useindex or self.sort_reverse or \
+           not isinstance(self.comparer, lshtein.LevenshteinComparer):
+            return None
+        textlength = len(text)
+        maxlength = int(stoplength)
+        if maxlength > self.comparer.MAX_LEN or textlength > maxlength:
+            # The comparer will cut strings short, so distances can't be
+            # predicted
+            return None
+        # The strings are compared with the length of the longest of them
+        required = min([length - QGRAM_LENGTH + 1 -
+                        int((100 - min_similarity) * length / 100.0 + 1e-6) * QGRAM_LENGTH
+                        for length in range(textlength, maxlength + 1)])
+        if required <= 0:
+            return None
+
+        if self.index is None:
+            self.buildindex()
+        # the candidates are sorted by length, so we find the first one that
+        # is too long with a binary search
+        units = self.candidates.units
+        lowindex = startindex
+        endindex = len(units)
+        while lowindex < endindex:
+            mid = (lowindex + endindex) // 2
+            if sourcelen(units[mid]) <= stoplength:
+                lowindex = mid + 1
+            else:
+                endindex = mid
+
+        slices = []
+        for token in qgrams(text):
+            postings = self.index.get(token, ())
+            start = bisect.bisect_left(postings, startindex)
+            end = bisect.bisect_left(postings, endindex, start)
+            slices.append((end - start, start, end, postings))
+        slices.sort(key=lambda slice: slice[0])
+        slices = slices[:len(slices) - required + 1]
+        if sum([size for size, start, end, postings in slices]) >= endindex - startindex:
+            # Not worth it, we might as well look at all of them
+            return None
+        positions = set()
+        for size, start, end, postings in slices:
+            positions.update(postings[start:end])
+        return sorted(positions)
+
     def matches(self, text):
         """Returns a list of possible matches for given source text.
 
@@ -183,7 +295,14 @@ class matcher(object):
         stoplength = self.getstoplength(min_similarity, text)
         lowestscore = 0
 
-        for candidate in self.candidates.units[startindex:]:
+        positions = self.prefilter(text, min_similarity, startindex, stoplength)
+        if positions is None:
+            candidates = self.candidates.units[startindex:]
+        else:
+            units = self.candidates.units
+            candidates = [units[position] for position in positions]
+
+        for candidate in candidates:
             cmpstring = candidate.source
             if len(cmpstring) > stoplength:
                 break
@@ -208,6 +327,33 @@ class matcher(object):
         bestcandidates.sort(reverse=True)
         return self.buildunits(bestcandidates)
 
+    def matches_batch(self, texts, workers=1):
+        """Returns a list with the list of possible matches for each of the
+        given source texts, in the same order.
+
+        :param workers: The number of processes used for matching. The worker
+                        processes are forked, so they share the candidates
+                        with this process instead of copying them.
+        """
+        texts = list(texts)
+        if workers <= 1 or len(texts) < 2 or not hasattr(os, "fork"):
+            return [self.matches(text) for text in texts]
+        if self.useindex and self.index is None and not self.sort_reverse:
+            # Build it once here, rather than in every worker
+            self.buildindex()
+        global _batchmatcher
+        _batchmatcher = self
+        try:
+            pool = multiprocessing.Pool(min(workers, len(texts)))
+            try:
+                chunksize = max(len(texts) // (workers * 4), 1)
+                return pool.map(_batchmatches, texts, chunksize)
+            finally:
+                pool.close()
+                pool.join()
+        finally:
+            _batchmatcher = None
+
     def buildunits(self, candidates):
         """Builds a list of units conforming to base API, with the score
         in the comment."""
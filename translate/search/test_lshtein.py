@@ -14,6 +14,27 @@ class TestLevenshtein:
         assert lshtein.distance("words", "word") == 1
         assert lshtein.distance("word", "woord") == 1
 
+    def test_bitparallel_distance(self):
+        """Tests that the bit-parallel distance is the same as the plain one,
+        and stops once the distance is more than stopvalue"""
+        pairs = [("word", "word"), ("word", ""), ("", "word"), ("kitten", "sitting"),
+                 ("aaaaaa", "abb"), (u"na\xefve caf\xe9", u"naive cafe"),
+                 ("Open the file", "Save the file before closing it")]
+        for a, b in pairs:
+            assert lshtein.bitparallel_distance(a, b, 100) == lshtein.python_distance(a, b, 100)
+            assert lshtein.bitparallel_distance(b, a, 100) == lshtein.python_distance(a, b, 100)
+        # the end of b can't make up for the start
+        assert lshtein.bitparallel_distance("a" * 10, "b" * 10 + "a" * 5, 5) > 5
+        # the start of a can't be made up for, even though its end matches
+        # the start of b: b is not read as far as the item that can't be
+        # looked up
+        b = list("abcdefghij") + ["y", "y", []] + ["y"] * 7
+        assert 8 < lshtein.bitparallel_distance("x" * 10 + "abcdefghij", b, 8) <= 20
+        assert lshtein.bitparallel_distance(["one", "two"], ["one", "three"]) == 1
+        # without a stopvalue the exact distance is returned
+        assert lshtein.bitparallel_distance("hello world", "xyz") == 11
+        assert lshtein.bitparallel_distance("xyz", "hello world") == 11
+
     def test_basic_similarity(self):
         """Tests similarity correctness with a few basic values"""
         levenshtein = lshtein.LevenshteinComparer()
@@ -80,6 +80,38 @@ class TestMatch:
         assert len(candidates) == 1
         assert candidates[0] == "Open file"
 
+    def test_prefilter(self):
+        """Test that the q-gram index only skips candidates that can't match"""
+        sources = ["Open the file in a new window",
+                   "Open the file in a new tab",
+                   "Save the document before closing",
+                   "Close all the windows of the application",
+                   "The file could not be opened for writing"]
+        sources.extend(["Unrelated message number %03d" % i for i in range(50)])
+        csvfile = self.buildcsv(sources)
+        matcher = match.matcher(csvfile, min_similarity=80)
+        text = "Open the file in new window"
+        positions = matcher.prefilter(text, 80, 0, matcher.getstoplength(80, text))
+        assert positions is not None
+        candidates = [matcher.candidates.units[position].source for position in positions]
+        assert "Open the file in a new window" in candidates
+        assert "Unrelated message number 001" not in candidates
+        unindexed = match.matcher(csvfile, min_similarity=80, useindex=False)
+        assert self.candidatestrings(matcher.matches(text)) == \
+               self.candidatestrings(unindexed.matches(text)) == ["Open the file in a new window"]
+
+    def test_matches_batch(self):
+        """Test that batch matching in several processes gives the same
+        results as matching one text at a time"""
+        csvfile = self.buildcsv(["Open the file", "Open the files", "Close the file",
+                                 "Save the document", "Print the document"])
+        matcher = match.matcher(csvfile)
+        texts = ["Open a file", "Save a document", "Nothing like it", "Open the file"]
+        expected = [self.candidatestrings(matcher.matches(text)) for text in texts]
+        for workers in (1, 2):
+            results = matcher.matches_batch(texts, workers=workers)
+            assert [self.candidatestrings(units) for units in results] == expected
+
     def test_terminology(self):
         csvfile = self.buildcsv(["file", "computer", "directory"])
         matcher = match.terminologymatcher(csvfile)
@@ -0,0 +1,95 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+from StringIO import StringIO
+try:
+    import json
+except ImportError:
+    import simplejson as json
+
+from translate.services import tmserver
+
+
+class TestTMServer:
+
+    def setup_method(self, method):
+        self.server = tmserver.TMServer(":memory:", None)
+        self.server.tmdb.add_dict({"source": u"Open the file", "target": u"Maak die lêer oop",
+                                   "context": u""}, "en", "af")
+
+    def teardown_method(self, method):
+        # in memory databases are shared by all the TMDBs of a thread
+        self.server.tmdb.cursor.execute("DELETE FROM targets")
+        self.server.tmdb.cursor.execute("DELETE FROM sources")
+        self.server.tmdb.connection.commit()
+
+    def test_get_candidates_cached(self):
+        """checks that repeated lookups come from the cache"""
+        candidates = self.server.get_candidates(u"Open the file", "en", "af")
+        assert candidates[0]["target"] == u"Maak die lêer oop"
+        assert self.server.get_candidates(u"Open the file", "en", "af") is candidates
+        assert (self.server.cache.hits, self.server.cache.misses) == (1, 1)
+
+    def test_invalidate(self):
+        """checks that adding units for a language pair invalidates the
+        cached lookups for it only"""
+        assert self.server.get_candidates(u"Save the document", "en", "af") == []
+        self.server.get_candidates(u"Open the file", "en", "de")
+        self.server.tmdb.add_dict({"source": u"Save the document", "target": u"Stoor die dokument",
+                                   "context": u""}, "en", "af")
+        self.server.invalidate("en", "af")
+        candidates = self.server.get_candidates(u"Save the document", "en", "af")
+        assert candidates[0]["target"] == u"Stoor die dokument"
+        self.server.get_candidates(u"Open the file", "en", "de")
+        assert self.server.cache.hits == 1
+
+    def test_translate_units(self):
+        """checks that the batch lookup returns suggestions for each source
+        string, in order"""
+        body = json.dumps([u"Open the file", u"Nothing similar at all", u"Open the file"])
+        environ = {"PATH_INFO": "/en/af/units", "REQUEST_METHOD": "POST",
+                   "CONTENT_LENGTH": str(len(body)),
+                   "wsgi.input": StringIO(body)}
+        statuses = []
+        response = self.server.rest(environ, lambda status, headers: statuses.append(status))
+        assert statuses == ["200 OK"]
+        results = json.loads("".join(response))
+        assert len(results) == 3
+        assert results[0][0]["target"] == u"Maak die lêer oop"
+        assert results[1] == []
+        assert results[2] == results[0]
+        # the results were cached for later lookups
+        self.server.get_candidates(u"Nothing similar at all", "en", "af")
+        assert self.server.cache.hits == 1
+
+    def test_translate_units_invalid(self):
+        """checks that batch lookups that are not a short list of strings
+        are refused"""
+        self.server.max_batch = 2
+        for body in ['{"source": "Open the file"}', '[1, 2]', 'not json',
+                     json.dumps([u"one", u"two", u"three"])]:
+            environ = {"PATH_INFO": "/en/af/units", "REQUEST_METHOD": "POST",
+                       "CONTENT_LENGTH": str(len(body)),
+                       "wsgi.input": StringIO(body)}
+            statuses = []
+            self.server.rest(environ, lambda status, headers: statuses.append(status))
+            assert statuses == ["400 Bad Request"]
+
+    def test_translate_units_no_length(self):
+        """checks that a batch lookup without a length is refused"""
+        environ = {"PATH_INFO": "/en/af/units", "REQUEST_METHOD": "POST",
+                   "wsgi.input": StringIO('["Open the file"]')}
+        statuses = []
+        self.server.rest(environ, lambda status, headers: statuses.append(status))
+        assert statuses == ["411 Length Required"]
+
+    def test_get_stats(self):
+        """checks that the use of the cache is reported"""
+        self.server.get_candidates(u"Open the file", "en", "af")
+        self.server.get_candidates(u"Open the file", "en", "af")
+        environ = {"PATH_INFO": "/stats", "REQUEST_METHOD": "GET"}
+        statuses = []
+        response = self.server.rest(environ, lambda status, headers: statuses.append(status))
+        assert statuses == ["200 OK"]
+        stats = json.loads("".join(response))
+        assert stats["cache"] == {"size": 1, "maxsize": 1000, "hits": 1, "misses": 1}
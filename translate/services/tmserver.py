@@ -30,6 +30,8 @@ try:
 except ImportError:
     import simplejson as json  # API compatible with the json module
 
+from translate.lang import data
+from translate.misc import lru
 from translate.misc import selector
 from translate.misc import wsgi
 from translate.storage import base
@@ -40,7 +42,8 @@ class TMServer(object):
     """A RESTful JSON TM server."""
 
     def __init__(self, tmdbfile, tmfiles, max_candidates=3, min_similarity=75,
-            max_length=1000, prefix="", source_lang=None, target_lang=None):
+            max_length=1000, prefix="", source_lang=None, target_lang=None,
+            cache_size=1000, cache_ttl=None, max_batch=100):
         if not isinstance(tmdbfile, unicode):
             import sys
             tmdbfile = tmdbfile.decode(sys.getfilesystemencoding())
@@ -48,6 +51,13 @@ class TMServer(object):
         self.tmdb = tmdb.TMDB(tmdbfile, max_candidates, min_similarity,
                               max_length)
 
+        # suggestions are cached per language pair and generation; adding
+        # units for a language pair starts a new generation, so that the old
+        # suggestions are never used again and age out of the cache
+        self.cache = lru.LRUCache(cache_size, cache_ttl)
+        self._generations = {}
+        self.max_batch = max_batch
+
         if tmfiles:
             self._load_files(tmfiles, source_lang, target_lang)
 
@@ -59,12 +69,49 @@ class TMServer(object):
                       PUT=self.add_unit,
                       DELETE=self.forget_unit)
 
+        self.rest.add("/{slang}/{tlang}/units",
+                      POST=self.translate_units)
+
         self.rest.add("/{slang}/{tlang}/store/{sid:any}",
                       GET=self.get_store_stats,
                       PUT=self.upload_store,
                       POST=self.add_store,
                       DELETE=self.forget_store)
 
+        self.rest.add("/stats",
+                      GET=self.get_stats)
+
+    def _language_pair(self, slang, tlang):
+        return (data.normalize_code(slang), data.normalize_code(tlang))
+
+    def invalidate(self, slang, tlang):
+        """Forget the cached suggestions for a language pair."""
+        pair = self._language_pair(slang, tlang)
+        self._generations[pair] = self._generations.get(pair, 0) + 1
+
+    def get_candidates(self, uid, slang, tlang):
+        """Returns the TM suggestions for uid, from the cache if possible."""
+        return self.get_candidates_batch([uid], slang, tlang)[0]
+
+    def get_candidates_batch(self, uids, slang, tlang):
+        """Returns a list with the TM suggestions for each of uids, from the
+        cache if possible. The others are looked up together."""
+        pair = self._language_pair(slang, tlang)
+        generation = self._generations.get(pair, 0)
+        keys = [(pair, generation, uid, self.tmdb.max_candidates,
+                 self.tmdb.min_similarity, self.tmdb.max_length)
+                for uid in uids]
+        results = [self.cache.get(key) for key in keys]
+        missing = [index for index, candidates in enumerate(results)
+                   if candidates is None]
+        if missing:
+            found = self.tmdb.translate_units([uids[index] for index in missing],
+                                              slang, tlang)
+            for index, candidates in zip(missing, found):
+                self.cache[keys[index]] = candidates
+                results[index] = candidates
+        return results
+
     def _load_files(self, tmfiles, source_lang, target_lang):
         from translate.storage import factory
         if isinstance(tmfiles, list):
@@ -78,7 +125,7 @@ class TMServer(object):
     @selector.opliant
     def translate_unit(self, environ, start_response, uid, slang, tlang):
         start_response("200 OK", [('Content-type', 'text/plain')])
-        candidates = self.tmdb.translate_unit(uid, slang, tlang)
+        candidates = self.get_candidates(uid, slang, tlang)
         logging.debug("candidates: %s", unicode(candidates))
         response = json.dumps(candidates, indent=4)
         params = parse_qs(environ.get('QUERY_STRING', ''))
@@ -89,6 +136,41 @@ class TMServer(object):
             pass
         return [response]
 
+    @selector.opliant
+    def translate_units(self, environ, start_response, slang, tlang):
+        """return the TM suggestions for each of a JSON list of source
+        strings in POST data, as a JSON list in the same order"""
+        length = environ.get('CONTENT_LENGTH')
+        if not length:
+            start_response("411 Length Required", [('Content-type', 'text/plain')])
+            return ["the length of the POST data is required"]
+        try:
+            uids = json.loads(environ['wsgi.input'].read(int(length)))
+        except ValueError:
+            uids = None
+        if (not isinstance(uids, list) or
+            [uid for uid in uids if not isinstance(uid, basestring)]):
+            start_response("400 Bad Request", [('Content-type', 'text/plain')])
+            return ["expected a JSON list of strings"]
+        if len(uids) > self.max_batch:
+            start_response("400 Bad Request", [('Content-type', 'text/plain')])
+            return ["at most %d strings can be looked up at once" % self.max_batch]
+        start_response("200 OK", [('Content-type', 'text/plain')])
+        candidates = self.get_candidates_batch(uids, slang, tlang)
+        logging.debug("candidates: %s", unicode(candidates))
+        response = json.dumps(candidates, indent=4)
+        return [response]
+
+    @selector.opliant
+    def get_stats(self, environ, start_response):
+        """return the use of the suggestion cache as a JSON object"""
+        start_response("200 OK", [('Content-type', 'text/plain')])
+        stats = {"cache": {"size": len(self.cache),
+                           "maxsize": self.cache.maxsize,
+                           "hits": self.cache.hits,
+                           "misses": self.cache.misses}}
+        return [json.dumps(stats, indent=4)]
+
     @selector.opliant
     def add_unit(self, environ, start_response, uid, slang, tlang):
         start_response("200 OK", [('Content-type', 'text/plain')])
@@ -97,6 +179,7 @@ class TMServer(object):
         unit = base.TranslationUnit(data['source'])
         unit.target = data['target']
         self.tmdb.add_unit(unit, slang, tlang)
+        self.invalidate(slang, tlang)
         return [""]
 
     @selector.opliant
@@ -107,6 +190,7 @@ class TMServer(object):
         unit = base.TranslationUnit(data['source'])
         unit.target = data['target']
         self.tmdb.add_unit(unit, slang, tlang)
+        self.invalidate(slang, tlang)
         return [""]
 
     @selector.opliant
@@ -135,6 +219,7 @@ class TMServer(object):
         data.name = sid
         store = factory.getobject(data)
         count = self.tmdb.add_store(store, slang, tlang)
+        self.invalidate(slang, tlang)
         response = "added %d units from %s" % (count, sid)
         return [response]
 
@@ -144,6 +229,7 @@ class TMServer(object):
         start_response("200 OK", [('Content-type', 'text/plain')])
         units = json.loads(environ['wsgi.input'].read(int(environ['CONTENT_LENGTH'])))
         count = self.tmdb.add_list(units, slang, tlang)
+        self.invalidate(slang, tlang)
         response = "added %d units from %s" % (count, sid)
         return [response]
 
@@ -180,6 +266,15 @@ def main():
     parser.add_option("--max-length", dest="max_length", type="int",
                       default=1000,
                       help="Maxmimum string length")
+    parser.add_option("--cache-size", dest="cache_size", type="int",
+                      default=1000,
+                      help="number of lookups to cache (default: 1000)")
+    parser.add_option("--cache-ttl", dest="cache_ttl", type="int",
+                      default=None,
+                      help="seconds to cache a lookup for (default: until the TM changes)")
+    parser.add_option("--max-batch", dest="max_batch", type="int",
+                      default=100,
+                      help="maximum number of strings in a batch lookup (default: 100)")
     parser.add_option("--debug", action="store_true", dest="debug",
                       default=False,
                       help="enable debugging features")
@@ -209,7 +304,10 @@ def main():
                            max_length=options.max_length,
                            prefix="/tmserver",
                            source_lang=options.source_lang,
-                           target_lang=options.target_lang)
+                           target_lang=options.target_lang,
+                           cache_size=options.cache_size,
+                           cache_ttl=options.cache_ttl,
+                           max_batch=options.max_batch)
     wsgi.launch_server(options.bind, options.port, application.rest)
 
 
@@ -20,7 +20,11 @@
 
 """Base classes for storage interfaces."""
 
+import codecs
+import hashlib
 import logging
+import os
+import tempfile
 try:
     import cPickle as pickle
 except ImportError:
@@ -28,11 +32,26 @@ except ImportError:
 from exceptions import NotImplementedError
 
 import translate.i18n
+from translate.misc import lru
 from translate.misc.multistring import multistring
 from translate.misc.typecheck import accepts, Self, IsOneOf
 from translate.storage.placeables import StringElem, general, parse as rich_parse
 from translate.storage.workflow import StateEnum as states
 
+#: The number of bytes that chardet looks at to guess an encoding
+ENCODING_SAMPLE_SIZE = 64 * 1024
+#: Byte order marks and the encodings they imply, longest first
+ENCODING_BOMS = [
+    (codecs.BOM_UTF32_LE, 'utf-32'),
+    (codecs.BOM_UTF32_BE, 'utf-32'),
+    (codecs.BOM_UTF8, 'utf-8'),
+    (codecs.BOM_UTF16_LE, 'utf-16'),
+    (codecs.BOM_UTF16_BE, 'utf-16'),
+]
+# encodings guessed by chardet for the most recently seen samples, by the
+# digest of the sample
+_detected_encodings = lru.LRUCache(1000)
+
 
 def force_override(method, baseclass):
     """Forces derived classes to override method."""
@@ -485,6 +504,164 @@ class TranslationUnit(object):
         pass
 
 
+class UnitIndex(object):
+    """Finds the units of a store by id, source, context and source, or
+    location.
+
+    Every key maps to the list of units that have it, in the order of the
+    store, so duplicates are kept.  The map for each kind of key is only built
+    when it is first used, and is kept up to date as units are added to or
+    removed from the store (see :meth:`TranslationStore.getunitindex`). The
+    maps are built again if the list of units of the store is replaced or
+    changed directly, or if a unit that is found does not have the key any
+    more.  Other units whose strings changed after they were indexed are only
+    found by their new keys after :meth:`TranslationStore.makeindex`.
+    Headers and blank units are not indexed."""
+
+    def __init__(self, store):
+        self.store = store
+        self._maps = {}
+        # the list of units the maps were built from, and its length
+        self._storeunits = None
+        self._count = 0
+
+    def _checkstore(self):
+        """Forgets the maps if the units of the store changed behind our
+        back."""
+        units = self.store.units
+        if units is not self._storeunits or len(units) != self._count:
+            self._maps = {}
+            self._storeunits = units
+            self._count = len(units)
+
+    def _getkeys(kind, unit):
+        if kind == "id":
+            return [unit.getid()]
+        elif kind == "source":
+            if unit.hasplural():
+                return unit.source.strings
+            return [unit.source]
+        elif kind == "contextsource":
+            return [(unit.getcontext(), unit.source)]
+        elif kind == "location":
+            return unit.getlocations()
+    _getkeys = staticmethod(_getkeys)
+
+    def _isindexed(unit):
+        return not (unit.isheader() or unit.isblank())
+    _isindexed = staticmethod(_isindexed)
+
+    def _getmap(self, kind):
+        self._checkstore()
+        keymap = self._maps.get(kind, None)
+        if keymap is None:
+            keymap = {}
+            getkeys = self._getkeys
+            for unit in self.store.units:
+                if not self._isindexed(unit):
+                    continue
+                for key in getkeys(kind, unit):
+                    if key in keymap:
+                        keymap[key].append(unit)
+                    else:
+                        keymap[key] = [unit]
+            self._maps[kind] = keymap
+        return keymap
+
+    def _find(self, kind, key):
+        units = self._getmap(kind).get(key, [])
+        getkeys = self._getkeys
+        for unit in units:
+            if key not in getkeys(kind, unit):
+                # the units changed since they were indexed
+                self._maps = {}
+                return list(self._getmap(kind).get(key, []))
+        return list(units)
+
+    def add(self, unit):
+        """Adds a unit that was appended to the store to the maps that
+        were built."""
+        self._count += 1
+        if not self._isindexed(unit):
+            return
+        for kind, keymap in self._maps.iteritems():
+            for key in self._getkeys(kind, unit):
+                if key in keymap:
+                    keymap[key].append(unit)
+                else:
+                    keymap[key] = [unit]
+
+    def remove(self, unit):
+        """Removes a unit that is removed from the store from the maps that
+        were built."""
+        self._count -= 1
+        for kind, keymap in self._maps.iteritems():
+            for key in self._getkeys(kind, unit):
+                units = keymap.get(key, [])
+                # units compare equal by their strings, so look for this one
+                for i, indexedunit in enumerate(units):
+                    if indexedunit is unit:
+                        del units[i]
+                        if not units:
+                            del keymap[key]
+                        break
+
+    def findid(self, id):
+        """Returns the units with the given id."""
+        return self._find("id", id)
+
+    def findsource(self, source):
+        """Returns the units with the given source string (or one of its
+        plural forms)."""
+        return self._find("source", source)
+
+    def findcontextsource(self, context, source):
+        """Returns the units with the given context and source string."""
+        return self._find("contextsource", (context, source))
+
+    def findlocation(self, location):
+        """Returns the units with the given location."""
+        return self._find("location", location)
+
+
+class _LocationIndex(object):
+    """The dictionary like :attr:`TranslationStore.locationindex`, which maps
+    every location to its unit, or to None if several units have it. Changes
+    are made to the location map of the :class:`UnitIndex`."""
+
+    def __init__(self, locationmap):
+        self._map = locationmap
+
+    def __len__(self):
+        return len(self._map)
+
+    def __contains__(self, location):
+        return location in self._map
+
+    def __iter__(self):
+        return iter(self._map)
+
+    def keys(self):
+        return self._map.keys()
+
+    def __getitem__(self, location):
+        units = self._map[location]
+        if len(units) == 1:
+            return units[0]
+        return None
+
+    def get(self, location, default=None):
+        if location in self._map:
+            return self[location]
+        return default
+
+    def __setitem__(self, location, unit):
+        self._map[location] = [unit]
+
+    def __delitem__(self, location):
+        del self._map[location]
+
+
 class TranslationStore(object):
     """Base class for stores for multiple translation units of type
     UnitClass."""
@@ -502,9 +679,13 @@ class TranslationStore(object):
     suggestions_in_format = False
     """Indicates if format can store suggestions and alternative translation
     for a unit"""
+    cacheable = False
+    """Indicates whether parsed stores of this type can be cached as pickled
+    snapshots (see :func:`translate.storage.factory.getobject`)."""
 
     sourcelanguage = None
     targetlanguage = None
+    _unitindex = None
 
     def __init__(self, unitclass=None):
         """Constructs a blank TranslationStore."""
@@ -556,6 +737,8 @@ class TranslationStore(object):
         """
         unit._store = self
         self.units.append(unit)
+        if self._unitindex is not None:
+            self._unitindex.add(unit)
 
     def addsourceunit(self, source):
         """Adds and returns a new unit with the given source string.
@@ -567,41 +750,46 @@ class TranslationStore(object):
         return unit
 
     def findid(self, id):
-        """find unit with matching id by checking id_index"""
-        self.require_index()
-        return self.id_index.get(id, None)
+        """Finds the first unit with the given id. The units are searched
+        one by one, unless the store was indexed (see :meth:`makeindex`).
+
+        :rtype: :class:`TranslationUnit` or None
+        """
+        if self._unitindex is not None:
+            units = self._unitindex.findid(id)
+            if units:
+                return units[0]
+            return None
+        for unit in self.units:
+            if UnitIndex._isindexed(unit) and unit.getid() == id:
+                return unit
+        return None
 
     def findunit(self, source):
-        """Finds the unit with the given source string.
+        """Finds the first unit with the given source string. The units are
+        searched one by one, unless the store was indexed (see
+        :meth:`makeindex`).
 
         :rtype: :class:`TranslationUnit` or None
         """
-        if len(getattr(self, "sourceindex", [])):
-            if source in self.sourceindex:
-                return self.sourceindex[source][0]
-        else:
-            for unit in self.units:
-                if unit.source == source:
-                    return unit
+        if self._unitindex is not None:
+            units = self._unitindex.findsource(source)
+            if units:
+                return units[0]
+            return None
+        for unit in self.units:
+            if unit.source == source:
+                return unit
         return None
 
     def findunits(self, source):
         """Finds the units with the given source string.
 
-        :rtype: :class:`TranslationUnit` or None
+        :rtype: list of :class:`TranslationUnit`
         """
-        if len(getattr(self, "sourceindex", [])):
-            if source in self.sourceindex:
-                return self.sourceindex[source]
-        else:
-            #FIXME: maybe we should generate index here instead since
-            #we'll scan all units anyway
-            result = []
-            for unit in self.units:
-                if unit.source == source:
-                    result.append(unit)
-            return result
-        return None
+        if self._unitindex is not None:
+            return self._unitindex.findsource(source)
+        return [unit for unit in self.units if unit.source == source]
 
     def translate(self, source):
         """Returns the translated string for a given source string.
@@ -614,78 +802,49 @@ class TranslationStore(object):
         else:
             return None
 
-    def remove_unit_from_index(self, unit):
-        """Remove a unit from source and locaton indexes"""
-
-        def remove_unit(source):
-            if source in self.sourceindex:
-                try:
-                    self.sourceindex[source].remove(unit)
-                    if len(self.sourceindex[source]) == 0:
-                        del(self.sourceindex[source])
-                except ValueError:
-                    pass
-
-        if unit.hasplural():
-            for source in unit.source.strings:
-                remove_unit(source)
-        else:
-            remove_unit(unit.source)
-
-        for location in unit.getlocations():
-            if location in self.locationindex \
-                   and self.locationindex[location] is not None \
-                   and self.locationindex[location] == unit:
-                del(self.locationindex[location])
+    def getunitindex(self):
+        """Returns the :class:`UnitIndex` of this store, which is created the
+        first time it is needed."""
+        if self._unitindex is None:
+            self._unitindex = UnitIndex(self)
+        return self._unitindex
 
-    def add_unit_to_index(self, unit):
-        """Add a unit to source and location idexes"""
-        self.id_index[unit.getid()] = unit
+    def _getsourceindex(self):
+        return self.getunitindex()._getmap("source")
+    sourceindex = property(_getsourceindex, doc="""Maps every source
+        string (and plural form) to the list of units with it""")
 
-        def insert_unit(source):
-            if not source in self.sourceindex:
-                self.sourceindex[source] = [unit]
-            else:
-                self.sourceindex[source].append(unit)
+    def _getlocationindex(self):
+        return _LocationIndex(self.getunitindex()._getmap("location"))
+    locationindex = property(_getlocationindex, doc="""Maps every
+        location to its unit, or to None if several units have it""")
 
-        if unit.hasplural():
-            for source in unit.source.strings:
-                insert_unit(source)
-        else:
-            insert_unit(unit.source)
-
-        for location in unit.getlocations():
-            if location in self.locationindex:
-                # if sources aren't unique, don't use them
-                #FIXME: maybe better store a list of units like sourceindex
-                self.locationindex[location] = None
-            else:
-                self.locationindex[location] = unit
+    def remove_unit_from_index(self, unit):
+        """Remove a unit that is removed from the store from the indexes"""
+        if self._unitindex is not None:
+            self._unitindex.remove(unit)
 
     def makeindex(self):
-        """Indexes the items in this store. At least .sourceindex should be
-        usefull."""
-        self.locationindex = {}
-        self.sourceindex = {}
-        self.id_index = {}
+        """Indexes the units in this store (again, e.g. after their strings or
+        locations changed), so that :meth:`findunit` and :meth:`findid` use
+        the :class:`UnitIndex`. Every unit gets its position in the store as
+        ``index``."""
+        self._unitindex = UnitIndex(self)
         for index, unit in enumerate(self.units):
             unit.index = index
-            if not (unit.isheader() or unit.isblank()):
-                self.add_unit_to_index(unit)
 
     def require_index(self):
         """make sure source index exists"""
-        if not hasattr(self, "id_index"):
-            self.makeindex()
+        self.getunitindex()
 
     def getids(self, filename=None):
         """return a list of unit ids"""
-        self.require_index()
-        return self.id_index.keys()
+        return self.getunitindex()._getmap("id").keys()
 
     def __getstate__(self):
         odict = self.__dict__.copy()
         odict['fileobj'] = None
+        odict.pop('_unitindex', None)
         return odict
 
     def __setstate__(self, dict):
@@ -730,30 +889,66 @@ class TranslationStore(object):
         return newstore
     parsestring = classmethod(parsestring)
 
-    def detect_encoding(self, text, default_encodings=None):
-        if not default_encodings:
-            default_encodings = ['utf-8']
+    def _guess_encoding(self, text):
+        """Guesses the encoding of text.  Byte order marks, ASCII and UTF-8
+        are recognised first, and chardet only looks at the start of the text.
+
+        :return: a dictionary with the encoding and confidence like
+                 ``chardet.detect``, or None
+        """
+        for bom, encoding in ENCODING_BOMS:
+            if text.startswith(bom):
+                return {'encoding': encoding, 'confidence': 1.0}
         try:
-            import chardet
-            # many false complaints with ellipse (see bug 1825)
-            detected_encoding = chardet.detect(text.replace("…", ""))
-            if detected_encoding['confidence'] < 0.48:
-                detected_encoding = None
-            elif detected_encoding['encoding'] == 'ascii':
-                detected_encoding['encoding'] = 'utf-8'
+            if len(text.decode('utf-8')) == len(text):
+                return {'encoding': 'ascii', 'confidence': 1.0}
+            return {'encoding': 'utf-8', 'confidence': 1.0}
+        except UnicodeDecodeError:
+            pass
+        try:
+            from chardet.universaldetector import UniversalDetector
         except ImportError:
+            return None
+        # many false complaints with ellipse (see bug 1825)
+        sample = text[:ENCODING_SAMPLE_SIZE].replace("…", "")
+        # the guess only depends on the sample, so files that are parsed
+        # again are only looked at once
+        digest = hashlib.sha1(sample).digest()
+        cached = _detected_encodings.get(digest)
+        if cached is not None:
+            return cached[0]
+        detector = UniversalDetector()
+        for start in range(0, len(sample), 4096):
+            detector.feed(sample[start:start + 4096])
+            if detector.done:
+                break
+        detector.close()
+        detected_encoding = detector.result
+        if not detected_encoding['encoding'] or \
+           detected_encoding['confidence'] < 0.48:
             detected_encoding = None
+        _detected_encodings[digest] = (detected_encoding,)
+        return detected_encoding
+
+    def detect_encoding(self, text, default_encodings=None):
+        if not default_encodings:
+            default_encodings = ['utf-8']
+        detected_encoding = self._guess_encoding(text)
 
         encodings = []
         if self.encoding == 'auto':
-            if detected_encoding and detected_encoding['encoding'] not in encodings:
-                encodings.append(detected_encoding['encoding'])
+            if detected_encoding:
+                if detected_encoding['encoding'] == 'ascii':
+                    encodings.append('utf-8')
+                else:
+                    encodings.append(detected_encoding['encoding'])
             for encoding in default_encodings:
                 if encoding not in encodings:
                     encodings.append(encoding)
         else:
             encodings.append(self.encoding)
-            if detected_encoding and detected_encoding['encoding'] != self.encoding:
+            # any encoding we expect can read ASCII text
+            if detected_encoding and detected_encoding['encoding'] not in (self.encoding, 'ascii'):
                 logging.warn("trying to parse %s with encoding: %s but detected encoding is %s (confidence: %s)",
                              self.filename, self.encoding, detected_encoding['encoding'], detected_encoding['confidence'])
             encodings.append(self.encoding)
@@ -774,19 +969,54 @@ class TranslationStore(object):
         """parser to process the given source string"""
         self.units = pickle.loads(data).units
 
+    def serialize(self, fileobj):
+        """Writes the string representation to the given file object.
+        Stores that can write themselves piece by piece override this."""
+        fileobj.write(str(self))
+
     def savefile(self, storefile):
-        """Writes the string representation to the given file (or filename)."""
-        storestring = str(self)
+        """Writes the string representation to the given file (or filename).
+
+        A file given by name is only replaced once all of the output is
+        written, so it is left as it was if that fails."""
         if isinstance(storefile, basestring):
-            mode = 'w'
-            if self._binary:
-                mode = 'wb'
-            storefile = open(storefile, mode)
+            self._savefilename(storefile)
+            return
         self.fileobj = storefile
         self._assignname()
-        storefile.write(storestring)
+        self.serialize(storefile)
         storefile.close()
 
+    def _savefilename(self, filename):
+        mode = 'w'
+        if self._binary:
+            mode = 'wb'
+        dirname, basename = os.path.split(os.path.abspath(filename))
+        tempfd, tempname = tempfile.mkstemp(prefix=basename + ".", dir=dirname)
+        try:
+            tempfileobj = os.fdopen(tempfd, mode)
+            try:
+                self.serialize(tempfileobj)
+            finally:
+                tempfileobj.close()
+            if os.path.exists(filename):
+                mask = os.stat(filename).st_mode
+            else:
+                umask = os.umask(0)
+                os.umask(umask)
+                mask = 0666 & ~umask
+            os.chmod(tempname, mask & 07777)
+            if os.name == "nt" and os.path.exists(filename):
+                # rename() doesn't replace files on Windows
+                os.remove(filename)
+            os.rename(tempname, filename)
+        except:
+            if os.path.exists(tempname):
+                os.remove(tempname)
+            raise
+        self.fileobj = None
+        self.filename = filename
+
     def save(self):
         """Save to the file that data was originally read from, if
         available."""
@@ -797,14 +1027,18 @@ class TranslationStore(object):
         if not fileobj:
             filename = getattr(self, "filename", None)
             if filename:
-                fileobj = file(filename, mode)
+                fileobj = filename
         else:
             fileobj.close()
             filename = getattr(fileobj, "name",
                                getattr(fileobj, "filename", None))
             if not filename:
                 raise ValueError("No file or filename to save to")
-            fileobj = fileobj.__class__(filename, mode)
+            if isinstance(fileobj, file):
+                # replaced only once the output is written
+                fileobj = filename
+            else:
+                fileobj = fileobj.__class__(filename, mode)
         self.savefile(fileobj)
 
     def parsefile(cls, storefile):
@@ -827,3 +1061,14 @@ class TranslationStore(object):
         newstore._assignname()
         return newstore
     parsefile = classmethod(parsefile)
+
+    def iterparse(cls, storefile):
+        """Reads the given file (or opens the given filename) and yields its
+        units one at a time.
+
+        Stores that can parse incrementally override this so that callers
+        only reading through the units don't need the whole store in memory.
+        """
+        for unit in cls.parsefile(storefile).units:
+            yield unit
+    iterparse = classmethod(iterparse)
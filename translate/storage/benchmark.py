@@ -18,12 +18,86 @@
 # along with this program; if not, see <http://www.gnu.org/licenses/>.
 
 import cProfile
+import cStringIO
+import gc
 import os
 import pstats
 import random
 import sys
+import threading
+import time
 
+from translate.lang.common import Common
 from translate.storage import factory
+from translate.storage.base import TranslationStore
+from translate.storage import statsdb
+from translate.storage.placeables import general, StringElem
+from translate.storage.placeables import parse as rich_parse
+
+
+def unit_size(unit, seen=None):
+    """returns the approximate number of bytes used by a unit, not counting
+    objects already in seen (like strings shared between units)"""
+    if seen is None:
+        seen = set()
+
+    def size(obj):
+        if id(obj) in seen or isinstance(obj, (type, TranslationStore)):
+            return 0
+        seen.add(id(obj))
+        # The referents are the instance dictionary and slots of units and
+        # the items of containers. Looking at unit.__dict__ would create it.
+        return sys.getsizeof(obj) + sum([size(item) for item in gc.get_referents(obj)])
+
+    return size(unit)
+
+
+def wordcount_reference(string):
+    """counts the words in string one regular expression at a time, the way
+    statsdb.wordcount() used to, for comparison"""
+    string = statsdb.brtagre.sub("\n", string)
+    string = statsdb.xmltagre.sub("", string)
+    string = statsdb.numberre.sub(" ", string)
+    return len(Common.words(string))
+
+
+# Strings like those in XLIFF files from software and web content
+placeable_samples = [
+    u"Click <b>Save</b> to save the %s file.",
+    u"Visit http://www.example.com/help for more information.",
+    u"The file %(name)s could not be found in ~/Documents/files",
+    u"Send mail to info@example.com",
+    u"Copyright \u00a9 2011 Zuza Software Foundation",
+    u"You have {0} new messages",
+    u"Use --help to see the OPTIONS",
+    u"Download 3.5 MB of data\u2026",
+    u"Line one\nLine two &amp; three",
+    u'<a href="http://www.example.com" alt="Get &brand;!">&brandLong;</a>',
+]
+
+
+def placeables_parse_reference(tree, parse_funcs):
+    """parses placeables going down a level of the tree for every parsing
+    function, the way placeables.parse() used to, for comparison"""
+    if isinstance(tree, unicode):
+        tree = StringElem(tree)
+    if not parse_funcs:
+        return tree
+    parse_func = parse_funcs[0]
+    for leaf in tree.flatten():
+        if not leaf.istranslatable:
+            continue
+        unileaf = unicode(leaf)
+        if not unileaf:
+            continue
+        subleaves = parse_func(unileaf)
+        if subleaves is not None:
+            if not (len(subleaves) == 1 and type(leaf) is type(subleaves[0]) and
+                    leaf == subleaves[0]):
+                leaf.sub = subleaves
+        placeables_parse_reference(leaf, parse_funcs[1:])
+        leaf.prune()
+    return tree
 
 
 class TranslateBenchmarker:
@@ -82,13 +156,126 @@ class TranslateBenchmarker:
                 count += len(parsedfile.units)
         print "counted %d units" % count
 
+    def serialize_file(self):
+        """writes all the files in the test directory with serialize() and
+        with str(), checking that the output is the same"""
+        serializetime = strtime = 0
+        for dirpath, subdirs, filenames in os.walk(self.file_dir, topdown=False):
+            for name in filenames:
+                parsedfile = self.StoreClass(open(os.path.join(dirpath, name), 'r'))
+                for unit in parsedfile.units:
+                    # setting the strings makes them be quoted again
+                    unit.source = unit.source
+                    unit.target = unit.target
+                start = time.time()
+                output = str(parsedfile)
+                strtime += time.time() - start
+                start = time.time()
+                outputfile = cStringIO.StringIO()
+                parsedfile.serialize(outputfile)
+                serializetime += time.time() - start
+                assert outputfile.getvalue() == output
+        print "serialize(): %.3f seconds, str(): %.3f seconds" % (serializetime, strtime)
+
+    def measure_memory(self):
+        """parses all the files in the test directory and reports the memory
+        used by the units"""
+        count = 0
+        total_size = 0
+        seen = set()
+        for dirpath, subdirs, filenames in os.walk(self.file_dir, topdown=False):
+            for name in filenames:
+                pofilename = os.path.join(dirpath, name)
+                parsedfile = self.StoreClass(open(pofilename, 'r'))
+                for unit in parsedfile.units:
+                    total_size += unit_size(unit, seen)
+                count += len(parsedfile.units)
+        print "%s: %d units, %d bytes per unit" % (self.StoreClass.__name__, count, total_size / max(count, 1))
+
+    def count_words(self, rounds=5):
+        """counts the words of all the strings in the test directory with
+        statsdb.wordcounts() and with wordcount_reference()"""
+        strings = []
+        for dirpath, subdirs, filenames in os.walk(self.file_dir, topdown=False):
+            for name in filenames:
+                parsedfile = self.StoreClass(open(os.path.join(dirpath, name), 'r'))
+                for unit in parsedfile.units:
+                    strings.extend([unit.source or u"", unit.target or u""])
+        start = time.time()
+        for i in range(rounds):
+            reference = [wordcount_reference(string) for string in strings]
+        referencetime = time.time() - start
+        start = time.time()
+        for i in range(rounds):
+            counts = statsdb.wordcounts(strings)
+        elapsed = time.time() - start
+        assert counts == reference
+        print "%d strings, %d words: %.3f seconds, %.3f seconds before (%.1fx)" % \
+              (len(strings), sum(counts), elapsed, referencetime,
+               referencetime / max(elapsed, 1e-6))
+
+    def parse_placeables(self, rounds=5):
+        """parses the placeables of the strings in the test directory and of
+        placeable_samples with placeables.parse(), uncached and cached, and
+        with placeables_parse_reference()"""
+        strings = list(placeable_samples)
+        for dirpath, subdirs, filenames in os.walk(self.file_dir, topdown=False):
+            for name in filenames:
+                parsedfile = self.StoreClass(open(os.path.join(dirpath, name), 'r'))
+                for unit in parsedfile.units:
+                    strings.extend([unicode(unit.source or u""), unicode(unit.target or u"")])
+                    strings.append(placeable_samples[len(strings) % len(placeable_samples)])
+        start = time.time()
+        for i in range(rounds):
+            reference = [placeables_parse_reference(string, general.parsers) for string in strings]
+        referencetime = time.time() - start
+        start = time.time()
+        for i in range(rounds):
+            # trees can't be cached
+            uncached = [rich_parse(StringElem(string), general.parsers) for string in strings]
+        uncachedtime = time.time() - start
+        start = time.time()
+        for i in range(rounds):
+            cached = [rich_parse(string, general.parsers) for string in strings]
+        cachedtime = time.time() - start
+        assert map(repr, reference) == map(repr, uncached) == map(repr, cached)
+        print "%d strings: %.3f seconds uncached, %.3f seconds cached, %.3f seconds before" % \
+              (len(strings), uncachedtime, cachedtime, referencetime)
+
+    def concurrent_filetotals(self, num_threads=8, rounds=20):
+        """gets the statistics of all the files in the test directory from
+        num_threads threads at the same time, rounds times each"""
+        filenames = []
+        for dirpath, subdirs, names in os.walk(self.file_dir, topdown=False):
+            filenames.extend([os.path.join(dirpath, name) for name in names])
+        cache = statsdb.StatsCache(os.path.join(self.test_dir, "stats.db"))
+        # the first call caches the statistics
+        for filename in filenames:
+            cache.filetotals(filename)
+
+        def worker():
+            for i in range(rounds):
+                for filename in filenames:
+                    cache.filetotals(filename)
+
+        threads = [threading.Thread(target=worker) for i in range(num_threads)]
+        start = time.time()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        elapsed = time.time() - start
+        calls = num_threads * rounds * len(filenames)
+        print "%d threads: %d filetotals calls in %.2f seconds (%.2f ms per call)" % \
+              (num_threads, calls, elapsed, elapsed * 1000 / max(calls, 1))
+
 if __name__ == "__main__":
     storetype = "po"
     if len(sys.argv) > 1:
         storetype = sys.argv[1]
-    if storetype in factory.classes:
-        storeclass = factory.classes[storetype]
-    else:
+    try:
+        storeclass = factory.getclass("dummy.%s" % storetype)
+    except ValueError:
         print "StoreClass: '%s' is not a base class that the class factory can load" % storetype
         sys.exit()
     for sample_file_sizes in [
@@ -107,7 +294,8 @@ if __name__ == "__main__":
         benchmarker = TranslateBenchmarker("BenchmarkDir", storeclass)
         benchmarker.clear_test_dir()
         benchmarker.create_sample_files(*sample_file_sizes)
-        methods = [("create_sample_files", "*sample_file_sizes"), ("parse_file", ""), ]
+        methods = [("create_sample_files", "*sample_file_sizes"), ("parse_file", ""),
+                   ("serialize_file", ""), ("count_words", ""), ("parse_placeables", ""), ("concurrent_filetotals", ""), ]
         for methodname, methodparam in methods:
             print methodname, "%d dirs, %d files, %d strings, %d/%d words" % sample_file_sizes
             print "_______________________________________________________"
@@ -116,4 +304,5 @@ if __name__ == "__main__":
             stats = pstats.Stats(statsfile)
             stats.sort_stats('cumulative').print_stats(20)
             print "_______________________________________________________"
+        benchmarker.measure_memory()
         #benchmarker.clear_test_dir()
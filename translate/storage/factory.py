@@ -20,7 +20,13 @@
 
 """factory methods to build real storage objects that conform to base.py"""
 
+import cPickle
+import gc
+import hashlib
 import os
+import tempfile
+
+from translate import __version__ as toolkitversion
 
 
 #TODO: Monolingual formats (with template?)
@@ -162,11 +168,23 @@ def getclass(storefile, ignore=None, classes=None, classes_str=classes_str, hidd
     return storeclass
 
 
-def getobject(storefile, ignore=None, classes=None, classes_str=classes_str, hiddenclasses=hiddenclasses):
+defaultcachedir = os.getenv('TRANSLATE_STORE_CACHE') or None
+"""The default directory for snapshots of parsed stores, see getobject().
+Set with the TRANSLATE_STORE_CACHE environment variable."""
+
+
+def getobject(storefile, ignore=None, classes=None, classes_str=classes_str, hiddenclasses=hiddenclasses, cachedir=None):
     """Factory that returns a usable object for the type of file presented.
 
     :type storefile: file or str
     :param storefile: File object or file name.
+    :param cachedir: A directory to keep snapshots of parsed stores in,
+                     defaults to ``defaultcachedir``. A file is only
+                     parsed again if its path, modification time or size, or
+                     the toolkit version changed. Only stores that are
+                     :attr:`~translate.storage.base.TranslationStore.cacheable`
+                     are cached. The snapshots are pickles, so the directory
+                     has to be trusted like the code itself.
 
     Specify ignore to ignore some part at the back of the name (like .gz).
     """
@@ -177,21 +195,120 @@ def getobject(storefile, ignore=None, classes=None, classes_str=classes_str, hid
             return directory.Directory(storefile)
     storefilename = _getname(storefile)
     storeclass = getclass(storefile, ignore, classes=classes, classes_str=classes_str, hiddenclasses=hiddenclasses)
-    if os.path.exists(storefilename) or not getattr(storefile, "closed", True):
-        name, ext = os.path.splitext(storefilename)
-        ext = ext[len(os.path.extsep):].lower()
-        if ext in decompressclass:
-            _module, _class = decompressclass[ext]
-            module = __import__(_module, globals(), {}, [])
-            _file = getattr(module, _class)
-            storefile = _file(storefilename)
-        store = storeclass.parsefile(storefile)
+    cachedir = cachedir or defaultcachedir
+    if (cachedir and storeclass.cacheable and os.path.isfile(storefilename) and
+        isinstance(storefile, (basestring, file))):
+        store = _cachedobject(storefile, storefilename, storeclass, cachedir)
+    elif os.path.exists(storefilename) or not getattr(storefile, "closed", True):
+        store = storeclass.parsefile(_decompressed(storefile, storefilename))
     else:
         store = storeclass()
         store.filename = storefilename
     return store
 
 
+def _cachedobject(storefile, storefilename, storeclass, cachedir):
+    """Returns the store of the snapshot of storefilename in cachedir if it is
+    up to date, otherwise parses the file and saves a new snapshot."""
+    realpath = os.path.realpath(storefilename)
+    if isinstance(realpath, unicode):
+        realpath = realpath.encode('utf-8')
+    filestat = os.stat(realpath)
+    key = (realpath, filestat.st_mtime, filestat.st_size, toolkitversion.build,
+           storeclass.__module__, storeclass.__name__)
+    snapshotname = os.path.join(cachedir, hashlib.sha1(realpath).hexdigest() +
+                                os.path.extsep + "pickle")
+
+    store = _loadsnapshot(snapshotname, key)
+    if store is None:
+        store = storeclass.parsefile(_decompressed(storefile, storefilename))
+        _savesnapshot(snapshotname, key, store)
+    return store
+
+
+def _loadsnapshot(snapshotname, key):
+    """Returns the store saved in snapshotname if it was saved with key,
+    otherwise None."""
+    try:
+        snapshotfile = open(snapshotname, "rb")
+    except IOError:
+        return None
+    # Unpickling creates many objects, none of them garbage
+    gcenabled = gc.isenabled()
+    gc.disable()
+    try:
+        try:
+            unpickler = cPickle.Unpickler(snapshotfile)
+            if unpickler.load() != key:
+                return None
+            return unpickler.load()
+        except Exception:
+            # A broken snapshot is just replaced
+            return None
+    finally:
+        if gcenabled:
+            gc.enable()
+        snapshotfile.close()
+
+
+def _savesnapshot(snapshotname, key, store):
+    """Saves store with key in snapshotname, replacing it atomically so that
+    other processes never read half a snapshot."""
+    snapshotdir = os.path.dirname(snapshotname)
+    try:
+        if not os.path.isdir(snapshotdir):
+            os.makedirs(snapshotdir)
+        fd, tempname = tempfile.mkstemp(dir=snapshotdir)
+    except (IOError, OSError):
+        # The cache is only an optimisation
+        return
+    snapshotfile = os.fdopen(fd, "wb")
+    try:
+        pickler = cPickle.Pickler(snapshotfile, cPickle.HIGHEST_PROTOCOL)
+        pickler.dump(key)
+        pickler.dump(store)
+        snapshotfile.close()
+        if os.name == "nt" and os.path.exists(snapshotname):
+            os.remove(snapshotname)
+        os.rename(tempname, snapshotname)
+    except Exception:
+        snapshotfile.close()
+        os.remove(tempname)
+
+
+def iterunits(storefile, ignore=None, classes=None, classes_str=classes_str, hiddenclasses=hiddenclasses):
+    """Factory that yields the units of the file presented one at a time.
+
+    For formats that parse incrementally (like PO) only the current unit is
+    kept in memory, which is all that read-only tools need to walk large
+    files. Every unit refers to a store with the file's header through its
+    ``_store`` attribute.
+
+    :type storefile: file or str
+    :param storefile: File object or file name.
+
+    Specify ignore to ignore some part at the back of the name (like .gz).
+    """
+    storefilename = _getname(storefile)
+    storeclass = getclass(storefile, ignore, classes=classes, classes_str=classes_str, hiddenclasses=hiddenclasses)
+    if os.path.exists(storefilename) or not getattr(storefile, "closed", True):
+        for unit in storeclass.iterparse(_decompressed(storefile, storefilename)):
+            yield unit
+
+
+def _decompressed(storefile, storefilename):
+    """Returns a decompressing file object if storefilename indicates a
+    compressed file, otherwise storefile unchanged."""
+    name, ext = os.path.splitext(storefilename)
+    ext = ext[len(os.path.extsep):].lower()
+    if ext in decompressclass:
+        _module, _class = decompressclass[ext]
+        module = __import__(_module, globals(), {}, [])
+        _file = getattr(module, _class)
+        storefile = _file(storefilename)
+    return storefile
+
+
 supported = [
         ('Gettext PO file', ['po', 'pot'], ["text/x-gettext-catalog", "text/x-gettext-translation", "text/x-po", "text/x-pot"]),
         ('XLIFF Translation File', ['xlf', 'xliff', 'sdlxliff'], ["application/x-xliff", "application/x-xliff+xml"]),
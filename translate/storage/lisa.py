@@ -353,3 +353,56 @@ class LISAfile(base.TranslationStore):
         for entry in self.document.getroot().iterdescendants(self.namespaced(self.UnitClass.rootNode)):
             term = self.UnitClass.createfromxmlElement(entry)
             self.addunit(term, new=False)
+
+    def iterparse(cls, storefile):
+        """Reads the given file (or opens the given filename) and yields its
+        units one at a time as they are parsed.
+
+        The element of each unit is removed from the document soon after the
+        unit was used, so only the header stays in memory for units that the
+        caller doesn't keep. A unit that is kept still has its own XML, but
+        loses what it got from its ancestors in the document (like the file
+        of an XLIFF unit in its id)."""
+        if isinstance(storefile, basestring):
+            storefile = open(storefile, 'rb')
+        try:
+            for unit in cls._iterunits(storefile):
+                yield unit
+        finally:
+            storefile.close()
+    iterparse = classmethod(iterparse)
+
+    def _iterunits(cls, storefile):
+        """Yields the units of the open storefile, detaching the element of
+        every unit from the document after the next one was used."""
+        if hasattr(storefile, "seek"):
+            storefile.seek(0)
+        if etree.LXML_VERSION >= (2, 1, 0):
+            context = etree.iterparse(storefile, events=("end",), strip_cdata=False)
+        else:
+            context = etree.iterparse(storefile, events=("end",))
+        store = None
+        previous = None
+        for event, element in context:
+            if store is None:
+                # The root element is known from the first element that ends
+                root = element.getroottree().getroot()
+                namespace = root.nsmap.get(None, None)
+                assert root.tag == namespaced(namespace, cls.rootNode)
+                unittag = namespaced(namespace, cls.UnitClass.rootNode)
+                store = cls()
+                store.filename = getattr(storefile, 'name', '')
+                store.document = root.getroottree()
+                store.initbody()
+            if element.tag != unittag:
+                continue
+            unit = cls.UnitClass.createfromxmlElement(element)
+            unit.namespace = store.namespace
+            unit._store = store
+            yield unit
+            # The parser might still add the tail of the current element, so
+            # only the one before it is removed
+            if previous is not None:
+                previous.getparent().remove(previous)
+            previous = element
+    _iterunits = classmethod(_iterunits)
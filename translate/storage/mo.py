@@ -38,9 +38,14 @@ faster access of the MO file.  The hash is optional for Gettext
 and is not needed for reading or writing MO files, in this implementation
 it is always on and does produce sometimes different results to Gettext
 in very small files.
+
+:class:`mmapmofile` uses the hash table to look up messages in a memory
+mapped MO file without reading all of its units.
 """
 
 import array
+import cStringIO
+import mmap
 import re
 import struct
 
@@ -75,6 +80,10 @@ def hashpjw(str_param):
     g = None
     s = str_param
     for s in str_param:
+        # like the C implementation in Gettext, only hash up to the first NUL,
+        # i.e. only the singular msgid of a plural message
+        if s == "\0":
+            break
         hval = hval << 4
         hval += ord(s)
         g = hval & 0xf << (HASHWORDBITS - 4)
@@ -93,10 +102,13 @@ def get_next_prime_number(start):
             return False
         if (num == 2) or (num == 3):
             return True
-        # check for numbers > 4
-        for divider in range(2, num / 2):
+        # check for numbers > 4, a composite number has a divider that is
+        # not bigger than its square root
+        divider = 2
+        while divider * divider <= num:
             if num % divider == 0:
                 return False
+            divider += 1
         return True
 
     candidate = start
@@ -148,6 +160,15 @@ class mofile(poheader.poheader, base.TranslationStore):
 
     def __str__(self):
         """Output a string representation of the MO data file"""
+        output = cStringIO.StringIO()
+        self.serialize(output)
+        return output.getvalue()
+
+    def serialize(self, fileobj):
+        """Writes the MO data file to fileobj.
+
+        The tables are built in arrays and lists that are joined once, so
+        the time taken is linear in the size of the catalogue."""
         # check the header of this file for the copyright note of this function
 
         def add_to_hash_table(string, i):
@@ -191,12 +212,19 @@ class mofile(poheader.poheader, base.TranslationStore):
             if unit.target:
                 MESSAGES[source.encode("utf-8")] = target
         # using "I" works for 32- and 64-bit systems, but not for 16-bit!
-        hash_table = array.array("I", [0] * hash_size)
+        hash_table = array.array("I", [0]) * hash_size
         keys = MESSAGES.keys()
         # the keys are sorted in the .mo file
         keys.sort()
-        offsets = []
-        ids = strs = ''
+        # The header is 7 32-bit unsigned integers
+        keystart = 7 * 4 + 16 * len(keys) + hash_size * 4
+        # The string table first has the list of keys, then the list of values.
+        # Each entry has first the size of the string, then the file offset.
+        koffsets = array.array("i")
+        voffsets = array.array("i")
+        ids = []
+        strs = []
+        idslength = strslength = 0
         for i, id in enumerate(keys):
             # For each string, we need size and file offset.  Each string is
             # NUL terminated; the NUL does not count into the size.
@@ -205,37 +233,32 @@ class mofile(poheader.poheader, base.TranslationStore):
             string = MESSAGES[id]  # id already encoded for use as dictionary key
             if isinstance(string, unicode):
                 string = string.encode('utf-8')
-            offsets.append((len(ids), len(id), len(strs), len(string)))
-            ids = ids + id + '\0'
-            strs = strs + string + '\0'
-        output = ''
-        # The header is 7 32-bit unsigned integers
-        keystart = 7 * 4 + 16 * len(keys) + hash_size * 4
-        # and the values start after the keys
-        valuestart = keystart + len(ids)
-        koffsets = []
-        voffsets = []
-        # The string table first has the list of keys, then the list of values.
-        # Each entry has first the size of the string, then the file offset.
-        for o1, l1, o2, l2 in offsets:
-            koffsets = koffsets + [l1, o1 + keystart]
-            voffsets = voffsets + [l2, o2 + valuestart]
-        offsets = koffsets + voffsets
-        output = struct.pack("Iiiiiii",
-                             MO_MAGIC_NUMBER,   # Magic
-                             0,                 # Version
-                             len(keys),         # # of entries
-                             7 * 4,             # start of key index
-                             7 * 4 + len(keys) * 8,  # start of value index
-                             hash_size,         # size of hash table
-                             7 * 4 + 2 * (len(keys) * 8))  # offset of hash table
+            koffsets.extend((len(id), idslength + keystart))
+            # the values start after the keys, which are only all known at
+            # the end
+            voffsets.extend((len(string), strslength))
+            ids.append(id)
+            strs.append(string)
+            idslength += len(id) + 1
+            strslength += len(string) + 1
+        valuestart = keystart + idslength
+        for i in range(1, len(voffsets), 2):
+            voffsets[i] += valuestart
+        fileobj.write(struct.pack("Iiiiiii",
+                                  MO_MAGIC_NUMBER,   # Magic
+                                  0,                 # Version
+                                  len(keys),         # # of entries
+                                  7 * 4,             # start of key index
+                                  7 * 4 + len(keys) * 8,  # start of value index
+                                  hash_size,         # size of hash table
+                                  7 * 4 + 2 * (len(keys) * 8)))  # offset of hash table
         # additional data is not necessary for empty mo files
         if (len(keys) > 0):
-            output = output + array.array("i", offsets).tostring()
-            output = output + hash_table.tostring()
-            output = output + ids
-            output = output + strs
-        return output
+            fileobj.write(koffsets.tostring())
+            fileobj.write(voffsets.tostring())
+            fileobj.write(hash_table.tostring())
+            fileobj.write("\0".join(ids) + "\0")
+            fileobj.write("\0".join(strs) + "\0")
 
     def parse(self, input):
         """parses the given file or file source string"""
@@ -285,3 +308,184 @@ class mofile(poheader.poheader, base.TranslationStore):
             if context is not None:
                 newunit.msgctxt.append(context)
             self.addunit(newunit)
+
+
+class mmapmofile(mofile):
+    """A read-only .mo file that messages are looked up in directly.
+
+    The file is memory mapped and only its header is read when it is opened.
+    :meth:`findunit` and :meth:`translate` use the hash table of the file, and
+    units are only decoded when they are returned.  Accessing :attr:`units`
+    decodes all of them."""
+
+    def __init__(self, inputfile=None, unitclass=mounit):
+        self._data = ""
+        self._lenkeys = 0
+        self._units = []
+        mofile.__init__(self, inputfile, unitclass)
+
+    def _getunits(self):
+        if self._units is None:
+            self._units = []
+            for i in range(self._lenkeys):
+                unit = self._decodeunit(i)
+                unit._store = self
+                self._units.append(unit)
+        return self._units
+
+    def _setunits(self, units):
+        self._units = units
+
+    units = property(_getunits, _setunits)
+
+    def parse(self, input):
+        """Maps the given file, or uses the given file source string"""
+        if hasattr(input, 'name'):
+            self.filename = input.name
+        elif not getattr(self, 'filename', ''):
+            self.filename = ''
+        if hasattr(input, "fileno"):
+            if getattr(self, "_mmap", None) is not None:
+                self._mmap.close()
+            self._mmap = mmap.mmap(input.fileno(), 0, access=mmap.ACCESS_READ)
+            input.close()
+            input = self._mmap
+        if len(input) < 7 * 4:
+            raise ValueError("This is not an MO file")
+        little, = struct.unpack("<L", input[:4])
+        big, = struct.unpack(">L", input[:4])
+        if little == MO_MAGIC_NUMBER:
+            self._endian = "<"
+        elif big == MO_MAGIC_NUMBER:
+            self._endian = ">"
+        else:
+            raise ValueError("This is not an MO file")
+        magic, version_maj, version_min, self._lenkeys, self._startkey, \
+        self._startvalue, self._sizehash, self._offsethash = \
+            struct.unpack("%sLHHiiiii" % self._endian, input[:(7 * 4)])
+        if version_maj >= 1:
+            raise base.ParseError("""Unable to process version %d.%d MO files""" % (version_maj, version_min))
+        self._data = input
+        self._units = None
+        # the header sorts first, and gives the encoding of the other strings
+        if self._lenkeys and self._getkey(0) == "":
+            charset = re.search("charset=([^\\s]+)", self._getvalue(0))
+            if charset:
+                self._encoding = po.encodingToUse(charset.group(1))
+
+    def parsefile(cls, storefile):
+        """Maps the given file (or opens and maps the given filename)"""
+        if isinstance(storefile, basestring):
+            storefile = open(storefile, 'rb')
+        newstore = cls()
+        newstore.parse(storefile)
+        newstore.fileobj = storefile
+        newstore._assignname()
+        return newstore
+    parsefile = classmethod(parsefile)
+
+    def close(self):
+        """Releases the mapped file.  Units that were not decoded yet can not
+        be looked up any more."""
+        if getattr(self, "_mmap", None) is not None:
+            self._mmap.close()
+            self._mmap = None
+            self._data = ""
+            self._lenkeys = 0
+            self._sizehash = 0
+            if self._units is None:
+                self._units = []
+
+    def _getstring(self, start, i):
+        offset = start + i * 2 * 4
+        length, offset = struct.unpack("%sii" % self._endian,
+                                       self._data[offset:offset + 2 * 4])
+        return self._data[offset:offset + length]
+
+    def _getkey(self, i):
+        return self._getstring(self._startkey, i)
+
+    def _getvalue(self, i):
+        return self._getstring(self._startvalue, i)
+
+    def _decodeunit(self, i):
+        source = self._getkey(i)
+        context = None
+        if "\x04" in source:
+            context, source = source.split("\x04")
+        source = multistring(source.split("\0"), encoding=self._encoding)
+        unit = self.UnitClass(source)
+        unit.settarget(multistring(self._getvalue(i).split("\0"),
+                                   encoding=self._encoding))
+        if context is not None:
+            unit.msgctxt.append(context)
+        return unit
+
+    def _lookup(self, msgid):
+        """Returns the index of the message with the given encoded msgid, or
+        -1 if it is not in the file"""
+        if not self._sizehash:
+            # without a hash table the keys can still be bisected
+            low, high = 0, self._lenkeys
+            while low < high:
+                middle = (low + high) // 2
+                key = self._getkey(middle).split("\0")[0]
+                if key == msgid:
+                    return middle
+                elif key < msgid:
+                    low = middle + 1
+                else:
+                    high = middle
+            return -1
+        # Taken from gettext-0.17:gettext-runtime/intl/dcigettext.c
+        V = hashpjw(msgid)
+        S = self._sizehash
+        hash_cursor = V % S
+        increment = 1 + (V % (S - 2))
+        # every slot is probed at most once, even in a damaged file
+        for probe in xrange(S):
+            offset = self._offsethash + hash_cursor * 4
+            index, = struct.unpack("%sI" % self._endian,
+                                   self._data[offset:offset + 4])
+            if index == 0:
+                return -1
+            index -= 1
+            if self._getkey(index).split("\0")[0] == msgid:
+                return index
+            hash_cursor = (hash_cursor + increment) % S
+        return -1
+
+    def _encodedid(self, source, context):
+        if isinstance(source, multistring):
+            source = source.strings[0]
+        if isinstance(source, unicode):
+            source = source.encode(self._encoding)
+        if context:
+            if isinstance(context, unicode):
+                context = context.encode(self._encoding)
+            source = context + "\x04" + source
+        return source
+
+    def findunit(self, source, context=None):
+        """Finds the unit with the given source string, and context if given.
+
+        Unlike other stores, messages that have a context are only found if
+        it is given.
+
+        :rtype: :class:`mounit` or None
+        """
+        source = self._encodedid(source, context)
+        if not self._data:
+            # the file was closed, only the units decoded before are left
+            for unit in self._units or []:
+                if self._encodedid(unit.source, unit.getcontext()) == source:
+                    return unit
+            return None
+        index = self._lookup(source)
+        if index < 0:
+            return None
+        if self._units is not None:
+            return self._units[index]
+        unit = self._decodeunit(index)
+        unit._store = self
+        return unit
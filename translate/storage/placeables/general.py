@@ -42,11 +42,15 @@ def regex_parse(cls, pstr):
         start, end = match.start(), match.end()
         if oldend != start:
             matches.append(StringElem(pstr[oldend:start]))
-        matches.append(cls([pstr[start:end]]))
+        # A single string is taken as it is, while a list would be pruned
+        matches.append(cls(pstr[start:end]))
         oldend = end
     if oldend != len(pstr) and matches:
         matches.append(StringElem(pstr[oldend:]))
     return matches or None
+# The result only depends on the regular expression of the class and the
+# string, so parse() can cache it
+regex_parse.cacheable = True
 
 
 class AltAttrPlaceable(G):
@@ -25,6 +25,18 @@ based "rich" string element trees.
 
 from translate.storage.placeables import base, StringElem
 
+MAX_CACHED = 10000
+"""The number of parsed strings kept by :func:`parse`."""
+
+_cache = {}
+
+
+def iscacheable(parse_func):
+    """Whether the output of ``parse_func`` only depends on the string it
+    parses. Such parsing functions are marked with a true ``cacheable``
+    attribute, like :func:`general.regex_parse`."""
+    return getattr(getattr(parse_func, 'im_func', parse_func), 'cacheable', False)
+
 
 def parse(tree, parse_funcs):
     """Parse placeables from the given string or sub-tree by using the
@@ -39,6 +51,9 @@ def parse(tree, parse_funcs):
     set of leaves with the used parsing function removed from
     ``parse_funcs``.
 
+    Strings parsed with :func:`iscacheable` functions only are cached, and
+    a copy of the cached tree is returned when they are parsed again.
+
     :type  tree: unicode|StringElem
     :param tree: The string or string element sub-tree to parse.
     :type  parse_funcs: A list of parsing functions. It must take exactly
@@ -47,13 +62,32 @@ def parse(tree, parse_funcs):
                         form the original string. If nothing could be
                         parsed, it should return ``None``.
     """
-    if isinstance(tree, unicode):
-        tree = StringElem(tree)
+    if not isinstance(tree, unicode):
+        return _parse(tree, parse_funcs)
+
+    parse_funcs = tuple(parse_funcs)
+    for parse_func in parse_funcs:
+        if not iscacheable(parse_func):
+            return _parse(StringElem(tree), parse_funcs)
+    key = (tree, parse_funcs)
+    cached = _cache.get(key)
+    if cached is None:
+        if len(_cache) >= MAX_CACHED:
+            _cache.clear()
+        cached = _cache[key] = _parse(StringElem(tree), parse_funcs)
+    return cached.copy()
+
+
+def _parse(tree, parse_funcs):
+    """Parses the leaves of tree in place, see :func:`parse`.
+
+    Going down a level for every parsing function that leaves a leaf as it
+    is doesn't change the outcome, so all the functions are tried on the
+    leaf in turn, and only the remaining ones are used on the new leaves
+    from the first one that splits it."""
     if not parse_funcs:
         return tree
 
-    parse_func = parse_funcs[0]
-
     for leaf in tree.flatten():
         #FIXME: we might rather want to test for editability, but for now this
         # works better
@@ -64,26 +98,15 @@ def parse(tree, parse_funcs):
         if not unileaf:
             continue
 
-        subleaves = parse_func(unileaf)
-        if subleaves is not None:
-            if (len(subleaves) == 1 and type(leaf) is type(subleaves[0]) and
-                leaf == subleaves[0]):
-                pass
-            elif isinstance(leaf, unicode):
-                parent = tree.get_parent_elem(leaf)
-                if parent is not None:
-                    if len(parent.sub) == 1:
-                        parent.sub = subleaves
-                        leaf = parent
-                    else:
-                        leafindex = parent.sub.index(leaf)
-                        parent.sub[leafindex] = StringElem(subleaves)
-                        leaf = parent.sub[leafindex]
-            else:
-                leaf.sub = subleaves
-
-        parse(leaf, parse_funcs[1:])
-
-        if isinstance(leaf, StringElem):
-            leaf.prune()
+        for index, parse_func in enumerate(parse_funcs):
+            subleaves = parse_func(unileaf)
+            if subleaves is None or (len(subleaves) == 1 and
+                                     type(leaf) is type(subleaves[0]) and
+                                     leaf == subleaves[0]):
+                continue
+            leaf.sub = subleaves
+            _parse(leaf, parse_funcs[index+1:])
+            break
+
+        leaf.prune()
     return tree
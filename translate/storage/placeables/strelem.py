@@ -31,6 +31,14 @@ class ElementNotFoundError(ValueError):
     pass
 
 
+def _issub(elem, child):
+    """Whether ``child`` itself is one of the sub-elements of ``elem``."""
+    for sub in elem.sub:
+        if sub is child:
+            return True
+    return False
+
+
 class StringElem(object):
     """
     This class represents a sub-tree of a string parsed into a rich structure.
@@ -55,6 +63,8 @@ class StringElem(object):
     isvisible = True
     """Whether this string should be visible to the user. Not used at
     the moment."""
+    _parent = None
+    """The element this one was last found in, see :meth:`get_parent_elem`."""
 
     # INITIALIZERS #
     def __init__(self, sub=None, id=None, rid=None, xid=None, **kwargs):
@@ -498,11 +508,28 @@ class StringElem(object):
 
     def get_parent_elem(self, child):
         """Searches the current sub-tree for and returns the parent of the
-            ``child`` element."""
+            ``child`` element.
+
+            Elements remember the parent they were last found in. Since
+            ``sub`` lists are changed directly, that is only used once the
+            chain of remembered parents up to this element is confirmed."""
+        parent = getattr(child, '_parent', None)
+        if parent is not None and _issub(parent, child):
+            elem = parent
+            while elem is not self:
+                up = elem._parent
+                if up is None or not _issub(up, elem):
+                    break
+                elem = up
+            else:
+                return parent
+
         for elem in self.iter_depth_first():
             if not isinstance(elem, StringElem):
                 continue
             for sub in elem.sub:
+                if isinstance(sub, StringElem):
+                    sub._parent = elem
                 if sub is child:
                     return elem
         return None
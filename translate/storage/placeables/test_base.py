@@ -171,6 +171,35 @@ class TestStringElem:
         elem.prune()
         assert elem == StringElem(u'foobar')
 
+    def test_get_parent_elem(self):
+        child = self.elem.sub[1]
+        assert self.elem.get_parent_elem(child) is self.elem
+        # the remembered parent isn't used once the child was moved
+        newparent = StringElem([u'x'])
+        self.elem.sub.remove(child)
+        newparent.sub.append(child)
+        self.elem.sub.append(newparent)
+        assert self.elem.get_parent_elem(child) is newparent
+        assert StringElem(u'y').get_parent_elem(child) is None
+        assert newparent.get_parent_elem(child) is newparent
+
+    def test_parse_cache(self):
+        """checks that every parse of a string gets its own tree, and that
+        parsers that aren't known to be cacheable are always used"""
+        elem = parse(self.ORIGSTR, general.parsers)
+        assert repr(elem) == repr(self.elem)
+        assert elem is not self.elem and elem.sub[0] is not self.elem.sub[0]
+        elem.sub[0].sub = [u'foo']
+        assert repr(parse(self.ORIGSTR, general.parsers)) == repr(self.elem)
+
+        calls = []
+
+        def parse_func(pstr):
+            calls.append(pstr)
+        parse(self.ORIGSTR, [parse_func])
+        parse(self.ORIGSTR, [parse_func])
+        assert len(calls) == 2
+
 
 class TestConverters:
 
@@ -345,10 +345,17 @@ def parse_header(parse_state, store):
     return first_unit
 
 
-def parse_units(parse_state, store):
+def iter_units(parse_state, store):
+    """Yields the units one at a time as they are parsed, without adding them
+    to the store. Only the encoding is recorded on the store."""
     unit = parse_header(parse_state, store)
     while unit:
         unit.infer_state()
-        store.addunit(unit)
+        yield unit
         unit = parse_unit(parse_state)
+
+
+def parse_units(parse_state, store):
+    for unit in iter_units(parse_state, store):
+        store.addunit(unit)
     return parse_state.eof
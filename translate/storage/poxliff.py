@@ -398,3 +398,11 @@ class PoXliffFile(xliff.xlifffile, poheader.poheader):
                     nextplural = None
             else:
                 self.addunit(term, new=False)
+
+    def _iterunits(cls, storefile):
+        """Yields the units of the open storefile. Plural groups are only
+        known once all their units were seen, so the whole file is parsed."""
+        storefile.seek(0)
+        for unit in cls.parsestring(storefile.read()).units:
+            yield unit
+    _iterunits = classmethod(_iterunits)
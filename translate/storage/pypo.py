@@ -23,6 +23,7 @@ files (pofile).
 """
 
 from __future__ import generators
+import codecs
 import copy
 import cStringIO
 import re
@@ -41,6 +42,7 @@ lsep = "\n#: "
 
 po_unescape_map = {"\\r": "\r", "\\t": "\t", '\\"': '"', '\\n': '\n', '\\\\': '\\'}
 po_escape_map = dict([(value, key) for (key, value) in po_unescape_map.items()])
+po_escape_order = ["\\"] + [key for key in po_escape_map if key != "\\"]
 
 
 def escapeforpo(line):
@@ -48,19 +50,11 @@ def escapeforpo(line):
 
     :param line: unescaped text
     """
-    special_locations = []
-    for special_key in po_escape_map:
-        special_locations.extend(quote.find_all(line, special_key))
-    special_locations = dict.fromkeys(special_locations).keys()
-    special_locations.sort()
-    escaped_line = ""
-    last_location = 0
-    for location in special_locations:
-        escaped_line += line[last_location:location]
-        escaped_line += po_escape_map[line[location:location+1]]
-        last_location = location + 1
-    escaped_line += line[last_location:]
-    return escaped_line
+    # The backslashes go first, so that only those in line are escaped
+    for special_key in po_escape_order:
+        if special_key in line:
+            line = line.replace(special_key, po_escape_map[special_key])
+    return line
 
 
 def unescapehandler(escape):
@@ -69,6 +63,11 @@ def unescapehandler(escape):
 
 def wrapline(line):
     """Wrap text for po files."""
+    if len(line) <= 76:
+        # This is what textwrap gives for lines that fit
+        if line:
+            return [line]
+        return []
     wrappedlines = textwrap.wrap(line, 76, replace_whitespace=False, expand_tabs=False, drop_whitespace=False)
 
     # Lines should not start with a space...
@@ -755,6 +754,7 @@ class pounit(pocommon.pounit):
 class pofile(pocommon.pofile):
     """A .po file containing various units"""
     UnitClass = pounit
+    cacheable = True
 
     def parse(self, input):
         """Parses the given file or file source string."""
@@ -772,6 +772,30 @@ class pofile(pocommon.pofile):
 #        except Exception, e:
 #            raise base.ParseError(e)
 
+    def iterparse(cls, storefile):
+        """Reads the given file (or opens the given filename) and yields its
+        units one at a time as they are parsed.
+
+        Only the header is kept in the store that the units refer to, so
+        walking a large file this way needs memory for a single unit."""
+        store = cls()
+        store.units = []
+        if isinstance(storefile, basestring):
+            storefile = open(storefile, 'rb')
+        store.fileobj = storefile
+        store._assignname()
+        try:
+            parse_state = poparser.ParseState(iter(storefile), pounit)
+            for unit in poparser.iter_units(parse_state, store):
+                if unit.isheader():
+                    store.addunit(unit)
+                else:
+                    unit._store = store
+                yield unit
+        finally:
+            storefile.close()
+    iterparse = classmethod(iterparse)
+
     def removeduplicates(self, duplicatestyle="merge"):
         """Make sure each msgid is unique ; merge comments etc from
         duplicates into original"""
@@ -832,6 +856,45 @@ class pofile(pocommon.pofile):
 
         return output
 
+    def serialize(self, fileobj):
+        """Writes the file to fileobj a few units at a time, which gives the
+        same output as :meth:`__str__` without building all of it in
+        memory."""
+        encoding = getattr(self, "_encoding", "UTF-8")
+        try:
+            isutf8 = codecs.lookup(encoding).name == "utf-8"
+        except LookupError:
+            isutf8 = False
+        if not isutf8:
+            # __str__ switches to UTF-8 if a unit can't be encoded, which
+            # can't be done once some of the file is written.
+            fileobj.write(str(self))
+            return
+        # Like the rstrip() of _getoutput(), only whitespace followed by
+        # more output is written.
+        pending = u""
+        chunks = []
+        chunksize = 0
+        written = False
+        for unit in self.units:
+            unitsrc = unit._getoutput() + u"\n"
+            stripped = unitsrc.rstrip()
+            if not stripped:
+                pending += unitsrc
+                continue
+            chunk = (pending + stripped).encode("utf-8")
+            pending = unitsrc[len(stripped):]
+            chunks.append(chunk)
+            chunksize += len(chunk)
+            written = True
+            if chunksize > 65536:
+                fileobj.write("".join(chunks))
+                chunks = []
+                chunksize = 0
+        if written:
+            chunks.append("\n")
+            fileobj.write("".join(chunks))
+
     def _getoutput(self):
         """convert the units back to lines"""
         lines = []
@@ -874,3 +937,4 @@ class pofile(pocommon.pofile):
         for unit in self.units:
             if not (unit.isheader() or unit.isobsolete()):
                 yield unit
+
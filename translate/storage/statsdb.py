@@ -27,11 +27,13 @@ try:
     from sqlite3 import dbapi2
 except ImportError:
     from pysqlite2 import dbapi2
+import hashlib
 import os.path
 import re
 import sys
 import stat
-import thread
+import threading
+import time
 from UserDict import UserDict
 
 from translate import __version__ as toolkitversion
@@ -65,15 +67,32 @@ state_strings = {
 }
 
 
-def wordcount(string):
+def _countable(string):
+    """Removes the markup that shouldn't be counted as words from string."""
     # TODO: po class should understand KDE style plurals ##
     #string = kdepluralre.sub("", string) #Restore this if you really need support for old kdeplurals
-    string = brtagre.sub("\n", string)
-    string = xmltagre.sub("", string)
-    string = numberre.sub(" ", string)
+    if "<" in string:
+        string = brtagre.sub("\n", string)
+        string = xmltagre.sub("", string)
+    if "." in string:
+        string = numberre.sub(" ", string)
+    return string
+
+
+def wordcounts(strings, lang=Common):
+    """Returns the number of words in each of the strings, like
+    :func:`wordcount`, counting all of them at once.
+
+    :param lang: The language whose rules are used to count the words
+                 (see :meth:`~translate.lang.common.Common.count_words`).
+    """
+    return lang.count_words([_countable(string) for string in strings])
+
+
+def wordcount(string):
     #TODO: This should still use the correct language to count in the target
     #language
-    return len(Common.words(string))
+    return wordcounts([string])[0]
 
 
 def wordsinunit(unit):
@@ -84,16 +103,14 @@ def wordsinunit(unit):
         sourcestrings = unit.source.strings
     else:
         sourcestrings = [unit.source or ""]
-    for s in sourcestrings:
-        sourcewords += wordcount(s)
+    sourcewords = sum(wordcounts(sourcestrings))
     if not unit.istranslated():
         return sourcewords, targetwords
     if isinstance(unit.target, multistring):
         targetstrings = unit.target.strings
     else:
         targetstrings = [unit.target or ""]
-    for s in targetstrings:
-        targetwords += wordcount(s)
+    targetwords = sum(wordcounts(targetstrings))
     return sourcewords, targetwords
 
 
@@ -132,23 +149,149 @@ def transaction(f):
     """Modifies f to commit database changes if it executes without exceptions.
     Otherwise it rolls back the database.
 
+    The outermost transaction of a thread borrows a connection from the pool
+    for the duration of the call, and nested transactions are part of it.
+
     ALL publicly accessible methods in StatsCache MUST be decorated with this
     decorator.
     """
 
     def decorated_f(self, *args, **kwargs):
+        local = self._local
+        if getattr(local, "depth", 0):
+            local.depth += 1
+            try:
+                return f(self, *args, **kwargs)
+            finally:
+                local.depth -= 1
+
+        # A thread that used the connection outside of a transaction has
+        # it pinned, otherwise we borrow one. Either way it goes back to the
+        # pool when the transaction ends.
+        if getattr(local, "con", None) is None:
+            local.con = self._pool.acquire()
+            local.cur = local.con.cursor()
+        local.depth = 1
         try:
-            result = f(self, *args, **kwargs)
-            self.con.commit()
-            return result
+            try:
+                result = f(self, *args, **kwargs)
+                local.con.commit()
+                return result
+            except:
+                # If ANY exception is raised, we're left in an
+                # uncertain state and we MUST roll back any changes to avoid getting
+                # stuck in an inconsistent state.
+                local.con.rollback()
+                raise
+        finally:
+            local.depth = 0
+            self._pool.release(local.con)
+            local.con = local.cur = None
+    return decorated_f
+
+
+class ConnectionPool(object):
+    """A bounded pool of connections to a statistics database, shared by all
+    threads.
+
+    The database is put in WAL mode, so that readers don't block the writer
+    and the writer doesn't block readers. Connections that threads use
+    outside of transactions stay pinned to them until their next transaction
+    ends, or until they are dead. Waiting for a connection gives up after
+    timeout seconds.
+    """
+
+    def __init__(self, statsfile, maxsize=8, timeout=60):
+        self.statsfile = statsfile
+        self.maxsize = maxsize
+        self.timeout = timeout
+        self._idle = []
+        self._pinned = {}
+        self._count = 0
+        self._condition = threading.Condition()
+
+    def connect(self):
+        """Opens a new connection to the database."""
+        # sqlite needs to get the name in utf-8 on all platforms
+        con = dbapi2.connect(self.statsfile.encode('utf-8'),
+                             check_same_thread=False)
+        try:
+            con.execute("PRAGMA journal_mode = WAL")
+            con.execute("PRAGMA synchronous = NORMAL")
+        except dbapi2.OperationalError:
+            # Some filesystems can't do WAL, the rollback journal still works
+            pass
+        return con
+
+    def _reclaim(self):
+        """Returns the connections pinned by dead threads to the pool. Must
+        be called with the lock held."""
+        reclaimed = False
+        for thread, con in self._pinned.items():
+            if not thread.isAlive():
+                del self._pinned[thread]
+                con.rollback()
+                self._idle.append(con)
+                reclaimed = True
+        return reclaimed
+
+    def acquire(self):
+        """Takes a connection from the pool, waiting for one to be released
+        if all of them are in use."""
+        deadline = time.time() + self.timeout
+        self._condition.acquire()
+        try:
+            while True:
+                self._reclaim()
+                if self._idle:
+                    return self._idle.pop()
+                if self._count < self.maxsize:
+                    self._count += 1
+                    break
+                remaining = deadline - time.time()
+                if remaining <= 0:
+                    raise dbapi2.OperationalError(
+                        "no connection to %s was released in %d seconds" %
+                        (self.statsfile, self.timeout))
+                self._condition.wait(min(remaining, 1))
+        finally:
+            self._condition.release()
+        try:
+            return self.connect()
         except:
-            # If ANY exception is raised, we're left in an
-            # uncertain state and we MUST roll back any changes to avoid getting
-            # stuck in an inconsistent state.
-            if self.con:
-                self.con.rollback()
+            self._condition.acquire()
+            try:
+                self._count -= 1
+                self._condition.notify()
+            finally:
+                self._condition.release()
             raise
-    return decorated_f
+
+    def release(self, con):
+        """Returns a connection to the pool, unpinning it if it was pinned."""
+        self._condition.acquire()
+        try:
+            for thread, pinned in self._pinned.items():
+                if pinned is con:
+                    del self._pinned[thread]
+            self._idle.append(con)
+            self._condition.notify()
+        finally:
+            self._condition.release()
+
+    def pin(self):
+        """Returns the connection kept by the current thread, taking one from
+        the pool if it doesn't have one yet."""
+        thread = threading.currentThread()
+        con = self._pinned.get(thread)
+        if con is None:
+            con = self.acquire()
+            self._condition.acquire()
+            try:
+                self._pinned[thread] = con
+            finally:
+                self._condition.release()
+        return con
 
 
 def statefordb(unit):
@@ -172,8 +315,8 @@ class FileTotals(object):
     def db_keys(self):
         return ",".join(self.keys)
 
-    def __init__(self, cur):
-        self.cur = cur
+    def __init__(self, cache):
+        self.cache = cache
         self.cur.execute("""
             CREATE TABLE IF NOT EXISTS filetotals(
                 fileid                  INTEGER PRIMARY KEY AUTOINCREMENT,
@@ -185,6 +328,8 @@ class FileTotals(object):
                 untranslated            INTEGER NOT NULL,
                 translatedtargetwords   INTEGER NOT NULL);""")
 
+    cur = property(lambda self: self.cache.cur)
+
     def new_record(cls, state_for_db=None, sourcewords=None, targetwords=None):
         record = Record(cls.keys, compute_derived_values=cls._compute_derived_values)
         if state_for_db is not None:
@@ -263,6 +408,42 @@ def get_mod_info(file_path):
     return file_stat.st_mtime, file_stat.st_size
 
 
+def _unitsfrom(store, filename):
+    """Returns the units of store, which can also be a callback returning a
+    store. Without a store the units of filename are streamed one at a time
+    since the statistics never need more than one unit at once."""
+    if callable(store):
+        store = store()
+    if store:
+        return store.units
+    return factory.iterunits(filename)
+
+
+def unitchecksdigest(unit, salt=""):
+    """Returns a digest of everything in unit that the checks look at, to
+    find the units that changed since they were last checked.
+
+    :param salt: Something else the checks depend on, like the state of the
+                 suggestion file.
+    """
+
+    def strings(text):
+        return [unicode(string) for string in getattr(text, "strings", [text])]
+
+    values = (strings(unit.source), strings(unit.target), unit.getcontext(),
+              unit.getnotes(), unit.getlocations(), unit.isfuzzy(),
+              unit.isreview(), unit.get_state_id())
+    return hashlib.md5(salt + repr(values)).hexdigest()
+
+
+def checkssalt(filename):
+    """Returns the salt for :func:`unitchecksdigest` of the units of
+    filename."""
+    if os.path.exists(suggestion_filename(filename)):
+        return repr(get_mod_info(suggestion_filename(filename)))
+    return ""
+
+
 def suggestion_extension():
     return os.path.extsep + 'pending'
 
@@ -274,44 +455,57 @@ def suggestion_filename(filename):
 # ALL PUBLICLY ACCESSIBLE METHODS MUST BE DECORATED WITH THE transaction DECORATOR.
 class StatsCache(object):
     """An object instantiated as a singleton for each statsfile that provides
-    access to the database cache from a pool of StatsCache objects."""
+    access to the database cache. It is shared by all threads, which use
+    connections from a :class:`ConnectionPool`."""
     _caches = {}
+    _caches_lock = threading.Lock()
     defaultfile = None
-    con = None
-    """This cache's connection"""
-    cur = None
-    """The current cursor"""
+    maxconnections = 8
+    """The maximum number of connections to a statsfile"""
+
+    def _connection(self):
+        local = self._local
+        if getattr(local, "con", None) is None:
+            local.con = self._pool.pin()
+            local.cur = local.con.cursor()
+        return local.con, local.cur
+
+    con = property(lambda self: self._connection()[0],
+                   doc="This thread's connection")
+    cur = property(lambda self: self._connection()[1],
+                   doc="The current cursor")
 
     def __new__(cls, statsfile=None):
-        current_thread = thread.get_ident()
 
         def make_database(statsfile):
 
-            def connect(cache):
+            def clear_old_data():
                 # sqlite needs to get the name in utf-8 on all platforms
-                cache.con = dbapi2.connect(statsfile.encode('utf-8'))
-                cache.cur = cache.con.cursor()
-
-            def clear_old_data(cache):
+                con = dbapi2.connect(statsfile.encode('utf-8'))
                 try:
-                    cache.cur.execute("""SELECT min(toolkitbuild) FROM files""")
-                    val = cache.cur.fetchone()
-                    # If the database is empty, we have no idea whether its layout
-                    # is correct, so we might as well delete it.
-                    if val is None or val[0] < toolkitversion.build:
-                        cache.con.close()
-                        del cache
-                        os.unlink(statsfile)
-                        return True
-                    return False
-                except dbapi2.OperationalError:
-                    return False
-
-            cache = cls._caches.setdefault(current_thread, {})[statsfile] = object.__new__(cls)
-            connect(cache)
-            if clear_old_data(cache):
-                connect(cache)
+                    try:
+                        cur = con.cursor()
+                        cur.execute("""SELECT min(toolkitbuild) FROM files""")
+                        val = cur.fetchone()
+                    except dbapi2.OperationalError:
+                        return
+                finally:
+                    con.close()
+                # If the database is empty, we have no idea whether its layout
+                # is correct, so we might as well delete it.
+                if val is None or val[0] < toolkitversion.build:
+                    # the WAL files belong to the old database as well
+                    for filename in (statsfile, statsfile + u"-wal",
+                                     statsfile + u"-shm"):
+                        if os.path.exists(filename):
+                            os.unlink(filename)
+
+            clear_old_data()
+            cache = object.__new__(cls)
+            cache._pool = ConnectionPool(statsfile, cls.maxconnections)
+            cache._local = threading.local()
             cache.create()
+            cls._caches[statsfile] = cache
             return cache
 
         if not statsfile:
@@ -329,16 +523,20 @@ class StatsCache(object):
             statsfile = cls.defaultfile
         else:
             statsfile = os.path.realpath(statsfile)
-        # First see if a cache for this file already exists:
-        if current_thread in cls._caches and statsfile in cls._caches[current_thread]:
-            return cls._caches[current_thread][statsfile]
-        # No existing cache. Let's build a new one and keep a copy
-        return make_database(statsfile)
+        cls._caches_lock.acquire()
+        try:
+            # First see if a cache for this file already exists:
+            if statsfile in cls._caches:
+                return cls._caches[statsfile]
+            # No existing cache. Let's build a new one and keep a copy
+            return make_database(statsfile)
+        finally:
+            cls._caches_lock.release()
 
     @transaction
     def create(self):
         """Create all tables and indexes."""
-        self.file_totals = FileTotals(self.cur)
+        self.file_totals = FileTotals(self)
 
         self.cur.execute("""CREATE TABLE IF NOT EXISTS files(
             fileid INTEGER PRIMARY KEY AUTOINCREMENT,
@@ -380,8 +578,20 @@ class StatsCache(object):
             name VARCHAR NOT NULL,
             message VARCHAR);""")
 
-        self.cur.execute("""CREATE INDEX IF NOT EXISTS uniterrorindex
-            ON uniterrors(fileid, configid);""")
+        # uniterrorindex only covered (fileid, configid)
+        self.cur.execute("""DROP INDEX IF EXISTS uniterrorindex;""")
+
+        self.cur.execute("""CREATE INDEX IF NOT EXISTS uniterrorunitindex
+            ON uniterrors(fileid, configid, unitindex);""")
+
+        self.cur.execute("""CREATE TABLE IF NOT EXISTS unitchecks(
+            fileid INTEGER NOT NULL,
+            configid INTEGER NOT NULL,
+            unitindex INTEGER NOT NULL,
+            digest VARCHAR NOT NULL);""")
+
+        self.cur.execute("""CREATE INDEX IF NOT EXISTS unitchecksindex
+            ON unitchecks(fileid, configid, unitindex);""")
 
     @transaction
     def _getfileid(self, filename, check_mod_info=True, store=None):
@@ -414,12 +624,7 @@ class StatsCache(object):
                 return fileid
 
         # file wasn't in db at all, lets recache it
-        if callable(store):
-            store = store()
-        else:
-            store = store or factory.getobject(realpath)
-
-        return self._cachestore(store, realpath, mod_info)
+        return self._cacheunits(_unitsfrom(store, realpath), realpath, mod_info)
 
     def _getstoredcheckerconfig(self, checker):
         """See if this checker configuration has been used before."""
@@ -463,18 +668,40 @@ class StatsCache(object):
     def _cachestore(self, store, realpath, mod_info):
         """Calculates and caches the statistics of the given store
         unconditionally."""
-        self.cur.execute("""DELETE FROM files WHERE
-            path=?;""", (realpath,))
-        self.cur.execute("""iNSERT INTO files
-            (fileid, path, st_mtime, st_size, toolkitbuild) values (NULL, ?, ?, ?, ?);""",
-            (realpath, mod_info[0], mod_info[1], toolkitversion.build))
-        # Unusual capitalisation intended. See bug 2073.
-        fileid = self.cur.lastrowid
+        return self._cacheunits(store.units, realpath, mod_info)
+
+    @transaction
+    def _cacheunits(self, units, realpath, mod_info):
+        """Calculates and caches the statistics of the given units
+        unconditionally. units can be any iterable, such as a stream from
+        :func:`factory.iterunits`.
+
+        A file keeps its fileid, so that only its units that changed have
+        to be checked again (see :meth:`_cachefilechecks`)."""
+        self.cur.execute("""UPDATE files
+            SET st_mtime=?, st_size=?, toolkitbuild=?
+            WHERE path=?;""",
+            (mod_info[0], mod_info[1], toolkitversion.build, realpath))
+        if self.cur.rowcount:
+            self.cur.execute("""SELECT fileid FROM files WHERE
+                path=?;""", (realpath,))
+            fileid = self.cur.fetchone()[0]
+            # Without the noerror entry the checks are brought up to date
+            # the next time they are needed
+            self.cur.execute("""DELETE FROM uniterrors WHERE
+                fileid=? AND unitindex=-1;""", (fileid,))
+        else:
+            self.cur.execute("""iNSERT INTO files
+                (fileid, path, st_mtime, st_size, toolkitbuild) values (NULL, ?, ?, ?, ?);""",
+                (realpath, mod_info[0], mod_info[1], toolkitversion.build))
+            # Unusual capitalisation intended. See bug 2073.
+            fileid = self.cur.lastrowid
         self.cur.execute("""DELETE FROM units WHERE
             fileid=?""", (fileid,))
-        self._cacheunitstats(store.units, fileid)
+        self._cacheunitstats(units, fileid)
         return fileid
 
+    @transaction
     def file_extended_totals(self, filename, store=None):
         stats = {}
         fileid = self._getfileid(filename, store=store)
@@ -491,6 +718,7 @@ class StatsCache(object):
                 }
         return stats
 
+    @transaction
     def filetotals(self, filename, store=None, extended=False):
         """Retrieves the statistics for the given file if possible, otherwise
         delegates to cachestore()."""
@@ -501,7 +729,7 @@ class StatsCache(object):
 
     @transaction
     def _cacheunitschecks(self, units, fileid, configid, checker, unitindex=None):
-        """Helper method for cachestorechecks() and recacheunit()"""
+        """Helper method for recacheunit()"""
         # We always want to store one dummy error to know that we have actually
         # run the checks on this file with the current checker configuration
         dummy = (-1, fileid, configid, "noerror", "")
@@ -533,16 +761,78 @@ class StatsCache(object):
         return errornames
 
     @transaction
-    def _cachestorechecks(self, fileid, store, checker, configid):
-        """Calculates and caches the error statistics of the given store
-        unconditionally."""
-        # Let's purge all previous failures because they will probably just
-        # fill up the database without much use.
+    def _cachestorechecks(self, fileid, store, checker, configid, salt=""):
+        """Calculates and caches the error statistics of the given store."""
+        return self._cachefilechecks(fileid, store.units, checker, configid,
+                                     salt)
+
+    @transaction
+    def _cachefilechecks(self, fileid, units, checker, configid, salt=""):
+        """Calculates and caches the error statistics of all the units of a
+        file. units can be any iterable.
+
+        Only the units that changed since they were last checked with this
+        checker configuration are checked again. Units are recognised by
+        their :func:`unitchecksdigest`, so a unit that only moved keeps its
+        errors as well."""
+        self.cur.execute("""SELECT unitindex, digest FROM unitchecks
+            WHERE fileid=? AND configid=?;""", (fileid, configid))
+        olddigests = dict(self.cur.fetchall())
+        self.cur.execute("""SELECT unitindex, name, message FROM uniterrors
+            WHERE fileid=? AND configid=? AND unitindex!=-1;""",
+            (fileid, configid))
+        olderrors = {}
+        for unitindex, name, message in self.cur.fetchall():
+            olderrors.setdefault(unitindex, []).append((name, message))
+        if not olddigests:
+            # Nothing to reuse, or errors from before the digests were stored
+            olderrors = {}
+            self.cur.execute("""DELETE FROM uniterrors WHERE
+                fileid=? AND configid=?;""", (fileid, configid))
+        oldindices = dict([(digest, unitindex)
+                           for unitindex, digest in olddigests.iteritems()])
+
+        staleindices = set(olddigests)
+        digestvalues = []
+        errorvalues = []
+        for index, unit in enumerate(units):
+            if not unit.istranslatable():
+                continue
+            digest = unitchecksdigest(unit, salt)
+            if olddigests.get(index) == digest:
+                staleindices.discard(index)
+                continue
+            if digest in oldindices:
+                errors = olderrors.get(oldindices[digest], [])
+            else:
+                errors = checker.run_filters(unit).items()
+            digestvalues.append((fileid, configid, index, digest))
+            errorvalues.extend([(index, fileid, configid, name, message)
+                                for name, message in errors])
+        checker.setsuggestionstore(None)
+
+        staleindices = [(fileid, configid, index) for index in staleindices]
+        self.cur.executemany("""DELETE FROM unitchecks WHERE
+            fileid=? AND configid=? AND unitindex=?;""", staleindices)
+        self.cur.executemany("""DELETE FROM uniterrors WHERE
+            fileid=? AND configid=? AND unitindex=?;""", staleindices)
+        # We always want to store one dummy error to know that we have actually
+        # run the checks on this file with the current checker configuration
         self.cur.execute("""DELETE FROM uniterrors WHERE
-            fileid=?;""", (fileid,))
-        self._cacheunitschecks(store.units, fileid, configid, checker)
+            fileid=? AND configid=? AND unitindex=-1;""", (fileid, configid))
+        errorvalues.append((-1, fileid, configid, "noerror", ""))
+        # XXX: executemany is non-standard
+        self.cur.executemany("""INSERT INTO unitchecks
+            (fileid, configid, unitindex, digest)
+            values (?, ?, ?, ?);""",
+            digestvalues)
+        self.cur.executemany("""INSERT INTO uniterrors
+            (unitindex, fileid, configid, name, message)
+            values (?, ?, ?, ?, ?);""",
+            errorvalues)
         return fileid
 
+    @transaction
     def get_unit_stats(self, fileid, unitid):
         values = self.cur.execute("""
             SELECT   state, sourcewords, targetwords
@@ -583,9 +873,15 @@ class StatsCache(object):
         # remove the current errors
         self.cur.execute("""DELETE FROM uniterrors WHERE
             fileid=? AND unitindex=?;""", (fileid, unitindex))
+        self.cur.execute("""DELETE FROM unitchecks WHERE
+            fileid=? AND unitindex=?;""", (fileid, unitindex))
         if os.path.exists(suggestion_filename(filename)):
             checker.setsuggestionstore(factory.getobject(suggestion_filename(filename), ignore=suggestion_extension()))
         state.extend(self._cacheunitschecks([unit], fileid, configid, checker, unitindex))
+        self.cur.execute("""INSERT INTO unitchecks
+            (fileid, configid, unitindex, digest) values (?, ?, ?, ?);""",
+            (fileid, configid, unitindex,
+             unitchecksdigest(unit, checkssalt(filename))))
         return state
 
     def _checkerrors(self, filename, fileid, configid, checker, store):
@@ -599,19 +895,18 @@ class StatsCache(object):
             return self.cur.fetchone(), self.cur
 
         first, cur = geterrors()
-        if first is not None:
+        # The noerror entry comes first if the checks are up to date
+        if first is not None and first[1] == -1:
             return first, cur
 
         # This could happen if we haven't done the checks before, or the
         # file changed, or we are using a different configuration
-        if callable(store):
-            store = store()
-        else:
-            store = store or factory.getobject(filename)
+        units = _unitsfrom(store, filename)
 
         if os.path.exists(suggestion_filename(filename)):
             checker.setsuggestionstore(factory.getobject(suggestion_filename(filename), ignore=suggestion_extension()))
-        self._cachestorechecks(fileid, store, checker, configid)
+        self._cachefilechecks(fileid, units, checker, configid,
+                              checkssalt(filename))
         return geterrors()
 
     def _geterrors(self, filename, fileid, configid, checker, store):
@@ -632,6 +927,7 @@ class StatsCache(object):
         # Unusual capitalisation intended. See bug 2073.
         return self.cur.lastrowid
 
+    @transaction
     def filechecks(self, filename, checker, store=None):
         """Retrieves the error statistics for the given file if possible,
         otherwise delegates to cachestorechecks()."""
@@ -650,6 +946,7 @@ class StatsCache(object):
 
         return errors
 
+    @transaction
     def file_fails_test(self, filename, checker, name):
         fileid = self._getfileid(filename)
         configid = self._get_config_id(fileid, checker)
@@ -661,6 +958,7 @@ class StatsCache(object):
             WHERE fileid=? and configid=? and name=?;""", (fileid, configid, name))
         return self.cur.fetchone() is not None
 
+    @transaction
     def filestatestats(self, filename, store=None, extended=False):
         """Return a dictionary of unit stats mapping sets of unit
         indices with those states"""
@@ -683,6 +981,7 @@ class StatsCache(object):
             stats["total"].append(value[2])
         return stats
 
+    @transaction
     def filestats(self, filename, checker, store=None, extended=False):
         """Return a dictionary of property names mapping sets of unit
         indices with those properties."""
@@ -691,6 +990,7 @@ class StatsCache(object):
         stats.update(self.filestatestats(filename, store, extended=extended))
         return stats
 
+    @transaction
     def unitstats(self, filename, _lang=None, store=None):
         # For now, lang and store are unused. lang will allow the user to
         # base stats information on the given language. See the commented
@@ -68,6 +68,23 @@ def test_force_override():
     assert test.raises(NotImplementedError, derivedobject.classtest)
 
 
+def test_detect_encoding():
+    """Tests that the encoding is guessed from the given text, whichever file
+    the store was read from"""
+    test.importorskip("chardet")
+    store = base.TranslationStore()
+    store.encoding = "auto"
+    store.filename = __file__
+    french = u"Ceci est un caf\xe9 tr\xe8s \xe9l\xe9gant \xe0 c\xf4t\xe9 de la fen\xeatre. " * 20
+    russian = u"\u042d\u0442\u043e \u043e\u0447\u0435\u043d\u044c \u0445\u043e\u0440\u043e\u0448\u0438\u0439 \u0442\u0435\u043a\u0441\u0442. " * 20
+    assert store.detect_encoding(french.encode("latin-1")) == (french, "ISO-8859-1")
+    assert store.detect_encoding(russian.encode("cp1251")) == (russian, "windows-1251")
+    # the guess for a sample that was seen before is reused
+    hits = base._detected_encodings.hits
+    assert store.detect_encoding(french.encode("latin-1")) == (french, "ISO-8859-1")
+    assert base._detected_encodings.hits == hits + 1
+
+
 class TestTranslationUnit:
     """Tests a TranslationUnit.
     Derived classes can reuse these tests by pointing UnitClass to a derived Unit"""
@@ -248,6 +265,37 @@ class TestTranslationStore(object):
         assert store.findunit("Blessed String") == unit2
         assert store.findunit("Nest String") is None
 
+    def test_unitindex(self):
+        """Tests that the unit index finds all the units with a source
+        string, also after units are added or removed"""
+        store = self.StoreClass()
+        unit1 = store.addsourceunit("Test String")
+        unitindex = store.getunitindex()
+        assert unitindex.findsource("Test String") == [unit1]
+        unit2 = store.addsourceunit("Test String")
+        units = unitindex.findsource("Test String")
+        assert len(units) == 2 and units[0] is unit1 and units[1] is unit2
+        store.units.remove(unit1)
+        store.remove_unit_from_index(unit1)
+        units = unitindex.findsource("Test String")
+        assert len(units) == 1 and units[0] is unit2
+        assert unitindex.findsource("Nest String") == []
+        # the maps were kept up to date instead of being built again
+        assert unitindex._maps
+
+    def test_find_changed(self):
+        """Tests that units are found by their current source string, also
+        after they changed"""
+        store = self.StoreClass()
+        unit = store.addsourceunit("")
+        unit.source = "Test String"
+        assert store.findunit("Test String") is unit
+        store.makeindex()
+        assert store.findunit("Test String") is unit
+        unit.source = "Blessed String"
+        assert store.findunit("Test String") is None
+        assert store.findunit("Blessed String") is unit
+
     def test_translate(self):
         """Tests the translate method and non-ascii characters."""
         store = self.StoreClass()
@@ -313,6 +361,23 @@ class TestTranslationStore(object):
         newstore = self.StoreClass.parsefile(self.filename)
         self.check_equality(store, newstore)
 
+    def test_save_failure(self):
+        """Tests that a file is left as it was if its output fails"""
+        store = self.StoreClass()
+        unit = store.addsourceunit("Test String")
+        unit.target = "Test String"
+        store.savefile(self.filename)
+        contents = open(self.filename, "rb").read()
+
+        def serialize(fileobj):
+            fileobj.write("partial")
+            raise IOError("disk full")
+        store.serialize = serialize
+        assert test.raises(IOError, store.savefile, self.filename)
+        assert open(self.filename, "rb").read() == contents
+        assert [name for name in os.listdir(".")
+                if name.startswith(self.filename + ".")] == []
+
     def test_markup(self):
         """Tests that markup survives the roundtrip. Most usefull for xml types."""
         store = self.StoreClass()
@@ -95,6 +95,13 @@ class BaseTestFactory:
         store = factory.getobject(fileobj)
         assert isinstance(store, self.expected_instance)
 
+    def test_iterunits(self):
+        """Tests that the streamed units match those of the store."""
+        store = factory.getobject(givefile(self.filename, self.file_content))
+        units = list(factory.iterunits(givefile(self.filename, self.file_content)))
+        assert [unit.source for unit in units] == [unit.source for unit in store.units]
+        assert isinstance(units[-1]._store, self.expected_instance)
+
     def test_get_noname_object(self):
         """Tests that we get a valid object from a file object without a name."""
         fileobj = wStringIO.StringIO(self.file_content)
@@ -122,6 +129,30 @@ class BaseTestFactory:
         store = factory.getobject(filename)
         assert isinstance(store, self.expected_instance)
 
+    def test_cachedir(self):
+        """Tests that cacheable stores are loaded from a snapshot while their
+        file doesn't change."""
+        filename = os.path.join(self.testdir, self.filename)
+        open(filename, "w").write(self.file_content)
+        os.utime(filename, (1300000000, 1300000000))
+        cachedir = os.path.join(self.testdir, "cache")
+        store = factory.getobject(filename, cachedir=cachedir)
+        assert isinstance(store, self.expected_instance)
+        if not self.expected_instance.cacheable:
+            assert not os.path.exists(cachedir)
+            return
+        assert len(os.listdir(cachedir)) == 1
+        # a change that keeps the modification time and size goes unnoticed
+        open(filename, "w").write(self.file_content.replace("rest", "best"))
+        os.utime(filename, (1300000000, 1300000000))
+        cached = factory.getobject(filename, cachedir=cachedir)
+        assert str(cached) == str(store)
+        # any other change is parsed again
+        open(filename, "w").write(self.file_content.replace("rest", "rests"))
+        changed = factory.getobject(filename, cachedir=cachedir)
+        assert "rests" in str(changed)
+        assert len(os.listdir(cachedir)) == 1
+
     def test_directory(self):
         """Test that a directory is correctly detected."""
         object = factory.getobject(self.testdir)
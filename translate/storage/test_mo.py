@@ -4,6 +4,7 @@ import os.path
 import StringIO
 import subprocess
 
+from translate.misc.multistring import multistring
 from translate.storage import factory
 from translate.storage import mo
 from translate.storage import test_base
@@ -125,6 +126,61 @@ class TestMOFile(test_base.TestTranslationStore):
         store.updateheader(add=True, Language="zu")
         assert store.gettargetlanguage() == "zu"
 
+    def test_serialize(self):
+        """Test that serialize writes the same MO file as str(), and that the
+        strings can be read back"""
+        store = self.StoreClass()
+        for i in range(100):
+            unit = store.addsourceunit(u"Source %d" % i)
+            unit.target = u"Teiken %d" % i
+        unit = store.addsourceunit(u"File")
+        unit.msgctxt = [u"menu"]
+        unit.target = u"L\xeaer"
+        output = StringIO.StringIO()
+        store.serialize(output)
+        assert output.getvalue() == str(store)
+        newstore = self.StoreClass.parsestring(output.getvalue())
+        assert len(newstore.units) == 101
+        assert [(unit.getcontext(), unit.target) for unit in newstore.units if unit.source == u"File"] == [(u"menu", u"L\xeaer")]
+        assert newstore.findunit(u"Source 42").target == u"Teiken 42"
+
+    def test_mmapmofile(self):
+        """Test that messages are looked up in a mapped MO file through its
+        hash table"""
+        store = self.StoreClass()
+        for i in range(100):
+            unit = store.addsourceunit(u"Source %d" % i)
+            unit.target = u"Teiken %d" % i
+        unit = store.addsourceunit(u"File")
+        unit.msgctxt = [u"menu"]
+        unit.target = u"L\xeaer"
+        unit = store.addsourceunit(multistring([u"tree", u"trees"]))
+        unit.target = multistring([u"boom", u"bome"])
+        mofilename = os.path.join(os.path.dirname(__file__), "test_mmapmofile.mo")
+        store.savefile(mofilename)
+        try:
+            mmapstore = mo.mmapmofile.parsefile(mofilename)
+            assert mmapstore.translate(u"Source 42") == u"Teiken 42"
+            assert mmapstore.translate(u"Source 100") is None
+            assert mmapstore.findunit(u"File") is None
+            assert mmapstore.findunit(u"File", u"menu").target == u"L\xeaer"
+            assert mmapstore.findunit(u"tree").target.strings == [u"boom", u"bome"]
+            assert len(mmapstore.units) == 102
+            # once all the units are decoded, those are returned
+            unit = mmapstore.findunit(u"Source 42")
+            assert [x for x in mmapstore.units if x is unit] == [unit]
+            mmapstore.close()
+            # the decoded units can still be found
+            assert mmapstore.findunit(u"Source 42") is unit
+            assert mmapstore.findunit(u"File", u"menu").target == u"L\xeaer"
+            assert mmapstore.findunit(u"Source 100") is None
+            # units that were not decoded are gone
+            mmapstore = mo.mmapmofile.parsefile(mofilename)
+            mmapstore.close()
+            assert mmapstore.findunit(u"Source 42") is None
+        finally:
+            os.remove(mofilename)
+
     def test_output(self):
         for posource in posources:
             print "PO source file"
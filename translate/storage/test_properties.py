@@ -320,6 +320,20 @@ key=value
         assert propunit.name == u'key'
         assert propunit.source == u'value'
 
+    def test_detect_encoding(self):
+        """test that the encoding of a file is detected from its BOM or
+        as UTF-8 before anything else is tried"""
+        propsource = u"key = d\xe9j\xe0 vu"
+        for encoding in ("utf-8", "utf-16"):
+            propfile = self.propparse(propsource.encode(encoding), encoding="auto")
+            assert propfile.encoding == encoding
+            assert propfile.units[0].source == u"d\xe9j\xe0 vu"
+        # ASCII text is read as UTF-8, and anything else falls back to the
+        # default encoding if chardet can't tell
+        assert self.propparse("key = value", encoding="auto").encoding == "utf-8"
+        propfile = self.propparse(u"key = d\xe9j\xe0 vu\n".encode("iso-8859-1"), encoding="auto")
+        assert propfile.units[0].source == u"d\xe9j\xe0 vu"
+
     def test_trailing_comments(self):
         """test that we handle non-unit data at the end of a file"""
         propsource = u"key = value\n# END"
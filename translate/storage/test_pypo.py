@@ -27,6 +27,11 @@ class TestHelpers():
         assert pypo.unescape(r"\"\\koei\"\\") == "\"\\koei\"\\"
         assert pypo.unescape(r"\\\rkoei\r\\") == "\\\rkoei\r\\"
 
+    def test_escapeforpo(self):
+        assert pypo.escapeforpo(u"koei") == u"koei"
+        assert pypo.escapeforpo(u'"koei"\t\\') == u'\\"koei\\"\\t\\\\'
+        assert pypo.escapeforpo("\\r\r") == "\\\\r\\r"
+
 
 class TestPYPOUnit(test_po.TestPOUnit):
     UnitClass = pypo.pounit
@@ -166,6 +171,37 @@ msgstr ""
 class TestPYPOFile(test_po.TestPOFile):
     StoreClass = pypo.pofile
 
+    def test_iterparse(self):
+        """checks that iterparse yields the same units as parsing"""
+        posource = r'''msgid ""
+msgstr ""
+"Content-Type: text/plain; charset=UTF-8\n"
+
+#: test.c
+msgid "test"
+msgstr "toets"
+
+#, fuzzy
+msgid "sheep"
+msgid_plural "sheep"
+msgstr[0] "skaap"
+msgstr[1] "skape"
+
+#~ msgid "old"
+#~ msgstr "oud"
+'''
+        pofile = self.poparse(posource)
+        units = list(self.StoreClass.iterparse(wStringIO.StringIO(posource)))
+        assert len(units) == len(pofile.units) == 4
+        for unit, parsed in zip(units, pofile.units):
+            assert str(unit) == str(parsed)
+        assert units[2].isfuzzy()
+        assert units[3].isobsolete()
+        # only the header is kept in the store of the units
+        store = units[1]._store
+        assert store.units == [units[0]]
+        assert store.parseheader()["Content-Type"] == "text/plain; charset=UTF-8"
+
     def test_combine_msgidcomments(self):
         """checks that we don't get duplicate msgid comments"""
         posource = 'msgid "test me"\nmsgstr ""'
@@ -218,6 +254,33 @@ class TestPYPOFile(test_po.TestPOFile):
         thepo.target = halfstr.encode("UTF-8")
         assert halfstr.encode("UTF-8") in str(thepo)
 
+    def test_serialize(self):
+        """checks that serialize() writes the same as str()"""
+        posource = u'''msgid ""
+msgstr ""
+"Content-Type: text/plain; charset=UTF-8\\n"
+
+#: nb
+msgid "Norwegian Bokm\xe5l"
+msgstr ""
+
+#~ msgid "Old"
+#~ msgstr "Oud"
+'''.encode("UTF-8")
+        pofile = self.StoreClass(wStringIO.StringIO(posource))
+        pofile.addsourceunit(u"")
+        outputfile = wStringIO.StringIO()
+        pofile.serialize(outputfile)
+        assert outputfile.getvalue() == str(pofile) == posource
+        # an encoding that can't take all the units is changed to UTF-8
+        pofile.updateheader(add=True, Content_Type="text/plain; charset=ISO-8859-1")
+        pofile._encoding = "ISO-8859-1"
+        pofile.units[1].target = u"\u2026"
+        outputfile = wStringIO.StringIO()
+        pofile.serialize(outputfile)
+        assert outputfile.getvalue() == str(pofile)
+        assert "charset=UTF-8" in outputfile.getvalue()
+
     def test_posections(self):
         """checks the content of all the expected sections of a PO message"""
         posource = '# other comment\n#. automatic comment\n#: source comment\n#, fuzzy\nmsgid "One"\nmsgstr "Een"\n'
@@ -289,3 +352,31 @@ msgstr[1] "toetse"
         assert pofile.units[4].prev_source == multistring([u"tast", u"tasts"])
 
         assert str(pofile) == posource
+
+    def test_findid_locationindex(self):
+        """checks that findid() finds the first unit with an id, and that the
+        location index maps duplicated locations to None"""
+        posource = '''#: test.c:1
+msgid "test"
+msgstr "toets"
+
+#: test.c:1
+msgid "test"
+msgstr "proef"
+
+#: test.c:2
+msgid "file"
+msgstr "lêer"
+'''
+        pofile = self.poparse(posource)
+        assert pofile.findid(u"test").target == u"toets"
+        assert pofile.locationindex["test.c:1"] is None
+        assert pofile.locationindex.get("test.c:2").target == u"lêer"
+        del pofile.locationindex["test.c:2"]
+        assert "test.c:2" not in pofile.locationindex
+        assert pofile.getunitindex().findlocation("test.c:2") == []
+        # replacing the units builds the index again
+        pofile.units = pofile.units[2:]
+        assert pofile.findunit(u"test") is None
+        assert pofile.findunit(u"file").target == u"lêer"
+
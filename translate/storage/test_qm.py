@@ -29,6 +29,10 @@ class TestQtFile(test_base.TestTranslationStore):
         assert test.raises(Exception, self.StoreClass.savefile,
                            self.StoreClass())
 
+    def test_save_failure(self):
+        # QM does not implement saving
+        pass
+
     def test_nonascii(self):
         # QM does not implement serialising
         assert test.raises(Exception, self.StoreClass.__str__,
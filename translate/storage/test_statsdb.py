@@ -2,6 +2,7 @@
 
 import os
 import os.path
+import threading
 import warnings
 
 import py.test
@@ -151,3 +152,87 @@ class TestStatsDb:
         f1, cache1 = self.setup_file_and_db(jtoolkit_extract)
         f2, cache2 = self.setup_file_and_db(fr_terminology_extract)
         assert cache1 == cache2
+
+    def test_threads(self):
+        """checks that threads share the cache and that the connections of
+        dead threads go back to the pool"""
+        f, cache = self.setup_file_and_db(jtoolkit_extract)
+        results = []
+
+        def worker():
+            same = statsdb.StatsCache(os.path.join(self.path, "stats.db")) is cache
+            results.append((same, cache.filetotals(f.filename)["total"]))
+            # used outside of a transaction, so it stays with this thread
+            cache.cur.execute("SELECT COUNT(*) FROM files")
+
+        threads = [threading.Thread(target=worker) for i in range(cache._pool.maxsize + 2)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        assert results == [(True, 6)] * len(threads)
+        assert cache._pool._count <= cache._pool.maxsize
+        cache._pool.release(cache._pool.acquire())
+        assert cache._pool._pinned == {}
+
+    def test_pinned_released(self):
+        """checks that connections pinned by live threads go back to the pool
+        when their transactions end, and that waiting for one times out"""
+        f, cache = self.setup_file_and_db(jtoolkit_extract)
+        pool = cache._pool
+        pinned = threading.Event()
+        done = threading.Event()
+        results = []
+
+        def worker():
+            cache.cur.execute("SELECT COUNT(*) FROM files")
+            pinned.set()
+            done.wait()
+            results.append(cache.filetotals(f.filename)["total"])
+
+        thread = threading.Thread(target=worker)
+        thread.start()
+        pinned.wait()
+        taken = [pool.acquire() for i in range(pool.maxsize - pool._count + len(pool._idle))]
+        pool.timeout = 0
+        try:
+            pool.acquire()
+            assert False, "acquire() should time out"
+        except statsdb.dbapi2.OperationalError:
+            pass
+        pool.timeout = 60
+        for con in taken:
+            pool.release(con)
+        done.set()
+        thread.join()
+        assert results == [6]
+        assert pool._pinned == {}
+
+    def test_filechecks_incremental(self):
+        """checks that only the units that changed are checked again"""
+        f, cache = self.setup_file_and_db(jtoolkit_extract)
+        checked = []
+
+        class CountingChecker(checks.StandardChecker):
+
+            def run_filters(self, unit, *args, **kwargs):
+                checked.append(unit.source)
+                return checks.StandardChecker.run_filters(self, unit, *args, **kwargs)
+
+        checker = CountingChecker()
+        assert 'check-printf' not in cache.filechecks(f.filename, checker)
+        assert len(checked) == 6
+        fileid = self.make_file_and_return_id(cache, f.filename)[0]
+
+        del checked[:]
+        open(f.filename, "w").write(jtoolkit_extract.replace('"Meld aan vir %s"', '"Meld aan"'))
+        assert cache.filechecks(f.filename, checker)['check-printf'] == [1]
+        assert checked == ["Login for %s"]
+        assert self.make_file_and_return_id(cache, f.filename)[0] == fileid
+
+        # a new unit moves the others, but they keep their errors
+        del checked[:]
+        newunit = 'msgid "New"\nmsgstr "Nuut"\n\n#: web/server.py:57\n'
+        open(f.filename, "w").write(jtoolkit_extract.replace('"Meld aan vir %s"', '"Meld aan"').replace('#: web/server.py:57\n', newunit))
+        assert cache.filechecks(f.filename, checker)['check-printf'] == [2]
+        assert checked == ["New"]
@@ -0,0 +1,166 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import os
+import os.path
+
+from py import test
+
+
+from translate.storage import po
+from translate.storage import tmdb
+
+tm_source = r"""
+msgid "Open the file"
+msgstr "Maak die lêer oop"
+
+msgctxt "menu"
+msgid "Open the file"
+msgstr "Maak lêer oop"
+
+msgid "Save the document before closing the window"
+msgstr "Stoor die dokument voor die venster toegemaak word"
+
+msgid "Close the window"
+msgstr ""
+
+#, fuzzy
+msgid "Print the document"
+msgstr "Druk die dokument"
+"""
+
+
+class TestTMDB:
+
+    def get_test_path(self, method):
+        return os.path.realpath("%s_%s.db" % (self.__class__.__name__, method.__name__))
+
+    def setup_method(self, method):
+        """Allocates a unique self.filename for the method, making sure it doesn't exist"""
+        self.filename = self.get_test_path(method)
+        if os.path.exists(self.filename):
+            os.remove(self.filename)
+
+    def teardown_method(self, method):
+        """Makes sure that if self.filename was created by the method, it is cleaned up"""
+        if os.path.exists(self.filename):
+            os.remove(self.filename)
+
+    def dump(self, db):
+        db.cursor.execute("""SELECT s.text, s.context, s.lang, s.length, t.text, t.lang
+                             FROM sources s JOIN targets t ON s.sid = t.sid ORDER BY s.text, t.text""")
+        return db.cursor.fetchall()
+
+    def test_add_units_bulk(self):
+        """checks that a bulk load adds the same as add_store"""
+        store = po.pofile(tm_source)
+        db = tmdb.TMDB(self.filename)
+        assert db.add_units_bulk(store.units, "en", "af") == 3
+        bulkrows = self.dump(db)
+        db.cursor.execute("DELETE FROM targets")
+        db.cursor.execute("DELETE FROM sources")
+        db.connection.commit()
+        db.add_store(store, "en", "af")
+        assert bulkrows == self.dump(db)
+        assert len(bulkrows) == 3
+
+    def test_add_units_bulk_again(self):
+        """checks that loading the same units again doesn't add anything"""
+        store = po.pofile(tm_source)
+        db = tmdb.TMDB(self.filename)
+        db.add_units_bulk(store.units, "en", "af")
+        rows = self.dump(db)
+        db.add_units_bulk(store.units, "en", "af")
+        assert self.dump(db) == rows
+        newstore = po.pofile('msgid "Open the file"\nmsgstr "Open die lêer"\n')
+        db.add_units_bulk(newstore.units, "en", "af")
+        assert len(self.dump(db)) == len(rows) + 1
+        db.cursor.execute("SELECT COUNT(*) FROM sources")
+        assert db.cursor.fetchone() == (3,)
+
+    def test_add_unit_groups_bulk(self):
+        """checks that a group that fails part way is left out as a whole"""
+        units = po.pofile(tm_source).units
+        errors = []
+
+        def broken():
+            yield units[2]
+            raise ValueError("broken")
+
+        db = tmdb.TMDB(self.filename)
+        groups = [("a", units[:1]), ("b", broken()), ("c", units[1:2])]
+        assert db.add_unit_groups_bulk(groups, "en", "af",
+                                       lambda name, e: errors.append(name)) == 2
+        assert errors == ["b"]
+        assert len(self.dump(db)) == 2
+        db.cursor.execute("SELECT COUNT(*) FROM sources WHERE text = ?", (units[2].source,))
+        assert db.cursor.fetchone() == (0,)
+        # without onerror, the error is raised and nothing is added
+        test.raises(ValueError, db.add_unit_groups_bulk, [("b", broken())], "en", "af")
+
+    def test_add_units_bulk_fulltext(self):
+        """checks that the fulltext index is up to date after a bulk load"""
+        store = po.pofile(tm_source)
+        db = tmdb.TMDB(self.filename)
+        if not db.fulltext:
+            return
+        db.add_units_bulk(store.units, "en", "af")
+        db.cursor.execute("SELECT COUNT(*) FROM fulltext WHERE fulltext MATCH 'window'")
+        assert db.cursor.fetchone() == (1,)
+        # the trigger is back for units added one at a time
+        db.add_dict({"source": u"Another window", "target": u"Nog 'n venster", "context": u""}, "en", "af")
+        db.cursor.execute("SELECT COUNT(*) FROM fulltext WHERE fulltext MATCH 'window'")
+        assert db.cursor.fetchone() == (2,)
+
+    def test_iter_translations(self):
+        """checks that all the translations are listed, or only those between
+        the given languages"""
+        db = tmdb.TMDB(self.filename)
+        db.add_units_bulk(po.pofile(tm_source).units, "en", "af")
+        db.add_dict({"source": u"Open the file", "target": u"Vula ifayili", "context": u""}, "en", "xh")
+        translations = list(db.iter_translations())
+        assert len(translations) == 4
+        assert translations[0] == {"source": u"Open the file", "target": u"Maak die lêer oop", "context": u"",
+                                   "source_lang": u"en", "target_lang": u"af"}
+        assert [translation["target"] for translation in db.iter_translations("en", "xh")] == [u"Vula ifayili"]
+        assert list(db.iter_translations("af")) == []
+
+    def test_translate_unit(self):
+        """checks that the best suggestions are returned, best first"""
+        db = tmdb.TMDB(self.filename, max_candidates=2)
+        db.add_units_bulk(po.pofile(tm_source).units, "en", "af")
+        results = db.translate_unit(u"Save the document before closing the windows", "en", "af")
+        assert len(results) == 1
+        assert results[0]["target"] == u"Stoor die dokument voor die venster toegemaak word"
+        assert 90 < results[0]["quality"] < 100
+        results = db.translate_unit(u"Open the file", "en", "af")
+        assert [result["quality"] for result in results] == [100, 100]
+
+    def test_translate_unit_fulltext_candidates(self):
+        """checks that the fulltext matches are ranked before they are
+        compared"""
+        store = po.pofile()
+        for i in range(20):
+            unit = store.addsourceunit(u"Common words with the window number %d in them" % i)
+            unit.target = u"Target %d" % i
+        unit = store.addsourceunit(u"Close the document window before printing")
+        unit.target = u"Maak die dokument venster toe voor druk"
+        db = tmdb.TMDB(self.filename, max_fulltext_candidates=1)
+        db.add_units_bulk(store.units, "en", "af")
+        if not db.fulltext:
+            return
+        results = db.translate_unit(u"Close the document window before printing it", "en", "af")
+        assert [result["target"] for result in results] == [u"Maak die dokument venster toe voor druk"]
+
+    def test_translate_unit_fulltext_unranked(self):
+        """checks that the fulltext matches are found without ranking, for
+        SQLite versions where matchinfo() takes no format"""
+        db = tmdb.TMDB(self.filename)
+        db.add_units_bulk(po.pofile(tm_source).units, "en", "af")
+        fulltext_rank = tmdb.FULLTEXT_RANK
+        tmdb.FULLTEXT_RANK = False
+        try:
+            results = db.translate_unit(u"Save the document before closing the windows", "en", "af")
+        finally:
+            tmdb.FULLTEXT_RANK = fulltext_rank
+        assert [result["target"] for result in results] == [u"Stoor die dokument voor die venster toegemaak word"]
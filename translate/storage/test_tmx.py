@@ -75,3 +75,29 @@ class TestTMXfile(test_base.TestTranslationStore):
         assert tmxfile.translate('Five < ten') == 'Vyf < tien'
         assert xmltext.index('Five &lt; ten')
         assert xmltext.find('Five < ten') == -1
+
+    def test_iterparse(self):
+        """checks that iterparse yields the same units as parsing, and
+        removes the used units from the document"""
+        tmxfile = tmx.tmxfile()
+        for i in range(4):
+            tmxfile.addtranslation("Source %d" % i, "en", "Bron %d" % i, "af")
+        tmxsource = str(tmxfile)
+        units = []
+        for unit in tmx.tmxfile.iterparse(wStringIO.StringIO(tmxsource)):
+            units.append((unit.source, unit.target))
+        # only the last unit is still in the document
+        assert len(unit._store.body) == 1
+        assert units == [(unit.source, unit.target) for unit in self.tmxparse(tmxsource).units]
+
+    def test_tmxwriter(self):
+        """checks that the writer writes the same as a whole tmxfile"""
+        tmxfile = tmx.tmxfile(sourcelanguage="xh")
+        outputfile = wStringIO.StringIO()
+        writer = tmx.tmxwriter(outputfile, "xh")
+        for source, target in [("Mail & News", "Nuus & pos"), ("First line\nSecond line", "Eerste lyn\nTweede lyn")]:
+            tmxfile.addtranslation(source, "xh", target, "af")
+            writer.addtranslation(source, "xh", target, "af")
+        writer.close()
+        assert outputfile.getvalue() == str(tmxfile)
+
@@ -6,6 +6,7 @@ from translate.storage import xliff, lisa
 from translate.storage import test_base
 from translate.storage.placeables import StringElem
 from translate.storage.placeables.xliff import X, G
+from translate.misc import wStringIO
 
 
 class TestXLIFFUnit(test_base.TestTranslationUnit):
@@ -339,6 +340,25 @@ class TestXLIFFfile(test_base.TestTranslationStore):
         lisa.setXMLspace(root_node, "default")
         assert xlifffile.units[0].source == "File 1"
 
+    def test_iterparse(self):
+        """checks that the units are streamed with their ids, and that a
+        gettext XLIFF file is read like parsestring() does"""
+        xlfsource = self.skeleton \
+          % '''<trans-unit id="1"><source>One</source><target>Een</target></trans-unit>
+               <group><trans-unit id="2"><source>Two</source></trans-unit></group>'''
+        units = [(unit.getid(), unit.source, unit.target) for unit in xliff.xlifffile.iterparse(wStringIO.StringIO(xlfsource))]
+        assert units == [(u"doc.txt\x041", u"One", u"Een"), (u"doc.txt\x042", u"Two", None)]
+
+        xlfsource = self.skeleton \
+          % '''<trans-unit id="1" restype="x-gettext-domain-header"><source></source></trans-unit>
+               <group restype="x-gettext-plurals">
+                   <trans-unit id="2[0]"><source>File</source></trans-unit>
+                   <trans-unit id="2[1]"><source>Files</source></trans-unit>
+               </group>'''
+        units = list(xliff.xlifffile.iterparse(wStringIO.StringIO(xlfsource)))
+        assert [unit.__class__.__name__ for unit in units] == ["PoXliffUnit", "PoXliffUnit"]
+        assert [unit.source for unit in units] == [unit.source for unit in xliff.xlifffile.parsestring(xlfsource).units]
+
     def test_parsing(self):
         xlfsource = self.skeleton \
           % '''<trans-unit id="1" xml:space="preserve">
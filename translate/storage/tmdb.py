@@ -20,6 +20,8 @@
 
 """Module to provide a translation memory database."""
 
+from array import array
+import heapq
 import logging
 import math
 import re
@@ -36,6 +38,17 @@ from translate.lang import data
 
 STRIP_REGEXP = re.compile("\W", re.UNICODE)
 
+SOURCES_INSERT_TRIGGER = """
+CREATE TRIGGER IF NOT EXISTS sources_insert_trig AFTER INSERT ON sources FOR EACH ROW
+BEGIN
+    INSERT INTO fulltext (docid, text) VALUES (NEW.sid, NEW.text);
+END;
+"""
+
+# matchinfo() takes a format string since SQLite 3.7.4, without it the
+# fulltext matches aren't ranked
+FULLTEXT_RANK = dbapi2.sqlite_version_info >= (3, 7, 4)
+
 
 class LanguageError(Exception):
 
@@ -46,14 +59,36 @@ class LanguageError(Exception):
         return str(self.value)
 
 
+def fulltext_rank(matchinfo, rows):
+    """Ranks a fulltext match by the inverse document frequency of the words
+    of the query it contains.
+
+    :param matchinfo: The result of matchinfo() with the format 'pcx'
+    :param rows: The (approximate) number of rows in the fulltext index
+    """
+    info = array('I', str(matchinfo))
+    phrases, columns = info[0], info[1]
+    rank = 0.0
+    for i in range(2, 2 + 3 * phrases * columns, 3):
+        hits, allhits, docs = info[i:i+3]
+        if hits:
+            rank += math.log(float(rows + 1) / docs)
+    return rank
+
+
 class TMDB(object):
     _tm_dbs = {}
 
-    def __init__(self, db_file, max_candidates=3, min_similarity=75, max_length=1000):
+    def __init__(self, db_file, max_candidates=3, min_similarity=75, max_length=1000,
+                 max_fulltext_candidates=200):
+        """max_fulltext_candidates is the number of best ranked fulltext
+        matches that are compared to find the suggestions, or 0 to compare
+        all of them."""
 
         self.max_candidates = max_candidates
         self.min_similarity = min_similarity
         self.max_length = max_length
+        self.max_fulltext_candidates = max_fulltext_candidates
 
         if not isinstance(db_file, unicode):
             db_file = unicode(db_file)  # don't know which encoding
@@ -76,6 +111,7 @@ class TMDB(object):
         current_thread = threading.currentThread()
         if current_thread not in self._tm_db:
             connection = dbapi2.connect(self.db_file.encode('utf-8'))
+            connection.create_function("fulltext_rank", 2, fulltext_rank)
             cursor = connection.cursor()
             self._tm_db[current_thread] = (connection, cursor)
         return self._tm_db[current_thread][index]
@@ -149,11 +185,7 @@ CREATE VIRTUAL TABLE fulltext USING fts3(text);
             # create triggers that would sync sources table with fulltext index
             script = """
 INSERT INTO fulltext (rowid, text) SELECT sid, text FROM sources WHERE sid NOT IN (SELECT rowid FROM fulltext);
-CREATE TRIGGER IF NOT EXISTS sources_insert_trig AFTER INSERT ON sources FOR EACH ROW
-BEGIN
-    INSERT INTO fulltext (docid, text) VALUES (NEW.sid, NEW.text);
-END;
-CREATE TRIGGER IF NOT EXISTS sources_update_trig AFTER UPDATE OF text ON sources FOR EACH ROW
+%sCREATE TRIGGER IF NOT EXISTS sources_update_trig AFTER UPDATE OF text ON sources FOR EACH ROW
 BEGIN
     UPDATE fulltext SET text = NEW.text WHERE docid = NEW.sid;
 END;
@@ -161,7 +193,7 @@ CREATE TRIGGER IF NOT EXISTS sources_delete_trig AFTER DELETE ON sources FOR EAC
 BEGIN
     DELETE FROM fulltext WHERE docid = OLD.sid;
 END;
-"""
+""" % SOURCES_INSERT_TRIGGER.lstrip()
             self.cursor.executescript(script)
             self.connection.commit()
             logging.debug("created fulltext triggers")
@@ -271,10 +303,137 @@ DROP TRIGGER IF EXISTS sources_delete_trig;
             self.connection.commit()
         return count
 
+    def add_units_bulk(self, units, source_lang=None, target_lang=None):
+        """inserts the translated units from an iterable of units in the
+        database in a single transaction, returns the number of units
+
+        The units are staged in a temporary table and added to the sources
+        and targets tables with a few set based queries. The fulltext index
+        is updated once at the end instead of by a trigger for each source.
+        """
+        return self.add_unit_groups_bulk([(None, units)], source_lang,
+                                         target_lang)
+
+    def add_unit_groups_bulk(self, groups, source_lang=None, target_lang=None,
+                             onerror=None):
+        """like :meth:`add_units_bulk`, for an iterable of (name, units)
+        pairs, e.g. one for every file
+
+        If onerror is given, a group whose units can't all be read is left
+        out, and onerror is called with its name and the exception.
+        """
+        source_lang = source_lang and data.normalize_code(source_lang)
+        target_lang = target_lang and data.normalize_code(target_lang)
+
+        def rows(units):
+            for unit in units:
+                if not (unit.istranslatable() and unit.istranslated()):
+                    continue
+                unit_source_lang = unit.getsourcelanguage() and \
+                                   data.normalize_code(unit.getsourcelanguage()) or source_lang
+                unit_target_lang = unit.gettargetlanguage() and \
+                                   data.normalize_code(unit.gettargetlanguage()) or target_lang
+                if not unit_source_lang:
+                    raise LanguageError("undefined source language")
+                if not unit_target_lang:
+                    raise LanguageError("undefined target language")
+                yield (unit.source, unit.getcontext(), unit_source_lang,
+                       len(unit.source), unit.target, unit_target_lang)
+
+        # sqlite commits before statements that aren't INSERT, UPDATE or
+        # DELETE, so the pragmas and the trigger are changed outside the
+        # transaction
+        self.cursor.execute("PRAGMA synchronous")
+        (synchronous,) = self.cursor.fetchone()
+        self.cursor.execute("PRAGMA journal_mode")
+        (journal_mode,) = self.cursor.fetchone()
+        self.cursor.execute("PRAGMA synchronous = OFF")
+        self.cursor.execute("PRAGMA journal_mode = MEMORY")
+        self.cursor.execute("""CREATE TEMP TABLE IF NOT EXISTS bulk_units (
+                               source VARCHAR, context VARCHAR, source_lang VARCHAR,
+                               length INTEGER, target VARCHAR, target_lang VARCHAR)""")
+        if self.fulltext:
+            self.cursor.execute("DROP TRIGGER IF EXISTS sources_insert_trig")
+        try:
+            try:
+                self.cursor.execute("SELECT MAX(sid) FROM sources")
+                (maxsid,) = self.cursor.fetchone()
+                self.cursor.execute("DELETE FROM bulk_units")
+                for name, units in groups:
+                    self.cursor.execute("SELECT MAX(rowid) FROM bulk_units")
+                    (maxrowid,) = self.cursor.fetchone()
+                    try:
+                        self.cursor.executemany("INSERT INTO bulk_units VALUES (?, ?, ?, ?, ?, ?)",
+                                                rows(units))
+                    except Exception, e:
+                        if onerror is None:
+                            raise
+                        self.cursor.execute("DELETE FROM bulk_units WHERE rowid > ?",
+                                            (maxrowid or 0,))
+                        onerror(name, e)
+                self.cursor.execute("SELECT COUNT(*) FROM bulk_units")
+                (count,) = self.cursor.fetchone()
+                self.cursor.execute("""INSERT INTO sources (text, context, lang, length)
+                    SELECT DISTINCT b.source, b.context, b.source_lang, b.length FROM bulk_units b
+                    WHERE NOT EXISTS (SELECT 1 FROM sources s WHERE s.text = b.source
+                                      AND s.context IS b.context AND s.lang = b.source_lang)""")
+                #FIXME: get time info from translation store
+                self.cursor.execute("""INSERT OR IGNORE INTO targets (sid, text, lang, time)
+                    SELECT (SELECT MIN(s.sid) FROM sources s WHERE s.text = b.source
+                            AND s.context IS b.context AND s.lang = b.source_lang),
+                           b.target, b.target_lang, ? FROM bulk_units b""",
+                                    (int(time.time()),))
+                if self.fulltext:
+                    self.cursor.execute("INSERT INTO fulltext (docid, text) SELECT sid, text FROM sources WHERE sid > ?",
+                                        (maxsid or 0,))
+                self.cursor.execute("DELETE FROM bulk_units")
+                self.connection.commit()
+            except:
+                self.connection.rollback()
+                raise
+        finally:
+            if self.fulltext:
+                self.cursor.execute(SOURCES_INSERT_TRIGGER)
+            self.cursor.execute("PRAGMA journal_mode = %s" % journal_mode)
+            self.cursor.execute("PRAGMA synchronous = %d" % synchronous)
+        return count
+
+    def iter_translations(self, source_lang=None, target_lang=None):
+        """yields all the translations in the database as dictionaries, or
+        only those between the given languages
+
+        The rows are read from their own cursor as they are needed, so that
+        large databases can be exported without loading them in memory.
+        """
+        query = """SELECT s.text, t.text, s.context, s.lang, t.lang FROM sources s JOIN targets t ON s.sid = t.sid"""
+        conditions = []
+        params = []
+        if source_lang:
+            conditions.append("s.lang = ?")
+            params.append(data.normalize_code(source_lang))
+        if target_lang:
+            conditions.append("t.lang = ?")
+            params.append(data.normalize_code(target_lang))
+        if conditions:
+            query += " WHERE " + " AND ".join(conditions)
+        query += " ORDER BY s.sid, t.tid"
+        cursor = self.connection.cursor()
+        cursor.execute(query, params)
+        for row in cursor:
+            yield {"source": row[0], "target": row[1], "context": row[2],
+                   "source_lang": row[3], "target_lang": row[4]}
+
     def translate_unit(self, unit_source, source_langs, target_langs):
         """return TM suggestions for unit_source"""
-        if isinstance(unit_source, str):
-            unit_source = unicode(unit_source, "utf-8")
+        return self.translate_units([unit_source], source_langs, target_langs)[0]
+
+    def translate_units(self, unit_sources, source_langs, target_langs):
+        """return a list with the TM suggestions for each of unit_sources,
+        in the same order
+
+        The languages and the size of the fulltext index are only worked out
+        once, and repeated sources are only looked up once.
+        """
         if isinstance(source_langs, list):
             source_langs = [data.normalize_code(lang) for lang in source_langs]
             source_langs = ','.join(source_langs)
@@ -286,6 +445,27 @@ DROP TRIGGER IF EXISTS sources_delete_trig;
         else:
             target_langs = data.normalize_code(target_langs)
 
+        rows = None
+        if self.fulltext:
+            # fts3 can't tell us the number of rows, but the largest sid is
+            # close enough and cheap to find
+            self.cursor.execute("SELECT MAX(sid) FROM sources")
+            (rows,) = self.cursor.fetchone()
+
+        suggestions = {}
+        results = []
+        for unit_source in unit_sources:
+            if isinstance(unit_source, str):
+                unit_source = unicode(unit_source, "utf-8")
+            if unit_source not in suggestions:
+                suggestions[unit_source] = self._translate_unit(unit_source, source_langs,
+                                                                target_langs, rows)
+            results.append(suggestions[unit_source])
+        return results
+
+    def _translate_unit(self, unit_source, source_langs, target_langs, rows):
+        """return TM suggestions for unit_source, with normalized languages
+        and the number of rows in the fulltext index"""
         minlen = min_levenshtein_length(len(unit_source), self.min_similarity)
         maxlen = max_levenshtein_length(len(unit_source), self.min_similarity, self.max_length)
 
@@ -294,13 +474,24 @@ DROP TRIGGER IF EXISTS sources_delete_trig;
         unit_words = STRIP_REGEXP.sub(' ', unit_source).split()
         unit_words = filter(lambda word: len(word) > 2, unit_words)
 
-        if self.fulltext and len(unit_words) > 3:
+        if self.fulltext and len(unit_words) > 3 and not FULLTEXT_RANK:
             logging.debug("fulltext matching")
             query = """SELECT s.text, t.text, s.context, s.lang, t.lang FROM sources s JOIN targets t ON s.sid = t.sid JOIN fulltext f ON s.sid = f.docid
                        WHERE s.lang IN (?) AND t.lang IN (?) AND s.length BETWEEN ? AND ?
                        AND fulltext MATCH ?"""
             search_str = " OR ".join(unit_words)
             self.cursor.execute(query, (source_langs, target_langs, minlen, maxlen, search_str))
+        elif self.fulltext and len(unit_words) > 3:
+            logging.debug("ranked fulltext matching")
+            # Only the best ranked matches are compared, since common words
+            # match a large part of the database
+            query = """SELECT s.text, t.text, s.context, s.lang, t.lang FROM sources s JOIN targets t ON s.sid = t.sid JOIN fulltext f ON s.sid = f.docid
+                       WHERE s.lang IN (?) AND t.lang IN (?) AND s.length BETWEEN ? AND ?
+                       AND fulltext MATCH ?
+                       ORDER BY fulltext_rank(matchinfo(fulltext, 'pcx'), ?) DESC LIMIT ?"""
+            search_str = " OR ".join(unit_words)
+            self.cursor.execute(query, (source_langs, target_langs, minlen, maxlen, search_str,
+                                        rows or 0, self.max_fulltext_candidates or -1))
         else:
             logging.debug("nonfulltext matching")
             query = """SELECT s.text, t.text, s.context, s.lang, t.lang FROM sources s JOIN targets t ON s.sid = t.sid
@@ -308,17 +499,34 @@ DROP TRIGGER IF EXISTS sources_delete_trig;
             AND s.length >= ? AND s.length <= ?"""
             self.cursor.execute(query, (source_langs, target_langs, minlen, maxlen))
 
-        results = []
-        for row in self.cursor:
+        # We keep the best results in a heap, ordered by quality and then by
+        # the order in which they were found. Once it is full, candidates
+        # have to beat the worst of them, so we let the comparer stop early
+        # on those that can't.
+        heap = []
+        min_similarity = self.min_similarity
+        for order, row in enumerate(self.cursor):
+            quality = self.comparer.similarity(unit_source, row[0], min_similarity)
+            if quality < min_similarity:
+                continue
             result = {}
             result['source'] = row[0]
             result['target'] = row[1]
             result['context'] = row[2]
-            result['quality'] = self.comparer.similarity(unit_source, result['source'], self.min_similarity)
-            if result['quality'] >= self.min_similarity:
-                results.append(result)
-        results.sort(key=lambda match: match['quality'], reverse=True)
-        results = results[:self.max_candidates]
+            result['quality'] = quality
+            item = (quality, -order, result)
+            if len(heap) < self.max_candidates:
+                heapq.heappush(heap, item)
+            elif item > heap[0]:
+                heapq.heapreplace(heap, item)
+            else:
+                continue
+            if len(heap) == self.max_candidates:
+                min_similarity = max(min_similarity, heap[0][0])
+                if min_similarity >= 100:
+                    break
+        heap.sort(reverse=True)
+        results = [result for quality, order, result in heap]
         logging.debug("results: %s", unicode(results))
         return results
 
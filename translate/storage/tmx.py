@@ -152,3 +152,47 @@ class tmxfile(lisa.LISAfile):
     def translate(self, sourcetext, sourcelang=None, targetlang=None):
         """method to test old unit tests"""
         return getattr(self.findunit(sourcetext), "target", None)
+
+
+class tmxwriter(object):
+    """Writes a TMX file one unit at a time, so that the document never has
+    to be in memory. The output is the same as that of a :class:`tmxfile`
+    with the same units."""
+
+    # The prefix and suffix of a unit serialised in the wrapper
+    _unitprefix = "<tmx>\n  <body>\n"
+    _unitsuffix = "  </body>\n</tmx>\n"
+
+    def __init__(self, outputfile, sourcelanguage='en'):
+        self.outputfile = outputfile
+        header, self._footer = str(tmxfile(sourcelanguage=sourcelanguage)).split("<body/>")
+        outputfile.write(header + "<body>\n")
+        # Units are serialised in an empty document with the same depth, so
+        # that lxml indents them like they are in the whole document
+        self._root = etree.Element("tmx")
+        self._body = etree.SubElement(self._root, "body")
+
+    def addunit(self, unit):
+        """Writes the given :class:`tmxunit` to the file."""
+        self._body.append(unit.xmlelement)
+        try:
+            xml = etree.tostring(self._root, pretty_print=True, encoding='utf-8',
+                                 xml_declaration=False)
+        finally:
+            self._body.remove(unit.xmlelement)
+        self.outputfile.write(xml[len(self._unitprefix):-len(self._unitsuffix)])
+
+    def addtranslation(self, source, srclang, translation, translang):
+        """Writes a unit with the given translation to the file, like
+        :meth:`tmxfile.addtranslation` adds it to the store."""
+        unit = tmxunit(source)
+        unit.target = translation
+        tuvs = unit.xmlelement.iterdescendants('tuv')
+        lisa.setXMLlang(tuvs.next(), srclang)
+        lisa.setXMLlang(tuvs.next(), translang)
+        self.addunit(unit)
+
+    def close(self):
+        """Finishes the document. The output file is left open."""
+        self.outputfile.write("  </body>" + self._footer)
+
@@ -616,12 +616,13 @@ class xlifffile(lisa.LISAfile):
         if not filename:
             return super(xlifffile, self).getids()
 
-        self.id_index = {}
         prefix = filename + ID_SEPARATOR
-        units = (unit for unit in self.units if unit.getid().startswith(prefix))
-        for index, unit in enumerate(units):
-            self.id_index[unit.getid()[len(prefix):]] = unit
-        return self.id_index.keys()
+        ids = {}
+        for unit in self.units:
+            id = unit.getid()
+            if id.startswith(prefix):
+                ids[id[len(prefix):]] = True
+        return ids.keys()
 
     def setsourcelanguage(self, language):
         if not language:
@@ -776,3 +777,19 @@ class xlifffile(lisa.LISAfile):
                 xliff = poxliff.PoXliffFile.parsestring(storestring)
         return xliff
     parsestring = classmethod(parsestring)
+
+    def _iterunits(cls, storefile):
+        """Yields the units of the open storefile, reading it as a
+        :class:`poxliff.PoXliffFile` when :meth:`parsestring` would."""
+        first = True
+        for unit in super(xlifffile, cls)._iterunits(storefile):
+            if first and ("gettext-domain-header" in (unit.getrestype() or "") \
+                    or unit._store.getdatatype() == "po") \
+                    and cls.__name__.lower() != "poxlifffile":
+                from translate.storage import poxliff
+                for pounit in poxliff.PoXliffFile._iterunits(storefile):
+                    yield pounit
+                return
+            first = False
+            yield unit
+    _iterunits = classmethod(_iterunits)
@@ -30,10 +30,12 @@ from translate.storage import tmdb
 
 class Builder:
 
-    def __init__(self, tmdbfile, source_lang, target_lang, filenames):
+    def __init__(self, tmdbfile, source_lang, target_lang, filenames, bulk=False):
         self.tmdb = tmdb.TMDB(tmdbfile)
         self.source_lang = source_lang
         self.target_lang = target_lang
+        self.bulk = bulk
+        self.bulkfiles = []
 
         for filename in filenames:
             if not os.path.exists(filename):
@@ -43,9 +45,34 @@ class Builder:
                 self.handledir(filename)
             else:
                 self.handlefile(filename)
-        self.tmdb.connection.commit()
+        if bulk:
+            self.tmdb.add_unit_groups_bulk(self.iterbulkfiles(), self.source_lang,
+                                           self.target_lang, self.bulkerror)
+        else:
+            self.tmdb.connection.commit()
+
+    def iterbulkfiles(self):
+        """Yields the name and units of the files found for the bulk load.
+        A file that can't be parsed is left out of the load as a whole (see
+        :meth:`bulkerror`)."""
+        for filename in self.bulkfiles:
+            yield filename, self.iterfileunits(filename)
+
+    def iterfileunits(self, filename):
+        # the units are read as they are loaded, so that large files (like
+        # TMX exports) don't need to fit in memory
+        for unit in factory.iterunits(filename):
+            yield unit
+        print "File added:", filename
+
+    def bulkerror(self, filename, e):
+        print >> sys.stderr, "cannot process %s: %s" % (filename, e)
 
     def handlefile(self, filename):
+        if self.bulk:
+            # the files are loaded together at the end
+            self.bulkfiles.append(filename)
+            return
         try:
             store = factory.getobject(filename)
         except Exception, e:
@@ -90,6 +117,9 @@ def main():
     parser.add_option(
         "-t", "--import-target-lang", dest="target_lang",
         help="target language of translation files")
+    parser.add_option(
+        "-b", "--bulk", dest="bulk", action="store_true", default=False,
+        help="load all the files in a single transaction, which is much faster for large imports")
     (options, args) = parser.parse_args()
 
     if not options.target_lang:
@@ -98,7 +128,8 @@ def main():
     if len(args) < 1:
         parser.error('No input file(s) specified.')
 
-    Builder(options.tmdb_file, options.source_lang, options.target_lang, args)
+    Builder(options.tmdb_file, options.source_lang, options.target_lang, args,
+            options.bulk)
 
 if __name__ == '__main__':
     main()
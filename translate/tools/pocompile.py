@@ -35,7 +35,8 @@ def _do_msgidcomment(string):
 
 class POCompile:
 
-    def convertstore(self, inputfile, includefuzzy=False):
+    def compilestore(self, inputfile, includefuzzy=False):
+        """Returns a mofile with the units of inputfile that should be compiled"""
         outputfile = mo.mofile()
         for unit in inputfile.units:
             if unit.istranslated() or (unit.isfuzzy() and includefuzzy and unit.target) or unit.isheader():
@@ -54,7 +55,10 @@ class POCompile:
                         mounit.msgctxt = [context]
                 mounit.target = unit.target
                 outputfile.addunit(mounit)
-        return str(outputfile)
+        return outputfile
+
+    def convertstore(self, inputfile, includefuzzy=False):
+        return str(self.compilestore(inputfile, includefuzzy))
 
 
 def convertmo(inputfile, outputfile, templatefile, includefuzzy=False):
@@ -64,12 +68,13 @@ def convertmo(inputfile, outputfile, templatefile, includefuzzy=False):
     if inputstore.isempty():
         return 0
     convertor = POCompile()
-    outputmo = convertor.convertstore(inputstore, includefuzzy)
+    outputmo = convertor.compilestore(inputstore, includefuzzy)
     # We have to make sure that we write the files in binary mode, therefore we
     # reopen the file accordingly
     outputfile.close()
     outputfile = open(outputfile.name, 'wb')
-    outputfile.write(outputmo)
+    outputmo.serialize(outputfile)
+    outputfile.close()
     return 1
 
 
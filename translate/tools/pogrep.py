@@ -29,6 +29,11 @@ usage instructions
 
 import re
 import locale
+import os
+try:
+    from sqlite3 import dbapi2
+except ImportError:
+    from pysqlite2 import dbapi2
 
 from translate.storage import factory
 from translate.storage.poheader import poheader
@@ -164,7 +169,12 @@ class GrepFilter:
     def matches(self, teststr):
         if teststr is None:
             return False
-        teststr = data.normalize(teststr)
+        return self.matchesnormalized(data.normalize(teststr))
+
+    def matchesnormalized(self, teststr):
+        """like :meth:`matches`, for a string that is already normalized"""
+        if teststr is None:
+            return False
         if self.ignorecase:
             teststr = teststr.lower()
         if self.accelchar:
@@ -212,19 +222,62 @@ class GrepFilter:
                 return True
         return False
 
+    def filterindexed(self, source, target, notes, locations):
+        """runs filters on the normalized strings of a unit in a
+        :class:`GrepIndex`, like :meth:`filterunit`"""
+        if self.keeptranslations and target and target.split(u"\0")[0]:
+            return True
+
+        for strings, search in ((source, self.search_source),
+                                (target, self.search_target)):
+            if search:
+                if strings is None:
+                    strings = [None]
+                else:
+                    strings = strings.split(u"\0")
+                for string in strings:
+                    if self.matchesnormalized(string):
+                        return True
+
+        if self.search_notes:
+            if self.matchesnormalized(notes):
+                return True
+        if self.search_locations:
+            if self.matchesnormalized(locations):
+                return True
+        return False
+
     def filterfile(self, thefile):
         """runs filters on a translation file object"""
-        thenewfile = type(thefile)()
-        thenewfile.setsourcelanguage(thefile.sourcelanguage)
-        thenewfile.settargetlanguage(thefile.targetlanguage)
-        for unit in thefile.units:
+        return self.filterunits(thefile.units, thefile)
+
+    def filterunits(self, units, thefile=None):
+        """runs filters on the units of a translation file, which can be
+        streamed (see :func:`factory.iterunits`). The file defaults to the
+        store the units belong to. Returns None if there are no units."""
+        thenewfile = None
+        for unit in units:
+            if thenewfile is None:
+                if thefile is None:
+                    thefile = unit._store
+                thenewfile = self._newfile(thefile)
             if self.filterunit(unit):
                 thenewfile.addunit(unit)
+        if thenewfile is None:
+            if thefile is None:
+                return None
+            thenewfile = self._newfile(thefile)
 
         if isinstance(thenewfile, poheader):
             thenewfile.updateheader(add=True, **thefile.parseheader())
         return thenewfile
 
+    def _newfile(self, thefile):
+        thenewfile = type(thefile)()
+        thenewfile.setsourcelanguage(thefile.sourcelanguage)
+        thenewfile.settargetlanguage(thefile.targetlanguage)
+        return thenewfile
+
     def getmatches(self, units):
         if not self.searchstring:
             return [], []
@@ -275,6 +328,104 @@ class GrepFilter:
         return matches, indexes
 
 
+class GrepIndex(object):
+    """A persistent index of the strings that :class:`GrepFilter` searches
+    in, so that files that have not changed need not be parsed again.
+
+    Files are indexed by path, and indexed again when their modification
+    time or size changes.  Only translatable units are indexed, since a file
+    with matches in other units does not give any output."""
+
+    def __init__(self, db_file, checkfilter):
+        self.db_file = db_file
+        self.connection = dbapi2.connect(db_file)
+        self.connection.text_factory = unicode
+        self.connection.create_function("grepmatch", 4, checkfilter.filterindexed)
+        self.cursor = self.connection.cursor()
+        self.cursor.executescript("""
+CREATE TABLE IF NOT EXISTS files (
+    fileid INTEGER PRIMARY KEY AUTOINCREMENT,
+    path VARCHAR NOT NULL UNIQUE,
+    mtime REAL NOT NULL,
+    size INTEGER NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS units (
+    fileid INTEGER NOT NULL,
+    source TEXT,
+    target TEXT,
+    notes TEXT,
+    locations TEXT
+);
+
+CREATE INDEX IF NOT EXISTS unitsfileidindex ON units (fileid);
+""")
+        self.connection.commit()
+
+    def _normalizestrings(self, strings):
+        if isinstance(strings, multistring):
+            return u"\0".join([data.normalize(string) for string in strings.strings])
+        elif strings is None:
+            return None
+        return data.normalize(strings)
+
+    def update(self, filename):
+        """Indexes the given file if it is not in the index, or changed since
+        it was indexed, and returns its id in the index.
+
+        A file is indexed in a transaction of its own, so that a file that
+        can't be parsed leaves the index as it was."""
+        path = os.path.abspath(filename)
+        stat = os.stat(path)
+        self.cursor.execute("SELECT fileid, mtime, size FROM files WHERE path = ?", (path,))
+        row = self.cursor.fetchone()
+        if row is not None and row[1:] == (stat.st_mtime, stat.st_size):
+            return row[0]
+        try:
+            fileid = self._index(path, stat, row)
+        except:
+            self.connection.rollback()
+            raise
+        self.connection.commit()
+        return fileid
+
+    def _index(self, path, stat, row):
+        if row is not None:
+            fileid = row[0]
+            self.cursor.execute("DELETE FROM units WHERE fileid = ?", (fileid,))
+            self.cursor.execute("UPDATE files SET mtime = ?, size = ? WHERE fileid = ?",
+                                (stat.st_mtime, stat.st_size, fileid))
+        else:
+            self.cursor.execute("INSERT INTO files (path, mtime, size) VALUES (?, ?, ?)",
+                                (path, stat.st_mtime, stat.st_size))
+            fileid = self.cursor.lastrowid
+
+        def unitrows():
+            for unit in factory.iterunits(path):
+                if unit.istranslatable():
+                    yield (fileid,
+                           self._normalizestrings(unit.source),
+                           self._normalizestrings(unit.target),
+                           data.normalize(unit.getnotes()),
+                           data.normalize(u" ".join(unit.getlocations())))
+        self.cursor.executemany("INSERT INTO units (fileid, source, target, notes, locations) VALUES (?, ?, ?, ?, ?)",
+                                unitrows())
+        return fileid
+
+    def hasmatches(self, filename):
+        """Checks if any unit of the given file could be selected by the
+        filter, indexing the file first if needed."""
+        fileid = self.update(filename)
+        self.cursor.execute("""SELECT 1 FROM units WHERE fileid = ?
+                               AND grepmatch(source, target, notes, locations) LIMIT 1""", (fileid,))
+        return self.cursor.fetchone() is not None
+
+    def close(self):
+        """Saves the changes to the index"""
+        self.connection.commit()
+        self.connection.close()
+
+
 class GrepOptionParser(optrecurse.RecursiveOptionParser):
     """a specialized Option Parser for the grep tool..."""
 
@@ -324,16 +475,41 @@ class GrepOptionParser(optrecurse.RecursiveOptionParser):
                                          options.accelchar,
                                          locale.getpreferredencoding())
         self.usepsyco(options)
-        self.recursiveprocess(options)
+        if options.index:
+            options.grepindex = GrepIndex(options.index, options.checkfilter)
+            try:
+                self.recursiveprocess(options)
+            finally:
+                options.grepindex.close()
+        else:
+            self.recursiveprocess(options)
+
+    def isparallel(self, options):
+        """The index can only be used by one process"""
+        if getattr(options, "grepindex", None) is not None:
+            return False
+        return super(GrepOptionParser, self).isparallel(options)
+
+    def processfile(self, fileprocessor, options, fullinputpath,
+                    fulloutputpath, fulltemplatepath):
+        """Processes an individual file, unless the index shows that none of
+        its units are selected."""
+        grepindex = getattr(options, "grepindex", None)
+        if grepindex is not None and fullinputpath is not None:
+            if not grepindex.hasmatches(fullinputpath):
+                return False
+        return super(GrepOptionParser, self).processfile(fileprocessor, options,
+                                                         fullinputpath,
+                                                         fulloutputpath,
+                                                         fulltemplatepath)
 
 
 def rungrep(inputfile, outputfile, templatefile, checkfilter):
     """reads in inputfile, filters using checkfilter, writes to outputfile"""
-    fromfile = factory.getobject(inputfile)
-    tofile = checkfilter.filterfile(fromfile)
-    if tofile.isempty():
+    tofile = checkfilter.filterunits(factory.iterunits(inputfile))
+    if tofile is None or tofile.isempty():
         return False
-    outputfile.write(str(tofile))
+    tofile.serialize(outputfile)
     return True
 
 
@@ -358,6 +534,9 @@ def cmdlineparser():
         metavar="ACCELERATOR", help="ignores the given accelerator when matching")
     parser.add_option("-k", "--keep-translations", dest="keeptranslations",
         action="store_true", default=False, help="always extract units with translations")
+    parser.add_option("", "--index", dest="index",
+        action="store", default=None, metavar="INDEXFILE",
+        help="keep the strings of the input files in INDEXFILE, to only parse the files with matches or changes")
     parser.set_usage()
     parser.passthrough.append('checkfilter')
     parser.description = __doc__
@@ -23,6 +23,10 @@
 Snippet file produced by pogrep or updated by a translator can be merged into
 existing files
 
+If the file that is merged into has several units with the same id (or source
+text), the translation is merged into the first of them. Older versions used
+the last one.
+
 See: http://translate.sourceforge.net/wiki/toolkit/pomerge for examples and
 usage instructions
 """
@@ -36,18 +40,19 @@ from translate.storage.poheader import poheader
 def mergestores(store1, store2, mergeblanks, mergefuzzy, mergecomments):
     """Take any new translations in store2 and write them into store1."""
 
+    unitindex = store1.getunitindex()
     for unit2 in store2.units:
         if unit2.isheader():
             if isinstance(store1, poheader):
                 store1.mergeheaders(store2)
             continue
-        unit1 = store1.findid(unit2.getid())
-        if unit1 is None:
-            unit1 = store1.findunit(unit2.source)
-        if unit1 is None:
+        units1 = unitindex.findid(unit2.getid()) or \
+                 unitindex.findsource(unit2.source)
+        if not units1:
             logging.error("The template does not contain the following unit:\n%s",
                           str(unit2))
         else:
+            unit1 = units1[0]
             if not mergeblanks:
                 if len(unit2.target.strip()) == 0:
                     continue
@@ -99,7 +104,7 @@ def mergestore(inputfile, outputfile, templatefile, mergeblanks="no", mergefuzzy
                     mergefuzzy, mergecomments)
     if outputstore.isempty():
         return 0
-    outputfile.write(str(outputstore))
+    outputstore.serialize(outputfile)
     return 1
 
 
@@ -22,6 +22,9 @@
 translation memory and existing translations.
 """
 
+import os
+
+from translate.storage import directory
 from translate.storage import factory
 from translate.storage import xliff, po
 from translate.search import match
@@ -35,18 +38,35 @@ def memory(tmfiles, max_candidates=1, min_similarity=75, max_length=1000):
     global tmmatcher
     # Only initialise first time
     if tmmatcher is None:
-        if isinstance(tmfiles, list):
-            tmstore = [factory.getobject(tmfile) for tmfile in tmfiles]
-        else:
-            tmstore = factory.getobject(tmfiles)
-        tmmatcher = match.matcher(tmstore, max_candidates=max_candidates,
+        if not isinstance(tmfiles, list):
+            tmfiles = [tmfiles]
+        tmmatcher = match.matcher([], max_candidates=max_candidates,
                                   min_similarity=min_similarity,
                                   max_length=max_length)
+        # The matcher only keeps a copy of the usable units, so the TM files
+        # are read one unit at a time
+        for tmfile in tmfiles:
+            tmmatcher.extendtm(_tmunits(tmfile), sort=False)
+        tmmatcher.candidates.units.sort(key=match.sourcelen,
+                                        reverse=tmmatcher.sort_reverse)
     return tmmatcher
 
 
+def _tmunits(tmfile):
+    """Yields the units of a TM file, or of all the files in a TM
+    directory."""
+    if isinstance(tmfile, basestring) and os.path.isdir(tmfile):
+        tmfiles = [os.path.join(dirname, filename) for dirname, filename
+                   in directory.Directory(tmfile).file_iter()]
+    else:
+        tmfiles = [tmfile]
+    for tmfile in tmfiles:
+        for unit in factory.iterunits(tmfile):
+            yield unit
+
+
 def pretranslate_file(input_file, output_file, template_file, tm=None,
-                      min_similarity=75, fuzzymatching=True):
+                      min_similarity=75, fuzzymatching=True, jobs=1):
     """Pretranslate any factory supported file with old translations and
     translation memory."""
     input_store = factory.getobject(input_file)
@@ -55,8 +75,8 @@ def pretranslate_file(input_file, output_file, template_file, tm=None,
         template_store = factory.getobject(template_file)
 
     output = pretranslate_store(input_store, template_store, tm,
-                                min_similarity, fuzzymatching)
-    output_file.write(str(output))
+                                min_similarity, fuzzymatching, jobs)
+    output.serialize(output_file)
     return 1
 
 
@@ -72,18 +92,28 @@ def match_template_location(input_unit, template_store):
     # since oo2po and moz2po use location as unique identifiers for strings
     # we match against location first, then check for matching source strings
     # this makes no sense for normal gettext files
+    unitindex = template_store.getunitindex()
     for location in locations:
-        matching_unit = template_store.locationindex.get(location, None)
-        if (matching_unit is not None and
-            matching_unit.source == input_unit.source and
-            matching_unit.gettargetlen() > 0):
-            return matching_unit
+        for matching_unit in unitindex.findlocation(location):
+            if (matching_unit.source == input_unit.source and
+                matching_unit.gettargetlen() > 0):
+                return matching_unit
+
+
+def match_template(input_unit, template_store, match_locations=False):
+    """Returns a matching unit from a template, based on locations or unit
+    id."""
+    if match_locations:
+        return match_template_location(input_unit, template_store)
+    else:
+        return match_template_id(input_unit, template_store)
 
 
 def match_template_id(input_unit, template_store):
     """Returns a matching unit from a template. matching based on unit id"""
-    matching_unit = template_store.findid(input_unit.getid())
-    return matching_unit
+    matching_units = template_store.getunitindex().findid(input_unit.getid())
+    if matching_units:
+        return matching_units[0]
 
 
 def match_source(input_unit, template_store):
@@ -91,8 +121,9 @@ def match_source(input_unit, template_store):
     # hack for weird mozilla single letter strings, we don't want to
     # match them by anything but locations
     if len(input_unit.source) > 1:
-        matching_unit = template_store.findunit(input_unit.source)
-        return matching_unit
+        matching_units = template_store.getunitindex().findsource(input_unit.source)
+        if matching_units:
+            return matching_units[0]
 
 
 def match_fuzzy(input_unit, matchers):
@@ -103,6 +134,50 @@ def match_fuzzy(input_unit, matchers):
             return fuzzycandidates[0]
 
 
+class prematcher(object):
+    """Answers matches() for a matcher from matches found in advance."""
+
+    def __init__(self, matcher, prematches):
+        self.matcher = matcher
+        self.prematches = prematches
+
+    def matches(self, text):
+        if text in self.prematches:
+            return self.prematches[text]
+        return self.matcher.matches(text)
+
+
+def prematch_fuzzy(input_units, template_store, matchers,
+                   match_locations=False, jobs=1):
+    """Does the fuzzy matching that pretranslate_unit() will need for
+    input_units with jobs processes, and returns matchers to pass to
+    pretranslate_unit() that answer from those matches."""
+    texts = []
+    known = set()
+    for input_unit in input_units:
+        if not input_unit.istranslatable():
+            continue
+        if template_store:
+            matching_unit = match_template(input_unit, template_store,
+                                           match_locations)
+            if matching_unit and matching_unit.gettargetlen() > 0:
+                continue
+            matching_unit = match_source(input_unit, template_store)
+            if matching_unit and matching_unit.gettargetlen():
+                continue
+        if input_unit.source not in known:
+            known.add(input_unit.source)
+            texts.append(input_unit.source)
+
+    prematchers = []
+    for matcher in matchers:
+        prematches = dict(zip(texts, matcher.matches_batch(texts, jobs)))
+        prematchers.append(prematcher(matcher, prematches))
+        # match_fuzzy() only asks the next matcher if this one found nothing
+        texts = [text for text in texts if not prematches[text]]
+    return prematchers
+
+
 def pretranslate_unit(input_unit, template_store, matchers=None,
                       mark_reused=False, match_locations=False):
     """Pretranslate a unit or return unchanged if no translation was found."""
@@ -110,16 +185,15 @@ def pretranslate_unit(input_unit, template_store, matchers=None,
     matching_unit = None
     #do template matching
     if template_store:
-        if match_locations:
-            matching_unit = match_template_location(input_unit, template_store)
-        else:
-            matching_unit = match_template_id(input_unit, template_store)
+        matching_unit = match_template(input_unit, template_store,
+                                       match_locations)
 
     if matching_unit and matching_unit.gettargetlen() > 0:
         input_unit.merge(matching_unit, authoritative=True)
     elif matchers:
         # quickly try exact match by source
-        matching_unit = match_source(input_unit, template_store)
+        if template_store:
+            matching_unit = match_source(input_unit, template_store)
 
         if not matching_unit or not matching_unit.gettargetlen():
             #do fuzzy matching
@@ -137,21 +211,20 @@ def pretranslate_unit(input_unit, template_store, matchers=None,
     #FIXME: ugly hack required by pot2po to mark old
     #translations reused for new file. loops over
     if mark_reused and matching_unit and template_store:
-        original_unit = template_store.findunit(matching_unit.source)
-        if original_unit is not None:
-            original_unit.reused = True
+        original_units = template_store.getunitindex().findsource(matching_unit.source)
+        if original_units:
+            original_units[0].reused = True
 
     return input_unit
 
 
 def pretranslate_store(input_store, template_store, tm=None,
-                       min_similarity=75, fuzzymatching=True):
+                       min_similarity=75, fuzzymatching=True, jobs=1):
     """Do the actual pretranslation of a whole store."""
     #preperation
     matchers = []
     #prepare template
     if template_store is not None:
-        template_store.makeindex()
         #template preparation based on type
         prepare_template = "prepare_template_%s" % template_store.__class__.__name__
         if prepare_template in globals():
@@ -177,6 +250,9 @@ def pretranslate_store(input_store, template_store, tm=None,
 
     #main loop
     match_locations = isinstance(input_store, po.pofile) and input_store.parseheader().get('X-Accelerator-Marker') in ('&', '~')
+    if matchers and jobs > 1:
+        matchers = prematch_fuzzy(input_store.units, template_store, matchers,
+                                  match_locations, jobs)
     for input_unit in input_store.units:
         if  input_unit.istranslatable():
             input_unit = pretranslate_unit(input_unit, template_store,
@@ -211,6 +287,7 @@ def main(argv=None):
                       action="store_false", default=True,
                       help="Disable fuzzy matching")
     parser.passthrough.append("fuzzymatching")
+    parser.passthrough.append("jobs")
     parser.run(argv)
 
 
@@ -1,6 +1,12 @@
 #!/usr/bin/env python
 # -*- coding: utf-8 -*-
 
+import os
+import shutil
+import tempfile
+
+from py import test
+
 from translate.storage import po
 from translate.storage import xliff
 from translate.storage.test_base import first_translatable, headerless_len
@@ -26,6 +32,17 @@ class TestPOGrep:
         print str(tofile)
         return str(tofile)
 
+    def test_filterunits_streamed(self):
+        """grep through units streamed from a file"""
+        posource = 'msgid ""\nmsgstr ""\n"X-Generator: Test\\n"\n\n#: test.c\nmsgid "test"\nmsgstr "rest"\n\nmsgid "other"\nmsgstr "ander"\n'
+        options, args = pogrep.cmdlineparser().parse_args(["xxx.po", "--search=msgid"])
+        grepfilter = pogrep.GrepFilter("test", options.searchparts)
+        units = po.pofile.iterparse(wStringIO.StringIO(posource))
+        tofile = grepfilter.filterunits(units)
+        assert headerless_len(tofile.units) == 1
+        assert tofile.parseheader()["X-Generator"] == "Test"
+        assert grepfilter.filterunits(iter([])) is None
+
     def test_simplegrep_msgid(self):
         """grep for a string in the source"""
         posource = '#: test.c\nmsgid "test"\nmsgstr "rest"\n'
@@ -121,6 +138,46 @@ class TestPOGrep:
                     poresult = self.pogrep(source, search_letter)
                     assert poresult.index(source.encode('utf-8')) >= 0
 
+    def test_index(self):
+        """check that files are only selected through the index if they have
+        matches, and indexed again when they change"""
+        tempdir = tempfile.mkdtemp()
+        try:
+            pofilename = os.path.join(tempdir, "test.po")
+            pofile = open(pofilename, "w")
+            pofile.write('#: test.c\nmsgid "test"\nmsgstr "t\xc3\xa9st"\n')
+            pofile.close()
+            index = pogrep.GrepIndex(os.path.join(tempdir, "index.db"),
+                                     pogrep.GrepFilter(u"t\u0065\u0301st", ["target"]))
+            assert index.hasmatches(pofilename)
+            index.close()
+            pofile = open(pofilename, "w")
+            pofile.write('#: test.c\nmsgid "test"\nmsgstr "rest"\n')
+            pofile.close()
+            index = pogrep.GrepIndex(os.path.join(tempdir, "index.db"),
+                                     pogrep.GrepFilter(u"t\u0065\u0301st", ["target"]))
+            assert not index.hasmatches(pofilename)
+            index.close()
+        finally:
+            shutil.rmtree(tempdir)
+
+    def test_index_parse_error(self):
+        """check that a file that can't be parsed is not left in the index"""
+        tempdir = tempfile.mkdtemp()
+        try:
+            tmxfilename = os.path.join(tempdir, "test.tmx")
+            tmxfile = open(tmxfilename, "w")
+            tmxfile.write('<?xml version="1.0"?><tmx><body><tu><tuv')
+            tmxfile.close()
+            index = pogrep.GrepIndex(os.path.join(tempdir, "index.db"),
+                                     pogrep.GrepFilter(u"test", ["target"]))
+            test.raises(Exception, index.hasmatches, tmxfilename)
+            index.cursor.execute("SELECT COUNT(*) FROM files")
+            assert index.cursor.fetchone() == (0,)
+            index.close()
+        finally:
+            shutil.rmtree(tempdir)
+
 
 class TestXLiffGrep:
     xliff_skeleton = '''<?xml version="1.0" ?>
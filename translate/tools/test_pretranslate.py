@@ -156,6 +156,15 @@ msgstr[1] "%d handleidings."
         print newpo
         assert str(newpo) == poexpected
 
+    def test_match_template_location_duplicates(self):
+        """checks that units are matched by location even if the location is
+        not unique in the template"""
+        template = po.pofile('#: dialog.label\nmsgid "Open"\nmsgstr "Oop"\n\n'
+                             '#: dialog.label\nmsgid "Close"\nmsgstr "Maak toe"\n')
+        input_unit = po.pounit("Close")
+        input_unit.addlocation("dialog.label")
+        assert pretranslate.match_template_location(input_unit, template).target == "Maak toe"
+
     @mark.xfail(reason="Not Implemented")
     def test_lines_cut_differently(self):
         """Checks that the correct formatting is preserved when pot an po lines
@@ -314,3 +323,15 @@ class TestPretranslateCommand(test_convert.TestConvertCommand, TestPretranslate)
         options = self.help_check(options, "--tm")
         options = self.help_check(options, "-s MIN_SIMILARITY, --similarity=MIN_SIMILARITY")
         options = self.help_check(options, "--nofuzzymatching", last=True)
+
+    def test_tm_directory(self):
+        """checks that a directory can be used as the translation memory"""
+        self.create_testfile("tm/sub/tm.po", '#: old.c\nmsgid "Open the file"\nmsgstr "Maak die lêer oop"\n')
+        self.create_testfile("input.po", '#: new.c\nmsgid "Open the file"\nmsgstr ""\n')
+        pretranslate.tmmatcher = None
+        try:
+            self.run_command("input.po", "output.po", tm="tm")
+        finally:
+            pretranslate.tmmatcher = None
+        unit = self.singleunit(po.pofile(self.read_testfile("output.po")))
+        assert unit.target == u"Maak die lêer oop"
@@ -0,0 +1,80 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+#
+# Copyright 2011 Zuza Software Foundation
+#
+# This file is part of the Translate Toolkit.
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, see <http://www.gnu.org/licenses/>.
+
+"""Export the translations in a tmdb to a TMX file."""
+
+import os
+import sys
+from optparse import OptionParser
+
+from translate.storage import tmdb
+from translate.storage import tmx
+
+
+def export_tmx(tmdbfile, outputfile, source_lang='en', target_lang=None):
+    """Writes the translations from source_lang in tmdbfile (to target_lang,
+    or to any language) to outputfile, and returns how many were written.
+
+    The translations are written as they are read from the database, so
+    this works for databases that wouldn't fit in memory as a TMX store.
+    """
+    db = tmdb.TMDB(tmdbfile)
+    writer = tmx.tmxwriter(outputfile, source_lang)
+    count = 0
+    for translation in db.iter_translations(source_lang, target_lang):
+        writer.addtranslation(translation["source"], translation["source_lang"],
+                              translation["target"], translation["target_lang"])
+        count += 1
+    writer.close()
+    return count
+
+
+def main():
+    parser = OptionParser(usage="%prog [options] [<output file>]")
+    parser.add_option(
+        "-d", "--tmdb", dest="tmdb_file", default="tm.db",
+        help="translation memory database file (default: tm.db)")
+    parser.add_option(
+        "-s", "--source-lang", dest="source_lang", default="en",
+        help="source language of the exported translations (default: en)")
+    parser.add_option(
+        "-t", "--target-lang", dest="target_lang",
+        help="only export the translations to this language")
+    (options, args) = parser.parse_args()
+
+    if len(args) > 1:
+        parser.error('Only one output file can be specified.')
+    if not os.path.exists(options.tmdb_file):
+        parser.error('The tmdb %s does not exist.' % options.tmdb_file)
+
+    if args:
+        outputfile = open(args[0], 'w')
+    else:
+        outputfile = sys.stdout
+    try:
+        count = export_tmx(options.tmdb_file, outputfile, options.source_lang,
+                           options.target_lang)
+    finally:
+        if outputfile is not sys.stdout:
+            outputfile.close()
+    print >> sys.stderr, "Translations exported:", count
+
+if __name__ == '__main__':
+    main()